@@ -11,7 +11,6 @@ __contact__ = "richard.d.smith@stfc.ac.uk"
 import os
 
 import yaml
-from cci_facet_scanner.tagging.facets import Facets
 from cci_facet_scanner.utils.elasticsearch import es_connection_kwargs
 from elasticsearch import Elasticsearch
 
@@ -49,8 +48,6 @@ APPLICATION_ID = "opensearch"
 ELASTICSEARCH_CONNECTION_PARAMS = {"timeout": 30}
 ELASTICSEARCH_HOST="https://elasticsearch.164.30.69.113.nip.io"
 
-READ_FROM_VOCAB = False
-
 THREDDS_HOST = "https://data.cci.ceda.ac.uk"
 
 SOLR_HOST = "https://esgf-index1.ceda.ac.uk/solr"
@@ -58,6 +55,13 @@ SOLR_CORE = "datasets"
 
 OPENSEARCH_BACKEND = "elasticsearch"
 
+# Caches defined in CACHES. Cached responses and the generation marker are
+# shared by the server processes, pages of granule results are held in a
+# size limited cache in each process.
+OPENSEARCH_CACHE = "opensearch"
+OPENSEARCH_GENERATION_CACHE = "opensearch_generation"
+SEARCH_RESULT_CACHE = "search"
+
 PROVIDERS_MAP = {
     "OSI SAF": "EUMETSAT",
     "CM SAF": "EUMETSAT",
@@ -67,9 +71,9 @@ DATA_BRIDGE_URL = "https://eo-data-bridge.ceda.ac.uk"
 
 EXTERNAL_DATA_SOURCES = ["https://wui.cmsaf.eu/s"]
 
-FACETS = Facets(
-    endpoint="https://raw.githubusercontent.com/cedadev/cci-vocabularies/refs/heads/master/app/html/ontology/cci/cci-content/cci-ontology.json"
-)
+# Vocabularies are read from the bundled file on first use
+VOCAB_FILE = os.path.join(os.path.dirname(__file__), "facets_json.json")
+VOCAB_ENDPOINT = "https://raw.githubusercontent.com/cedadev/cci-vocabularies/refs/heads/master/app/html/ontology/cci/cci-content/cci-ontology.json"
 
 class ElasticsearchConnection:
     """
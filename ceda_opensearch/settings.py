@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'django_opensearch.middleware.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'ceda_opensearch.urls'
@@ -95,7 +97,28 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Shared by the server processes so that invalidation reaches all of them
+    'opensearch': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'ceda_opensearch_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Holds only the generation marker, so it is never culled
+    'opensearch_generation': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'ceda_opensearch_generation'),
+    },
+    'search': {
+        'BACKEND': 'django_opensearch.cache.SizeLimitedLocMemCache',
+        'LOCATION': 'search-results',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    },
 }
 
 
@@ -160,6 +183,7 @@ except ImportError as err:
 
 from cci_facet_scanner.utils.elasticsearch import ElasticsearchConnection
 
+# Wrapped by the django_opensearch app to log slow queries
 ES_CONNECTION = ElasticsearchConnection(
     ELASTICSEARCH_HOST,
     ES_API_KEY,
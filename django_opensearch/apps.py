@@ -1,5 +1,57 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_save
+
+
+def invalidate_cache(sender, **kwargs):
+    """
+    Drop cached responses when a collection event is recorded
+    """
+    from .cache import invalidate
+
+    invalidate()
 
 
 class DjangoOpensearchConfig(AppConfig):
     name = 'django_opensearch'
+
+    def ready(self):
+
+        # Events are posted when collections are added, updated or removed
+        if apps.is_installed('events'):
+            post_save.connect(
+                invalidate_cache,
+                sender='events.Event',
+                dispatch_uid='django_opensearch_invalidate_cache'
+            )
+
+        self.wrap_connection()
+        self.preload_handlers()
+
+    @staticmethod
+    def wrap_connection():
+        """
+        Log slow queries made through settings.ES_CONNECTION. Done here
+        rather than in the project settings so the settings do not import
+        the app.
+        """
+        from django.conf import settings
+        from .slow_query import SlowQueryConnection
+
+        connection = getattr(settings, 'ES_CONNECTION', None)
+
+        if connection is not None and not isinstance(connection, SlowQueryConnection):
+            settings.ES_CONNECTION = SlowQueryConnection(connection)
+
+    @staticmethod
+    def preload_handlers():
+        """
+        Resolve the collection handler classes before the first request
+        """
+        from . import settings
+
+        if settings.OPENSEARCH_BACKEND != 'elasticsearch':
+            return
+
+        from .opensearch.backends.elasticsearch.facets.base import HANDLERS
+
+        HANDLERS.trie
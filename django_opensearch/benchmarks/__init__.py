@@ -0,0 +1,65 @@
+# encoding: utf-8
+"""
+Micro-benchmarks for the hot paths of the opensearch service. Run them with
+the ``opensearch_benchmark`` management command.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import statistics
+import time
+
+from django.conf import settings
+from django.test import RequestFactory
+
+
+def get_host():
+    """
+    :return: host name accepted by settings.ALLOWED_HOSTS
+    :rtype: str
+    """
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+
+    return 'localhost'
+
+
+def request_factory():
+    """
+    :return: request factory for a host which passes host validation
+    :rtype: RequestFactory
+    """
+    return RequestFactory(HTTP_HOST=get_host())
+
+
+def measure(func, repeat=5, number=1):
+    """
+    Time a function
+
+    :param func: callable taking no arguments
+    :param repeat: number of timings to take
+    :type repeat: int
+
+    :param number: number of calls per timing
+    :type number: int
+
+    :return: min, median and mean time per call in milliseconds
+    :rtype: dict
+    """
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) * 1000 / number)
+
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+    }
@@ -0,0 +1,83 @@
+# encoding: utf-8
+"""
+Compares looking up the handler for a collection path through the handler
+registry with the previous approach of locating the handler class and
+walking up the path on every call.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+from pydoc import locate
+
+from django_opensearch.opensearch.backends.elasticsearch.facets.base import HANDLERS
+from django_opensearch.opensearch.backends.elasticsearch.facets.collection_map import COLLECTION_MAP
+
+from . import measure
+
+
+def sample_paths(n):
+    """
+    Collection paths below each root in the collection map, along with a
+    path which does not match any collection
+
+    :param n: number of paths
+    :type n: int
+
+    :return: paths
+    :rtype: list
+    """
+    roots = list(COLLECTION_MAP) + ['/unknown/archive']
+
+    return [f'{roots[i % len(roots)]}/dataset_{i // len(roots)}/v1' for i in range(n)]
+
+
+def locate_handler(path):
+    """
+    Handler lookup as performed before the registry
+    """
+    while path not in COLLECTION_MAP and path != '/' and path:
+        path = os.path.dirname(path)
+
+    if not path or path == '/':
+        return
+
+    return locate(COLLECTION_MAP[path]['handler'])(path)
+
+
+def run(records=(10, 100, 1000), repeat=5):
+    """
+    Look up the handlers for a set of collection paths
+
+    :param records: number of collection paths
+    :type records: iterable
+
+    :param repeat: number of timings per set of paths
+    :type repeat: int
+
+    :return: rows of results
+    :rtype: list
+    """
+    results = []
+
+    for n in records:
+        paths = sample_paths(n)
+
+        def locate_all():
+            return [locate_handler(path) for path in paths]
+
+        def registry():
+            return [HANDLERS.get_handler(path) for path in paths]
+
+        results.append({
+            'benchmark': 'handler_lookup',
+            'records': n,
+            'locate': measure(locate_all, repeat),
+            'registry': measure(registry, repeat),
+            'identical': [type(h) for h in locate_all()] == [type(h) for h in registry()],
+        })
+
+    return results
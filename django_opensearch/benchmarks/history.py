@@ -0,0 +1,109 @@
+# encoding: utf-8
+"""
+Benchmark results history. Each run is appended to a JSON lines file so the
+median timings can be compared with earlier runs.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from datetime import datetime, timezone
+import json
+import platform
+
+# Details which describe the outcome of a row rather than identify it
+OUTCOME_DETAILS = ('identical',)
+
+
+def split_row(row):
+    """
+    Separate the details of a result row from its timings
+
+    :param row: result row
+    :type row: dict
+
+    :return: details, median timings in milliseconds
+    :rtype: tuple(dict, dict)
+    """
+    details = {}
+    timings = {}
+
+    for key, value in row.items():
+        if isinstance(value, dict) and 'median' in value:
+            timings[key] = value['median']
+        else:
+            details[key] = value
+
+    return details, timings
+
+
+def row_key(details):
+    """
+    :param details: details of a result row
+    :type details: dict
+
+    :return: key identifying the row between runs
+    :rtype: str
+    """
+    return json.dumps(
+        {key: value for key, value in details.items() if key not in OUTCOME_DETAILS},
+        sort_keys=True,
+        default=str
+    )
+
+
+def previous(path):
+    """
+    The most recent timings recorded for each row
+
+    :param path: history file
+    :type path: str
+
+    :return: {row key: {name: median}}
+    :rtype: dict
+    """
+    latest = {}
+
+    try:
+        with open(path) as reader:
+            for line in reader:
+                if line.strip():
+                    for result in json.loads(line)['results']:
+                        latest[row_key(result['details'])] = result['timings']
+
+    except FileNotFoundError:
+        pass
+
+    return latest
+
+
+def append(path, rows, label=None):
+    """
+    Add a run to the history
+
+    :param path: history file
+    :type path: str
+
+    :param rows: result rows
+    :type rows: list
+
+    :param label: description of the run, such as the revision
+    :type label: str
+    """
+    results = []
+
+    for row in rows:
+        details, timings = split_row(row)
+        results.append({'details': details, 'timings': timings})
+
+    run = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'label': label,
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+    with open(path, 'a') as writer:
+        writer.write(json.dumps(run, default=str) + '\n')
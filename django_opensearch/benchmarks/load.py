@@ -0,0 +1,277 @@
+# encoding: utf-8
+"""
+Replays opensearch requests taken from an access log, concurrently, against
+a running service or in-process against the recorded elasticsearch
+responses, and summarises the latency and errors per endpoint and per
+parentIdentifier. Run it with the ``opensearch_replay`` management command.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import math
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from django.test import Client
+import requests
+
+from django_opensearch.benchmarks import get_host
+
+# Request line of a common or combined log format entry
+LOG_REQUEST = re.compile(r'"(?P<method>[A-Z]+) (?P<target>\S+) HTTP/[\d.]+"')
+
+# Path prefix: endpoint name
+ENDPOINTS = {
+    '/opensearch/description.xml': 'description',
+    '/opensearch/request': 'request',
+    '/opensearch/files': 'files',
+    '/opensearch/export': 'export',
+    '/manifest/': 'manifest',
+}
+
+Result = namedtuple('Result', ('endpoint', 'parent_identifier', 'status', 'latency'))
+
+
+def parse_line(line):
+    """
+    Get the path and query string requested in a log line. The line can be
+    an access log entry, a URL or a path.
+
+    :param line: log line
+    :type line: str
+
+    :return: path and query or None if the line is not a GET request
+    :rtype: str
+    """
+    match = LOG_REQUEST.search(line)
+
+    if match:
+        if match.group('method') != 'GET':
+            return
+        target = match.group('target')
+    else:
+        target = line.strip()
+
+    if not target or target.startswith('#'):
+        return
+
+    url = urlsplit(target)
+    path = url.path
+
+    if not path.startswith('/'):
+        return
+
+    return f'{path}?{url.query}' if url.query else path
+
+
+def get_endpoint(url):
+    """
+    :param url: path and query
+    :type url: str
+
+    :return: endpoint name or None if the URL is not an opensearch endpoint
+    :rtype: str
+    """
+    path = urlsplit(url).path
+
+    for prefix, endpoint in ENDPOINTS.items():
+        if path.startswith(prefix):
+            return endpoint
+
+
+def read_urls(path):
+    """
+    Read the opensearch requests from a file
+
+    :param path: access log or file of URLs
+    :type path: str
+
+    :return: paths and queries in the order they were made
+    :rtype: list
+    """
+    urls = []
+
+    with open(path) as reader:
+        for line in reader:
+            url = parse_line(line)
+
+            if url and get_endpoint(url):
+                urls.append(url)
+
+    return urls
+
+
+class HttpTarget:
+    """
+    Sends the requests to a running service
+
+    :param host: base URL of the service
+    :type host: str
+
+    :param timeout: request timeout in seconds
+    :type timeout: float
+
+    :param pool_size: number of connections to keep open
+    :type pool_size: int
+    """
+
+    def __init__(self, host, timeout=60, pool_size=10):
+        self.host = host.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url):
+        """
+        Make the request and read the response
+
+        :return: status code
+        :rtype: int
+        """
+        response = self.session.get(f'{self.host}{url}', timeout=self.timeout)
+        _ = response.content
+
+        return response.status_code
+
+
+class InProcessTarget:
+    """
+    Sends the requests to this django project with the test client. One
+    client is used per thread.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.host = get_host()
+
+    @property
+    def client(self):
+        client = getattr(self.local, 'client', None)
+
+        if client is None:
+            client = self.local.client = Client(HTTP_HOST=self.host, raise_request_exception=False)
+
+        return client
+
+    def get(self, url):
+        response = self.client.get(url)
+
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+
+        return response.status_code
+
+
+def send(target, url):
+    """
+    Time a request
+
+    :return: result of the request. The status is None if it failed.
+    :rtype: Result
+    """
+    parent_identifier = parse_qs(urlsplit(url).query).get('parentIdentifier', [''])[0]
+    start = time.perf_counter()
+
+    try:
+        status = target.get(url)
+    except Exception:
+        status = None
+
+    return Result(get_endpoint(url), parent_identifier, status, time.perf_counter() - start)
+
+
+def replay(urls, target, concurrency=10):
+    """
+    Make the requests with a pool of workers
+
+    :param urls: paths and queries
+    :type urls: list
+
+    :param target: target to send the requests to
+    :param concurrency: number of requests in flight
+    :type concurrency: int
+
+    :return: results and the total time taken in seconds
+    :rtype: tuple(list, float)
+    """
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda url: send(target, url), urls))
+
+    return results, time.perf_counter() - start
+
+
+def percentile(values, p):
+    """
+    Nearest rank percentile
+
+    :param values: sorted values
+    :type values: list
+
+    :param p: percentile
+    :type p: float
+    """
+    if not values:
+        return
+
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def summarise(results, elapsed):
+    """
+    Summarise the results overall, per endpoint and per parentIdentifier.
+    Errors are failed requests and server errors, client errors are 4xx
+    responses.
+
+    :param results: request results
+    :type results: list
+
+    :param elapsed: time taken to make the requests in seconds
+    :type elapsed: float
+
+    :return: rows of results
+    :rtype: list
+    """
+    groups = defaultdict(list)
+
+    for result in results:
+        groups[('all', '')].append(result)
+        groups[('endpoint', result.endpoint)].append(result)
+        groups[('parentIdentifier', result.parent_identifier or '-')].append(result)
+
+    rows = []
+
+    for (group, name), group_results in groups.items():
+        latencies = sorted(result.latency * 1000 for result in group_results)
+        count = len(group_results)
+        errors = sum(1 for result in group_results if result.status is None or result.status >= 500)
+        client_errors = sum(1 for result in group_results if result.status is not None and 400 <= result.status < 500)
+
+        rows.append({
+            'group': group,
+            'name': name,
+            'requests': count,
+            'throughput': count / elapsed if elapsed else 0,
+            'errors': errors / count,
+            'client_errors': client_errors / count,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        })
+
+    order = {'all': 0, 'endpoint': 1, 'parentIdentifier': 2}
+    rows.sort(key=lambda row: (order[row['group']], -row['requests'], row['name']))
+
+    return rows
@@ -0,0 +1,151 @@
+# encoding: utf-8
+"""
+Times each stage of the request pipeline for the CCI and CMIP5 handlers,
+with elasticsearch replaced by recorded responses. Covers building the
+query, the search, building the entries, the whole response, rendering it
+as GeoJSON and Atom, and generating the description document.
+
+Time spent in elasticsearch and the transport is not included.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.test import override_settings
+
+from django_opensearch.opensearch.opensearch import Collection, Granule, OpensearchDescription, OpensearchResponse
+from django_opensearch.opensearch.renderers import AtomWriter, GeoJSONWriter
+from . import measure, request_factory
+from .replay import ReplayConnection, RecordingConnection, connection, load_fixtures
+
+# Searches run for each handler. The collections must be in the fixtures.
+SCENARIOS = {
+    'cci': {
+        'parentIdentifier': 'esacci-sst-l4-v2.1',
+        'ecv': 'SST',
+        'startDate': '2010-01-01',
+        'endDate': '2010-12-31',
+        'bbox': '-180,-90,180,90',
+    },
+    'cmip5': {
+        'parentIdentifier': 'cmip5-output1',
+        'experiment': 'historical',
+        'model': 'HadGEM2-ES',
+    },
+}
+
+
+def make_request(params, **extra):
+    return request_factory().get('/opensearch/request', {**params, **extra})
+
+
+def run_scenario(name, params, records, repeat, conn):
+    """
+    Time the pipeline stages for one handler
+
+    :return: rows of results
+    :rtype: list
+    """
+    conn.files = name
+    results = []
+
+    description_request = request_factory().get('/opensearch/description.xml', {'parentIdentifier': params['parentIdentifier']})
+
+    def description():
+        return render_to_string('description.xml', {'osd': OpensearchDescription(description_request)})
+
+    results.append({
+        'benchmark': 'description',
+        'handler': name,
+        'description': measure(description, repeat),
+    })
+
+    handler = Granule(Collection.get_path(params['parentIdentifier'])).handler
+
+    for n in records:
+        request = make_request(params, maximumRecords=n)
+        search_params = request.GET
+        uri = request.build_absolute_uri('/opensearch')
+
+        hits = conn.search(handler.build_query(search_params, max_results=n))['hits']['hits']
+        osr = OpensearchResponse(request)
+
+        results.append({
+            'benchmark': 'pipeline',
+            'handler': name,
+            'records': n,
+            'build_query': measure(lambda: handler.build_query(search_params, max_results=n), repeat),
+            'search': measure(lambda: handler.search(search_params, max_results=n, uri=uri), repeat),
+            'build_representation': measure(lambda: handler.build_representation(hits, search_params, uri=uri), repeat),
+            'response': measure(lambda: OpensearchResponse(request), repeat),
+            'geojson': measure(lambda: GeoJSONWriter(osr).render(), repeat),
+            'atom': measure(lambda: AtomWriter(osr, request).render(), repeat),
+        })
+
+    return results
+
+
+def run(records=(10, 100, 1000), repeat=5, fixtures=None):
+    """
+    Run the pipeline for each scenario against the recorded responses
+
+    :param records: page sizes
+    :type records: iterable
+
+    :param repeat: number of timings per page size
+    :type repeat: int
+
+    :param fixtures: fixture file (default: the bundled fixtures)
+    :type fixtures: str
+
+    :return: rows of results
+    :rtype: list
+    """
+    results = []
+
+    # Repeated searches would be answered from the result cache
+    with override_settings(SEARCH_RESULT_CACHE_TIMEOUT=0), connection(ReplayConnection(load_fixtures(fixtures))) as conn:
+        top_level = request_factory().get('/opensearch/description.xml')
+
+        def description():
+            return render_to_string('description.xml', {'osd': OpensearchDescription(top_level)})
+
+        results.append({
+            'benchmark': 'description',
+            'handler': 'collection',
+            'description': measure(description, repeat),
+        })
+
+        for name, params in SCENARIOS.items():
+            results.extend(run_scenario(name, params, records, repeat, conn))
+
+    return results
+
+
+def record(path, records=(100,)):
+    """
+    Run each scenario once against the live index and save the responses
+    as fixtures
+
+    :param path: fixture file to write
+    :type path: str
+
+    :param records: page sizes to request
+    :type records: iterable
+    """
+    with connection(RecordingConnection(settings.ES_CONNECTION)) as conn:
+        OpensearchDescription(request_factory().get('/opensearch/description.xml'))
+
+        for name, params in SCENARIOS.items():
+            conn.files = name
+
+            OpensearchDescription(request_factory().get('/opensearch/description.xml', {'parentIdentifier': params['parentIdentifier']}))
+
+            for n in records:
+                OpensearchResponse(make_request(params, maximumRecords=n))
+
+        conn.save(path)
@@ -0,0 +1,105 @@
+# encoding: utf-8
+"""
+Compares the Atom writer with the response.xml template over synthetic
+granule level responses of increasing size.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import xml.etree.ElementTree as ET
+
+from django.template.loader import render_to_string
+
+from django_opensearch.opensearch.renderers import AtomWriter
+from . import measure, request_factory
+
+
+class SampleResponse:
+    """
+    Stands in for an OpensearchResponse with the given number of features
+    """
+
+    def __init__(self, records):
+        self.totalResults = records * 10
+        self.itemsPerPage = records
+        self.startPage = 1
+        self.subtitle = f'Showing 1 - {records} of {records * 10}'
+        self.queries = {'request': [{'parentIdentifier': 'cci', 'count': records}]}
+        self.links = {
+            'first': [{'href': 'http://localhost/opensearch/request?startPage=1', 'type': 'application/atom+xml'}],
+            'next': [{'href': 'http://localhost/opensearch/request?startPage=2&a=1', 'type': 'application/atom+xml'}],
+        }
+        self.features = [self.feature(i) for i in range(records)]
+
+    @staticmethod
+    def feature(i):
+        path = f'/neodc/esacci/sst/data/ESACCI-SST-L4-{i:06d}-fv02.0.nc'
+        return {
+            'type': 'Feature',
+            'id': f'{i:032x}',
+            'bbox': [[-180.0, -90.0], [180.0, 90.0]],
+            'properties': {
+                'title': path.rsplit('/', 1)[-1],
+                'identifier': f'{i:032x}',
+                'date': '2010-01-01T00:00:00/2010-01-01T23:59:59',
+                'filesize': 1024 * i,
+                'platform': 'NOAA-19 & Metop-A',
+                'variables': [
+                    {'var_id': 'analysed_sst', 'long_name': 'analysed sea surface temperature', 'units': 'kelvin'},
+                    {'var_id': 'sea_ice_fraction', 'long_name': "sea ice 'area' fraction", 'units': '1'},
+                ],
+                'links': {
+                    'describedby': [{'title': 'ISO19115', 'href': f'http://catalogue/export/xml/{i}'}],
+                    'related': [
+                        {'title': 'Download', 'href': f'http://dap{path}', 'type': 'application/octet-stream'},
+                        {'title': 'Opendap', 'href': f'http://opendap{path}.html', 'type': 'application/octet-stream'},
+                    ]
+                }
+            }
+        }
+
+
+def canonical(document):
+    """
+    Canonical form of the document ignoring whitespace between elements
+    """
+    return ET.canonicalize(document, strip_text=True)
+
+
+def run(records=(10, 100, 1000), repeat=5):
+    """
+    Render responses with the template and the writer
+
+    :param records: page sizes to render
+    :type records: iterable
+
+    :param repeat: number of timings per page size
+    :type repeat: int
+
+    :return: rows of results
+    :rtype: list
+    """
+    request = request_factory().get('/opensearch/request', {'parentIdentifier': 'cci'})
+    results = []
+
+    for n in records:
+        osr = SampleResponse(n)
+
+        def template():
+            return render_to_string('response.xml', {'osr': osr, 'request': request})
+
+        def writer():
+            return AtomWriter(osr, request).render()
+
+        results.append({
+            'benchmark': 'atom',
+            'records': n,
+            'template': measure(template, repeat),
+            'writer': measure(writer, repeat),
+            'identical': canonical(template()) == canonical(writer().decode('utf-8')),
+        })
+
+    return results
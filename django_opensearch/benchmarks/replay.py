@@ -0,0 +1,326 @@
+# encoding: utf-8
+"""
+Local stand-in for the elasticsearch connection which answers queries from
+recorded responses, so the request pipeline can be benchmarked without an
+index. Fixtures are recorded from a live index by running the benchmarks
+through :class:`RecordingConnection`.
+
+The fixture file holds::
+
+    {
+        "collections": [hit, ...],
+        "files": {name: {"total": int, "hits": [hit, ...]}},
+        "aggregations": {facet: aggregation, ...}
+    }
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from contextlib import contextmanager
+import copy
+import json
+import os
+
+from django.conf import settings
+from django.test import override_settings
+
+from django_opensearch.opensearch.backends.elasticsearch.resolver import COLLECTION_PATHS
+
+FIXTURES_FILE = os.path.join(os.path.dirname(__file__), 'fixtures', 'elasticsearch.json')
+
+
+def load_fixtures(path=None):
+    """
+    :param path: fixture file (default: the bundled fixtures)
+    :type path: str
+
+    :return: fixtures
+    :rtype: dict
+    """
+    with open(path or FIXTURES_FILE) as reader:
+        return json.load(reader)
+
+
+def find_term(query, field):
+    """
+    Find the value of a term clause for the field anywhere in the query
+
+    :param query: elasticsearch query
+    :param field: field name
+
+    :return: term value or None
+    """
+    if isinstance(query, dict):
+        term = query.get('term')
+        if isinstance(term, dict) and field in term:
+            return term[field]
+
+        values = query.values()
+
+    elif isinstance(query, list):
+        values = query
+
+    else:
+        return
+
+    for value in values:
+        found = find_term(value, field)
+        if found is not None:
+            return found
+
+
+class ReplayConnection:
+    """
+    Answers the queries made by the opensearch backend from the fixtures.
+    File searches return the recorded hits of the current file set, repeated
+    to fill the requested page. The position of each hit is kept in its sort
+    values so searches can continue from them with search_after.
+
+    :param fixtures: recorded responses
+    :type fixtures: dict
+
+    :param files: name of the file set to serve
+    :type files: str
+    """
+
+    index = 'replay-files'
+    collection_index = 'replay-collections'
+
+    def __init__(self, fixtures, files=None):
+        self.fixtures = fixtures
+        self.files = files or next(iter(fixtures['files']))
+
+    @property
+    def es(self):
+        return self
+
+    def aggregations(self, query):
+        recorded = self.fixtures['aggregations']
+
+        return {
+            'hits': {'hits': [], 'total': {'value': 0, 'relation': 'eq'}},
+            'aggregations': {name: recorded[name] for name in query['aggs'] if name in recorded}
+        }
+
+    def search(self, query=None, body=None, **kwargs):
+        """
+        Search the files
+        """
+        query = query if query is not None else body
+
+        if 'aggs' in query:
+            return self.aggregations(query)
+
+        files = self.fixtures['files'][self.files]
+        recorded = files['hits']
+        size = query.get('size', 10)
+
+        if query.get('search_after'):
+            position = int(query['search_after'][1].rsplit('-', 1)[1])
+            descending = any(
+                order.get('order') == 'desc'
+                for sort_key in query.get('sort', []) for order in sort_key.values()
+                if isinstance(order, dict)
+            )
+
+            if descending:
+                positions = range(position - 1, max(position - 1 - size, -1), -1)
+            else:
+                positions = range(position + 1, min(position + 1 + size, files['total']))
+
+        else:
+            start = query.get('from', 0)
+            positions = range(start, min(start + size, files['total']))
+
+        hits = []
+        for position in positions:
+            hit = copy.deepcopy(recorded[position % len(recorded)])
+            hit['_id'] = f'{hit["_id"]}-{position}'
+
+            source = hit['_source'].get('info', {})
+            hit['sort'] = [source.get('directory'), f'{source.get("name")}-{position}']
+            hits.append(hit)
+
+        response = {'hits': {'hits': hits}}
+
+        track_total_hits = query.get('track_total_hits')
+
+        if track_total_hits is True or track_total_hits is None:
+            response['hits']['total'] = {'value': files['total'], 'relation': 'eq'}
+
+        # Counted up to the bound
+        elif track_total_hits is not False:
+            response['hits']['total'] = {
+                'value': min(files['total'], track_total_hits),
+                'relation': 'gte' if files['total'] > track_total_hits else 'eq'
+            }
+
+        if 'pit' in query:
+            response['pit_id'] = query['pit']['id']
+
+        return response
+
+    def search_collections(self, query):
+        """
+        Search the collections
+        """
+        collections = self.fixtures['collections']
+
+        # Collection lookup with the number of children
+        if 'aggs' in query and 'children' in query['aggs']:
+            collection_id = find_term(query.get('post_filter'), 'collection_id')
+
+            return {
+                'hits': {
+                    'hits': [hit for hit in collections if hit['_source'].get('collection_id') == collection_id],
+                },
+                'aggregations': {
+                    'children': {
+                        'doc_count': sum(1 for hit in collections if hit['_source'].get('parent_identifier') == collection_id)
+                    }
+                }
+            }
+
+        if 'aggs' in query:
+            return self.aggregations(query)
+
+        parent = find_term(query, 'parent_identifier')
+
+        if 'match_all' in query.get('query', {}):
+            hits = collections
+        else:
+            hits = [hit for hit in collections if hit['_source'].get('parent_identifier') == parent]
+
+        return {
+            'hits': {
+                'hits': hits[:query.get('size', 10)],
+                'total': {'value': len(hits), 'relation': 'eq'}
+            }
+        }
+
+    def count(self, query):
+        return {'count': self.fixtures['files'][self.files]['total']}
+
+    def count_collections(self, query):
+        return {'count': len(self.fixtures['collections'])}
+
+    def mget(self, index=None, ids=None, **kwargs):
+        return {'docs': [{'_id': _id, 'found': False} for _id in ids]}
+
+    def open_point_in_time(self, index=None, keep_alive=None, **kwargs):
+        return {'id': 'replay'}
+
+    def close_point_in_time(self, **kwargs):
+        return {'succeeded': True}
+
+
+class RecordingConnection:
+    """
+    Passes queries through to a live connection and keeps the responses in
+    the fixture format
+
+    :param connection: live elasticsearch connection
+    """
+
+    def __init__(self, connection, files=None):
+        self.connection = connection
+        self.index = connection.index
+        self.collection_index = connection.collection_index
+        self.files = files
+        self.fixtures = {'collections': {}, 'files': {}, 'aggregations': {}}
+
+    @property
+    def es(self):
+        return self
+
+    @staticmethod
+    def body(response):
+        return getattr(response, 'body', response)
+
+    def record_hits(self, query, response):
+        if 'aggs' in query:
+            self.fixtures['aggregations'].update(response.get('aggregations', {}))
+            return
+
+        files = self.fixtures['files'].setdefault(self.files, {'total': 0, 'hits': []})
+        hits = response.get('hits', {})
+        seen = {hit['_id'] for hit in files['hits']}
+
+        files['hits'].extend(hit for hit in hits.get('hits', []) if hit['_id'] not in seen)
+        files['total'] = max(files['total'], hits.get('total', {}).get('value', 0))
+
+    def search(self, query=None, body=None, **kwargs):
+        query = query if query is not None else body
+
+        if kwargs:
+            response = self.body(self.connection.es.search(body=query, **kwargs))
+        else:
+            response = self.body(self.connection.search(query))
+
+        self.record_hits(query, response)
+
+        return response
+
+    def search_collections(self, query):
+        response = self.body(self.connection.search_collections(query))
+
+        for hit in response.get('hits', {}).get('hits', []):
+            self.fixtures['collections'][hit['_id']] = hit
+
+        if 'aggs' in query and 'children' not in query['aggs']:
+            self.fixtures['aggregations'].update(response.get('aggregations', {}))
+
+        return response
+
+    def __getattr__(self, name):
+        # count, mget and the point in time calls are not recorded
+        target = self.connection.es if name in ('mget', 'open_point_in_time', 'close_point_in_time') else self.connection
+        return getattr(target, name)
+
+    def save(self, path):
+        """
+        Write the recorded responses as a fixture file
+        """
+        fixtures = dict(self.fixtures, collections=list(self.fixtures['collections'].values()))
+
+        with open(path, 'w') as writer:
+            json.dump(fixtures, writer, indent=1)
+
+
+@contextmanager
+def connection(replacement):
+    """
+    Use the connection in place of settings.ES_CONNECTION. The collection
+    lookups cached from the other connection are dropped on the way in and
+    out.
+    """
+    original = settings.ES_CONNECTION
+    settings.ES_CONNECTION = replacement
+    COLLECTION_PATHS.clear()
+
+    try:
+        yield replacement
+    finally:
+        settings.ES_CONNECTION = original
+        COLLECTION_PATHS.clear()
+
+
+@contextmanager
+def isolated_caches():
+    """
+    Keep the opensearch responses in a private in-memory cache, so responses
+    built from the fixtures are not written to the cache shared with the
+    server processes. Search results are not cached so that repeated
+    requests reach the connection.
+    """
+    caches = dict(settings.CACHES, opensearch_replay={
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'opensearch-replay',
+    })
+
+    with override_settings(CACHES=caches, OPENSEARCH_CACHE='opensearch_replay',
+                           SEARCH_RESULT_CACHE=None, SEARCH_RESULT_CACHE_TIMEOUT=0):
+        yield
@@ -0,0 +1,57 @@
+# encoding: utf-8
+"""
+Measures the time to start a worker, running django.setup() in a fresh
+interpreter with the current settings module, and the cost of loading the
+vocabularies which is now deferred until first use.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+import subprocess
+import sys
+
+from django_opensearch.opensearch.lookup.vocab import Vocabulary
+
+from . import measure
+
+BOOT = 'import django; django.setup()'
+
+
+def boot():
+    """
+    Start a new interpreter and set up django
+    """
+    subprocess.run([sys.executable, '-c', BOOT], check=True, env=os.environ.copy())
+
+
+def run(records=(10, 100, 1000), repeat=5):
+    """
+    Time the worker start up and the vocabulary loading. The records are
+    not used.
+
+    :param repeat: number of timings
+    :type repeat: int
+
+    :return: rows of results
+    :rtype: list
+    """
+    vocabulary = Vocabulary()
+
+    row = {
+        'benchmark': 'startup',
+        'boot': measure(boot, repeat),
+        'vocab_file': measure(vocabulary.load, repeat),
+    }
+
+    # Fetching the vocabularies was part of the start up before they were
+    # loaded lazily. Left out if the vocab server cannot be reached.
+    try:
+        row['vocab_server'] = measure(vocabulary.fetch, repeat)
+    except Exception:
+        pass
+
+    return [row]
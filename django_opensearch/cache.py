@@ -0,0 +1,301 @@
+# encoding: utf-8
+"""
+Response caching built on the django cache framework.
+
+Cache keys include a generation marker which is replaced by :func:`invalidate`,
+so all cached responses can be dropped at once when the indices are updated.
+The marker is kept in settings.OPENSEARCH_GENERATION_CACHE, if set, so it is
+not culled along with the responses. It should be shared by the server
+processes, otherwise invalidation only reaches the process which made it.
+
+Also provides :class:`SizeLimitedLocMemCache`, a local memory cache backend
+which is limited by the size of the cached values rather than their number.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import hashlib
+import json
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from django_opensearch import settings
+
+GENERATION_KEY = 'opensearch:generation'
+
+
+def get_cache():
+    """
+    :return: The django cache used for opensearch responses
+    """
+    return caches[settings.OPENSEARCH_CACHE]
+
+
+def get_generation_cache():
+    """
+    :return: The django cache holding the generation marker
+    """
+    return caches[settings.OPENSEARCH_GENERATION_CACHE or settings.OPENSEARCH_CACHE]
+
+
+def is_process_local():
+    """
+    Whether the generation marker is only visible to the current process
+
+    :rtype: bool
+    """
+    return isinstance(get_generation_cache(), (LocMemCache, DummyCache))
+
+
+def canonical_params(params, ignore=()):
+    """
+    Convert query parameters into a canonical form which does not depend
+    on the order the parameters were supplied in.
+
+    :param params: URL params
+    :type params: <class 'django.http.request.QueryDict'>
+
+    :param ignore: parameters to leave out
+    :type ignore: iterable
+
+    :return: sorted list of (key, sorted values)
+    :rtype: list
+    """
+    canonical = []
+
+    for key in sorted(params):
+        if key in ignore:
+            continue
+
+        if hasattr(params, 'getlist'):
+            values = params.getlist(key)
+        else:
+            values = [params[key]]
+
+        canonical.append((key, sorted(str(value) for value in values)))
+
+    return canonical
+
+
+def fingerprint(*parts):
+    """
+    Stable hash of the supplied parts
+
+    :return: hex digest
+    :rtype: str
+    """
+    data = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def get_generation():
+    """
+    Get the current cache generation marker, creating one if it does not exist
+
+    :return: generation marker
+    :rtype: str
+    """
+    cache = get_generation_cache()
+    generation = cache.get(GENERATION_KEY)
+
+    if generation is None:
+        cache.add(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(GENERATION_KEY)
+
+    return generation
+
+
+def invalidate():
+    """
+    Invalidate all cached opensearch responses by replacing the generation
+    marker. Old entries are left to expire.
+    """
+    get_generation_cache().set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+class ResponseCache:
+    """
+    Namespaced cache for opensearch responses
+
+    :param namespace: prefix for the cache keys
+    :type namespace: str
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def make_key(self, *parts):
+        """
+        Build a cache key from the current generation and the given parts
+
+        :return: cache key
+        :rtype: str
+        """
+        return f'opensearch:{self.namespace}:{get_generation()}:{fingerprint(*parts)}'
+
+    def get_cache(self):
+        """
+        :return: The django cache the responses are stored in
+        """
+        return get_cache()
+
+    def get(self, key):
+        return self.get_cache().get(key)
+
+    def set(self, key, value, timeout):
+        """
+        Store the value. A timeout of 0 or less disables caching.
+        """
+        if timeout is not None and timeout <= 0:
+            return
+
+        self.get_cache().set(key, value, timeout=timeout)
+
+    def add(self, key, value, timeout):
+        """
+        Store the value if the key is not already set. A timeout of 0 or
+        less disables caching.
+
+        :return: Whether the value was stored
+        :rtype: bool
+        """
+        if timeout is not None and timeout <= 0:
+            return False
+
+        return self.get_cache().add(key, value, timeout=timeout)
+
+    def delete(self, key):
+        self.get_cache().delete(key)
+
+
+class SearchResultCache(ResponseCache):
+    """
+    Cache for pages of search results, stored in settings.SEARCH_RESULT_CACHE
+    if set. The generation marker is kept in the opensearch cache.
+    """
+
+    def get_cache(self):
+        return caches[settings.SEARCH_RESULT_CACHE or settings.OPENSEARCH_CACHE]
+
+
+DESCRIPTION_CACHE = ResponseCache('description')
+
+
+def description_cache_key(request):
+    """
+    Cache key for a description document. The host is included as it is
+    used to build the URL templates.
+
+    :param request: Django request
+    :return: cache key
+    :rtype: str
+    """
+    return DESCRIPTION_CACHE.make_key(
+        request._current_scheme_host,
+        canonical_params(request.GET),
+        settings.RESPONSE_TYPES
+    )
+
+
+def description_cache_timeout(request):
+    """
+    :param request: Django request
+    :return: time to live for the requested description document
+    :rtype: int
+    """
+    if request.GET.get('parentIdentifier'):
+        return settings.DESCRIPTION_CACHE_TIMEOUT
+
+    return settings.DESCRIPTION_CACHE_TOP_LEVEL_TIMEOUT
+
+
+class CacheUsage:
+    """
+    Size of each value in a cache and the total
+    """
+
+    def __init__(self):
+        self.sizes = {}
+        self.total = 0
+
+    def add(self, key, size):
+        self.remove(key)
+        self.sizes[key] = size
+        self.total += size
+
+    def remove(self, key):
+        self.total -= self.sizes.pop(key, 0)
+
+    def retain(self, keys):
+        """
+        Forget the sizes of values which are no longer in the cache
+        """
+        for key in [key for key in self.sizes if key not in keys]:
+            self.remove(key)
+
+    def clear(self):
+        self.sizes.clear()
+        self.total = 0
+
+
+# Usage of each SizeLimitedLocMemCache, keyed by name like the values
+_usage = {}
+
+
+class SizeLimitedLocMemCache(LocMemCache):
+    """
+    Local memory cache which evicts the least recently used values to keep
+    the total size of the pickled values under OPTIONS['MAX_SIZE'] bytes.
+    Values larger than MAX_SIZE are not stored. MAX_ENTRIES still applies.
+    """
+
+    # Default limit of 64 MiB
+    max_size = 64 * 1024 * 1024
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._max_size = int(params.get('OPTIONS', {}).get('MAX_SIZE', self.max_size))
+        self._usage = _usage.setdefault(name, CacheUsage())
+
+    @property
+    def size(self):
+        """
+        :return: total size of the cached values in bytes
+        :rtype: int
+        """
+        return self._usage.total
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        size = len(value)
+        self._delete(key)
+
+        if size > self._max_size:
+            return
+
+        # Least recently used values are at the end
+        while self._cache and self._usage.total + size > self._max_size:
+            self._delete(next(reversed(self._cache)))
+
+        super()._set(key, value, timeout)
+        self._usage.add(key, size)
+
+    def _cull(self):
+        super()._cull()
+        self._usage.retain(self._cache)
+
+    def _delete(self, key):
+        self._usage.remove(key)
+        return super()._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._usage.clear()
@@ -0,0 +1,183 @@
+# encoding: utf-8
+"""
+Validators and cache headers for conditional requests.
+
+Descriptions, manifests and collection searches carry an ETag. Requests
+with a matching If-None-Match are answered with 304 Not Modified.
+Cache-Control is set per endpoint from settings.CACHE_CONTROL.
+
+Collection events are recorded when a collection is added, updated or
+removed, but not when files are added to one or changed. File searches have
+no validators, and a Last-Modified date from the latest event is only sent
+for the manifests and collection searches, where the events cover every
+change to the content. Requests with an
+If-Modified-Since no older than the last event are answered with 304.
+Events are dated to the day, so a collection changed today is treated as
+modified now.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from datetime import datetime, time, timedelta, timezone
+import hashlib
+
+from django.apps import apps
+from django.db import DatabaseError
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from django_opensearch import settings
+from django_opensearch.cache import ResponseCache, fingerprint
+
+LAST_MODIFIED_CACHE = ResponseCache('last_modified')
+
+
+def content_etag(content):
+    """
+    Strong ETag from the response body
+
+    :param content: response body
+    :type content: bytes
+
+    :return: ETag
+    :rtype: str
+    """
+    return quote_etag(hashlib.sha1(content).hexdigest())
+
+
+def weak_etag(*parts):
+    """
+    Weak ETag from the parts which determine the response
+
+    :return: ETag
+    :rtype: str
+    """
+    return f'W/{quote_etag(fingerprint(*parts))}'
+
+
+def get_latest_event(collection_id=None):
+    """
+    Date and ID of the latest event for the collection, or any collection
+    if not given. Read from the database so it is the same for every
+    process.
+
+    :param collection_id: collection ID
+    :type collection_id: str
+
+    :return: POSIX timestamp and event ID, 0 if there are no events, or
+        None if events are not recorded
+    :rtype: tuple(int, int)
+    """
+    if not apps.is_installed('events'):
+        return
+
+    key = LAST_MODIFIED_CACHE.make_key(collection_id)
+    latest = LAST_MODIFIED_CACHE.get(key)
+
+    if latest is not None:
+        return latest
+
+    from events.models import Event
+
+    events = Event.objects.all()
+
+    if collection_id:
+        events = events.filter(collection_id=collection_id)
+
+    try:
+        result = events.aggregate(datetime=Max('datetime'), id=Max('id'))
+    except DatabaseError:
+        return
+
+    timestamp = 0
+
+    if result['datetime'] is not None:
+        end_of_day = datetime.combine(result['datetime'] + timedelta(days=1), time(), tzinfo=timezone.utc)
+        timestamp = int(min(end_of_day, datetime.now(timezone.utc)).timestamp())
+
+    latest = (timestamp, result['id'] or 0)
+
+    LAST_MODIFIED_CACHE.set(key, latest, settings.LAST_MODIFIED_CACHE_TIMEOUT)
+
+    return latest
+
+
+def get_last_modified(collection_id=None):
+    """
+    Time of the latest event for the collection, or any collection if not
+    given
+
+    :param collection_id: collection ID
+    :type collection_id: str
+
+    :return: POSIX timestamp or None if there are no events
+    :rtype: int
+    """
+    latest = get_latest_event(collection_id)
+
+    if latest:
+        return latest[0] or None
+
+
+def get_event_marker():
+    """
+    ID of the latest event for any collection. Changes whenever an event is
+    recorded, so it can be used in ETags for content built from the
+    collections.
+
+    :return: event ID or None if events are not recorded
+    :rtype: int
+    """
+    latest = get_latest_event()
+
+    if latest:
+        return latest[1]
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """
+    :param request: Django request
+    :param etag: ETag of the current response
+    :type etag: str
+
+    :param last_modified: POSIX timestamp of the last modification
+    :type last_modified: int
+
+    :return: 304 or 412 response if the request preconditions say so,
+        otherwise None
+    """
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def add_validators(response, endpoint, etag=None, last_modified=None):
+    """
+    Add the validators and the Cache-Control policy for the endpoint
+
+    :param response: Django response
+    :param endpoint: key in settings.CACHE_CONTROL
+    :type endpoint: str
+
+    :param etag: ETag
+    :type etag: str
+
+    :param last_modified: POSIX timestamp of the last modification
+    :type last_modified: int
+
+    :return: response
+    """
+    if etag:
+        response['ETag'] = etag
+
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+
+    cache_control = settings.CACHE_CONTROL.get(endpoint)
+
+    if cache_control:
+        patch_cache_control(response, **cache_control)
+
+    return response
@@ -37,3 +37,134 @@ EO_NAMESPACE_TAG = 'eo'
 TIME_NAMESPACE_TAG = 'time'
 CEDA_NAMESPACE_TAG = 'ceda'
 DUBLIN_CORE_NAMESPACE_TAG = 'dc'
+
+# Backup download service lookups. Files without a backup record are
+# remembered for this many seconds to avoid repeat lookups.
+BACKUP_MISS_CACHE_TTL = 60
+BACKUP_MISS_CACHE_SIZE = 10000
+
+# Data bridge relationship lookups. DATA_BRIDGE_TIMEOUT applies to each
+# request and DATA_BRIDGE_DEADLINE to all the lookups for a page, after which
+# the page is returned without the remaining relationships. Failed lookups,
+# including timeouts, are cached for DATA_BRIDGE_NEGATIVE_CACHE_TTL seconds.
+PROVIDERS_MAP = {}
+DATA_BRIDGE_TIMEOUT = 2
+DATA_BRIDGE_DEADLINE = 3
+DATA_BRIDGE_MAX_WORKERS = 10
+DATA_BRIDGE_CACHE_SIZE = 2048
+DATA_BRIDGE_CACHE_TTL = 3600
+DATA_BRIDGE_NEGATIVE_CACHE_TTL = 300
+
+# Response caching. OPENSEARCH_CACHE is the alias from the django CACHES
+# setting. The generation marker used to invalidate the cached responses is
+# kept in OPENSEARCH_GENERATION_CACHE, or OPENSEARCH_CACHE if None. It must
+# be shared by the server processes for invalidation to reach all of them,
+# and should not cull entries. Timeouts are in seconds, 0 disables caching.
+OPENSEARCH_CACHE = 'default'
+OPENSEARCH_GENERATION_CACHE = None
+DESCRIPTION_CACHE_TIMEOUT = 3600
+DESCRIPTION_CACHE_TOP_LEVEL_TIMEOUT = 3600
+
+# Pages of granule search results are cached for SEARCH_RESULT_CACHE_TIMEOUT
+# seconds, 0 disables caching. SEARCH_RESULT_CACHE is the alias from the
+# django CACHES setting, OPENSEARCH_CACHE if None. The
+# django_opensearch.cache.SizeLimitedLocMemCache backend limits the cache
+# by the size of the pages with OPTIONS['MAX_SIZE'] in bytes.
+SEARCH_RESULT_CACHE = None
+SEARCH_RESULT_CACHE_TIMEOUT = 60
+
+# Cache-Control directives for each endpoint, passed to
+# django.utils.cache.patch_cache_control. The last modified dates of the
+# collections, from the events, are cached for LAST_MODIFIED_CACHE_TIMEOUT
+# seconds.
+CACHE_CONTROL = {
+    'description': {'public': True, 'max_age': 3600},
+    'search': {'public': True, 'max_age': 60},
+    'manifest': {'public': True, 'max_age': 3600},
+}
+LAST_MODIFIED_CACHE_TIMEOUT = 60
+
+# Collection ID to path lookups. Unknown IDs are cached for the negative TTL.
+# If COLLECTION_PATH_PRELOAD is set, all paths are loaded on the first lookup
+# and again after the opensearch cache is invalidated. Invalidation is
+# checked for at most every COLLECTION_PATH_REFRESH_INTERVAL seconds.
+COLLECTION_PATH_CACHE_SIZE = 10000
+COLLECTION_PATH_CACHE_TTL = 3600
+COLLECTION_PATH_NEGATIVE_CACHE_TTL = 60
+COLLECTION_PATH_PRELOAD = True
+COLLECTION_PATH_PRELOAD_SIZE = 10000
+COLLECTION_PATH_REFRESH_INTERVAL = 5
+
+# How the total number of results is calculated. One of:
+#   exact: count all hits in the search request
+#   bounded: count up to TOTAL_HITS_BOUND hits, larger totals are reported
+#            as a lower bound without a link to the last page
+#   cached: count all hits once per query and cache the total
+# Can be overridden per request with the countMode parameter.
+TOTAL_HITS_MODE = 'exact'
+TOTAL_HITS_BOUND = 10000
+TOTAL_HITS_CACHE_TIMEOUT = 300
+
+# Indent GeoJSON responses. Responses are compact by default.
+GEOJSON_PRETTY = False
+
+# Pages beyond the elasticsearch result window (index.max_result_window) are
+# retrieved with a point in time and search_after when DEEP_PAGING is set.
+# The PIT and the positions of the pages found so far are cached for reuse,
+# PIT_CACHE_TIMEOUT should not be longer than PIT_KEEP_ALIVE. Pages more than
+# PIT_MAX_SEEK hits past a known position are refused with a 400.
+RESULT_WINDOW = 10000
+DEEP_PAGING = True
+PIT_KEEP_ALIVE = '5m'
+PIT_CACHE_TIMEOUT = 300
+PIT_MAX_SEEK = 20000
+
+# Number of granules retrieved per request by the export endpoint
+EXPORT_BATCH_SIZE = 1000
+
+# Facet values for the description documents written by the
+# build_facet_value_store command. Values are aggregated from the index
+# when this is not set or the collection is missing from the store.
+FACET_VALUE_STORE_FILE = None
+
+# Maximum number of collection handler instances shared between requests
+HANDLER_CACHE_SIZE = 10000
+
+# Vocabularies used for the facet labels. VOCAB_CACHE_FILE, written by the
+# retrieve_vocab_cache command and the background refresh, is used in
+# preference to VOCAB_FILE. Both are read on first use.
+VOCAB_FILE = None
+VOCAB_CACHE_FILE = None
+
+# Vocab server, defaults to the cci_facet_scanner endpoint
+VOCAB_ENDPOINT = None
+
+# Seconds between refreshes of the vocabularies from the vocab server.
+# Disabled when None.
+VOCAB_REFRESH_INTERVAL = None
+
+# Request timing. SERVER_TIMING adds a Server-Timing header with the time
+# spent in each phase of the request. METRICS_ENABLED keeps latency
+# histograms, with the bucket bounds in seconds, served by the metrics
+# endpoint. The endpoint only answers requests from the addresses or
+# networks in METRICS_ALLOWED_IPS, matched against REMOTE_ADDR, so behind a
+# proxy the proxy must restrict access as well.
+SERVER_TIMING = True
+METRICS_ENABLED = False
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Slow query log. Elasticsearch requests slower than SLOW_QUERY_THRESHOLD
+# seconds, or which took elasticsearch longer than SLOW_QUERY_TOOK_THRESHOLD
+# seconds, are logged to the django_opensearch.slow_query logger. Disabled
+# when both are None. SLOW_QUERY_SAMPLE_RATE is the fraction of slow queries
+# logged and SLOW_QUERY_MAX_SIZE limits the length of the logged query and
+# parameters in characters.
+SLOW_QUERY_THRESHOLD = None
+SLOW_QUERY_TOOK_THRESHOLD = None
+SLOW_QUERY_SAMPLE_RATE = 1.0
+SLOW_QUERY_MAX_SIZE = 10000
+
+# JSON lines file the opensearch_benchmark results are added to. Each run
+# is compared with the previous one. Disabled when None.
+BENCHMARK_HISTORY_FILE = None
@@ -0,0 +1,71 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import copy
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from django_opensearch import settings
+from django_opensearch.opensearch.opensearch import OpensearchDescription, Collection, Granule
+from django_opensearch.opensearch.backends.elasticsearch.resolver import COLLECTION_PATHS
+from django_opensearch.opensearch.utils.facet_value_store import FacetValueStore
+
+
+class Command(BaseCommand):
+    help = 'Aggregates the facet values for the top level and each collection description and writes them to the facet value store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write the store to (default: settings.FACET_VALUE_STORE_FILE)')
+
+    def handle(self, *args, **options):
+
+        store = FacetValueStore(options['output'])
+
+        if not store.path:
+            raise CommandError('No output file given and FACET_VALUE_STORE_FILE is not set')
+
+        collections = COLLECTION_PATHS.all_collections()
+
+        if collections is None:
+            raise CommandError('Unable to retrieve all collections in one request. Increase COLLECTION_PATH_PRELOAD_SIZE')
+
+        data = {}
+
+        # Top level description
+        self.add(data, store, Collection(path=OpensearchDescription.DEFAULT_PATH), QueryDict())
+
+        for collection_id, info in collections.items():
+            params = QueryDict(mutable=True)
+            params['parentIdentifier'] = collection_id
+
+            if info.has_children:
+                facet_set = Collection(path=info.path)
+            else:
+                facet_set = copy.copy(Granule(info.path).handler)
+
+            try:
+                self.add(data, store, facet_set, params)
+            except Exception as e:
+                self.stderr.write(f'Failed to aggregate facet values for {collection_id}: {e}')
+
+        store.write(data)
+
+        self.stdout.write(f'Stored facet values for {len(data)} descriptions in {store.path}')
+
+    @staticmethod
+    def add(data, store, facet_set, params):
+        """
+        Aggregate the facet values as they would be for the description
+        document and add them to the data
+        """
+        facet_set.use_facet_value_store = False
+        facet_set.get_facet_set(params)
+
+        data[store.make_key(facet_set.__class__.__name__, params)] = facet_set.facet_values
@@ -0,0 +1,31 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from django.core.management.base import BaseCommand
+from django_opensearch import settings
+from django_opensearch.cache import invalidate, is_process_local
+
+
+class Command(BaseCommand):
+    help = 'Invalidates cached opensearch responses. Run after the indices have been updated'
+
+    def handle(self, *args, **options):
+
+        if is_process_local():
+            self.stderr.write(self.style.WARNING(
+                f'The opensearch cache "{settings.OPENSEARCH_CACHE}" is local to each process. '
+                'Only this command\'s copy has been invalidated and the server will keep its cached '
+                'responses until they expire. Set OPENSEARCH_CACHE to a cache shared by the server '
+                'processes, such as a file, database or redis cache.'
+            ))
+            return
+
+        invalidate()
+        self.stdout.write('Opensearch cache invalidated')
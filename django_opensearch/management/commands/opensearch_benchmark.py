@@ -0,0 +1,86 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from importlib import import_module
+import inspect
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_opensearch import settings
+from django_opensearch.benchmarks import history
+
+BENCHMARKS = {
+    'handlers': 'django_opensearch.benchmarks.handlers',
+    'pipeline': 'django_opensearch.benchmarks.pipeline',
+    'rendering': 'django_opensearch.benchmarks.rendering',
+    'startup': 'django_opensearch.benchmarks.startup',
+}
+
+
+class Command(BaseCommand):
+    help = 'Runs the opensearch micro-benchmarks and prints the median time per call'
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmarks', nargs='*',
+                            help=f'Benchmarks to run from {", ".join(sorted(BENCHMARKS))} (default: all)')
+        parser.add_argument('--records', nargs='+', type=int, default=[10, 100, 1000],
+                            help='Page sizes to run the benchmarks with')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timings to take')
+        parser.add_argument('--fixtures', help='Recorded elasticsearch responses to replay (default: bundled fixtures)')
+        parser.add_argument('--record', metavar='PATH',
+                            help='Record the elasticsearch responses used by the pipeline benchmark to PATH and exit')
+        parser.add_argument('--history', help='File to keep the results in (default: settings.BENCHMARK_HISTORY_FILE)')
+        parser.add_argument('--label', help='Label for this run in the history, such as the revision')
+
+    def handle(self, *args, **options):
+
+        if options['record']:
+            from django_opensearch.benchmarks.pipeline import record
+
+            record(options['record'], records=options['records'])
+            self.stdout.write(f'Recorded fixtures to {options["record"]}')
+            return
+
+        names = options['benchmarks'] or sorted(BENCHMARKS)
+
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+
+        history_file = options['history'] or settings.BENCHMARK_HISTORY_FILE
+        previous = history.previous(history_file) if history_file else {}
+        rows = []
+
+        for name in names:
+            module = import_module(BENCHMARKS[name])
+
+            kwargs = {'records': options['records'], 'repeat': options['repeat']}
+            if options['fixtures'] and 'fixtures' in inspect.signature(module.run).parameters:
+                kwargs['fixtures'] = options['fixtures']
+
+            results = module.run(**kwargs)
+
+            for row in results:
+                details, timings = history.split_row(row)
+                before = previous.get(history.row_key(details), {})
+
+                output = [f'{key}={value}' for key, value in details.items()]
+                for key, value in timings.items():
+                    change = ''
+                    if before.get(key):
+                        change = f'({(value - before[key]) / before[key]:+.0%})'
+                    output.append(f'{key}={value:.2f}ms{change}')
+
+                self.stdout.write(' '.join(output))
+
+            rows.extend(results)
+
+        if history_file:
+            history.append(history_file, rows, options['label'])
@@ -0,0 +1,65 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_opensearch.benchmarks.load import HttpTarget, InProcessTarget, read_urls, replay, summarise
+from django_opensearch.benchmarks.replay import ReplayConnection, connection, isolated_caches, load_fixtures
+
+
+class Command(BaseCommand):
+    help = 'Replays the opensearch requests from an access log and reports the throughput, latency and errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='Access log or file of request URLs')
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--host', help='Base URL of the service to send the requests to')
+        target.add_argument('--in-process', action='store_true',
+                            help='Send the requests to this project with elasticsearch replaced by recorded responses')
+        parser.add_argument('--fixtures', help='Recorded elasticsearch responses for --in-process (default: bundled fixtures)')
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of requests in flight')
+        parser.add_argument('--repeat', type=int, default=1, help='Number of times to replay the log')
+        parser.add_argument('--limit', type=int, help='Only replay the first LIMIT requests')
+        parser.add_argument('--timeout', type=float, default=60, help='Request timeout in seconds for --host')
+
+    def handle(self, *args, **options):
+
+        urls = read_urls(options['log'])[:options['limit']]
+
+        if not urls:
+            raise CommandError(f'No opensearch requests found in {options["log"]}')
+
+        urls = urls * options['repeat']
+
+        if options['in_process']:
+            target = InProcessTarget()
+            backend = connection(ReplayConnection(load_fixtures(options['fixtures'])))
+            caches = isolated_caches()
+        else:
+            target = HttpTarget(options['host'], options['timeout'], options['concurrency'])
+            backend = nullcontext()
+            caches = nullcontext()
+
+        with caches, backend:
+            results, elapsed = replay(urls, target, options['concurrency'])
+
+        self.stdout.write(f'{len(results)} requests in {elapsed:.1f}s with {options["concurrency"]} workers')
+
+        for row in summarise(results, elapsed):
+            label = f'{row["group"]}={row["name"]}' if row['name'] else row['group']
+
+            self.stdout.write(
+                f'{label} requests={row["requests"]} '
+                f'throughput={row["throughput"]:.1f}/s errors={row["errors"]:.1%} '
+                f'client_errors={row["client_errors"]:.1%} '
+                f'p50={row["p50"]:.1f}ms p95={row["p95"]:.1f}ms p99={row["p99"]:.1f}ms'
+            )
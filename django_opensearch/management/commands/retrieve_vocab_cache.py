@@ -9,9 +9,8 @@ __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 from django.core.management.base import BaseCommand, CommandError
-from django.conf import settings
-from cci_facet_scanner.tagging.facets import Facets
-import json
+from django_opensearch import settings
+from django_opensearch.opensearch.lookup.vocab import Vocabulary
 
 
 class Command(BaseCommand):
@@ -19,6 +18,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
 
-        facets = Facets()
-        with open(settings.VOCAB_CACHE_FILE,'w') as writer:
-            json.dump(facets.to_json(), writer)
\ No newline at end of file
+        if not settings.VOCAB_CACHE_FILE:
+            raise CommandError('VOCAB_CACHE_FILE is not set')
+
+        Vocabulary.save(Vocabulary.fetch(), settings.VOCAB_CACHE_FILE)
@@ -0,0 +1,304 @@
+# encoding: utf-8
+"""
+Request timing and latency metrics.
+
+Each request is given a :class:`RequestTimer` by the metrics middleware.
+Code wraps the phases of a request in :func:`phase`, which adds the elapsed
+time to the timer of the current request, if there is one. When the request
+finishes the phases are returned in the Server-Timing header and added to
+the latency histograms and counters in :data:`METRICS`, which are served in
+the Prometheus text format by the metrics endpoint.
+
+The metrics are held per process so each worker has to be scraped.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import threading
+import time
+
+from django_opensearch import settings
+
+# Timer for the request being handled. Copied into the worker threads used
+# by sync_to_async along with the rest of the context.
+REQUEST_TIMER = ContextVar('opensearch_request_timer', default=None)
+
+# Metric name: (type, help)
+METRIC_TYPES = {
+    'opensearch_requests_total': ('counter', 'Requests handled'),
+    'opensearch_request_duration_seconds': ('histogram', 'Time to handle the request, including streaming the response'),
+    'opensearch_phase_duration_seconds': ('histogram', 'Time spent in each phase of a request'),
+    'opensearch_phase_calls_total': ('counter', 'Times each phase was entered'),
+}
+
+
+class RequestTimer:
+    """
+    Time spent in each phase of a request and the labels used to record it
+
+    :param params: opensearch parameters of the request
+    :type params: dict
+    """
+
+    def __init__(self, params=None):
+        self.start = time.perf_counter()
+        self.params = params or {}
+        self.phases = {}
+        self.labels = {'handler': ''}
+        self._lock = threading.Lock()
+
+    def add(self, name, duration):
+        """
+        Add time to a phase
+
+        :param name: phase name
+        :type name: str
+
+        :param duration: seconds
+        :type duration: float
+        """
+        with self._lock:
+            total, calls = self.phases.get(name, (0.0, 0))
+            self.phases[name] = (total + duration, calls + 1)
+
+    def elapsed(self):
+        """
+        :return: seconds since the request started
+        :rtype: float
+        """
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """
+        :return: Server-Timing header value for the phases so far
+        :rtype: str
+        """
+        with self._lock:
+            phases = list(self.phases.items())
+
+        timings = [f'{name};dur={total * 1000:.1f}' for name, (total, _) in phases]
+        timings.append(f'total;dur={self.elapsed() * 1000:.1f}')
+
+        return ', '.join(timings)
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the time spent in the block to the phase of the current request
+
+    :param name: phase name
+    :type name: str
+    """
+    timer = REQUEST_TIMER.get()
+
+    if timer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """
+    Decorator to add the time spent in the function to the phase of the
+    current request
+
+    :param name: phase name
+    :type name: str
+    """
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def set_label(name, value):
+    """
+    Set a label used to record the metrics for the current request
+
+    :param name: label name
+    :type name: str
+
+    :param value: label value
+    :type value: str
+    """
+    timer = REQUEST_TIMER.get()
+
+    if timer is not None:
+        timer.labels[name] = value
+
+
+class Histogram:
+    """
+    Count of observations in each bucket
+
+    :param buckets: upper bounds of the buckets, in ascending order
+    :type buckets: tuple
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+
+        if index < len(self.buckets):
+            self.counts[index] += 1
+
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        :return: (upper bound, count of observations less than or equal to it)
+        :rtype: generator
+        """
+        total = 0
+
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """
+    Latency histograms and counters for the requests handled by this process
+
+    :param buckets: histogram bucket upper bounds in seconds
+    :type buckets: iterable
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        """
+        Add an observation to a histogram
+        """
+        key = self.key(name, labels)
+
+        with self._lock:
+            histogram = self.histograms.get(key)
+
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+
+            histogram.observe(value)
+
+    def increment(self, name, value=1, **labels):
+        """
+        Increase a counter
+        """
+        key = self.key(name, labels)
+
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record(self, timer, endpoint, status):
+        """
+        Record a finished request
+
+        :param timer: request timer
+        :type timer: RequestTimer
+
+        :param endpoint: URL route
+        :type endpoint: str
+
+        :param status: response status code
+        :type status: int
+        """
+        labels = {'endpoint': endpoint, 'handler': timer.labels.get('handler', '')}
+
+        self.increment('opensearch_requests_total', status=str(status), **labels)
+        self.observe('opensearch_request_duration_seconds', timer.elapsed(), **labels)
+
+        for name, (total, calls) in list(timer.phases.items()):
+            self.observe('opensearch_phase_duration_seconds', total, phase=name, **labels)
+            self.increment('opensearch_phase_calls_total', calls, phase=name, **labels)
+
+    @staticmethod
+    def format_labels(labels, **extra):
+        labels = list(labels) + list(extra.items())
+
+        if not labels:
+            return ''
+
+        escaped = (
+            (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in labels
+        )
+
+        return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+    def render(self):
+        """
+        :return: metrics in the Prometheus text format
+        :rtype: str
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, list(histogram.cumulative()), histogram.sum, histogram.count)
+                for key, histogram in self.histograms.items()
+            )
+
+        samples = {name: [] for name in METRIC_TYPES}
+
+        for (name, labels), value in counters:
+            samples[name].append(f'{name}{self.format_labels(labels)} {value}')
+
+        for (name, labels), buckets, total, count in histograms:
+            lines = samples[name]
+
+            for bound, bucket_count in buckets:
+                lines.append(f'{name}_bucket{self.format_labels(labels, le=bound)} {bucket_count}')
+
+            lines.append(f'{name}_bucket{self.format_labels(labels, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{self.format_labels(labels)} {total}')
+            lines.append(f'{name}_count{self.format_labels(labels)} {count}')
+
+        output = []
+
+        for name, (metric_type, description) in METRIC_TYPES.items():
+            output.append(f'# HELP {name} {description}')
+            output.append(f'# TYPE {name} {metric_type}')
+            output.extend(samples[name])
+
+        return '\n'.join(output) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+METRICS = MetricsRegistry(settings.METRICS_BUCKETS)
@@ -0,0 +1,160 @@
+# encoding: utf-8
+"""
+Middleware for the django_opensearch application
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django_opensearch import settings
+from django_opensearch.metrics import METRICS, REQUEST_TIMER, RequestTimer
+
+
+class MetricsMiddleware:
+    """
+    Times each request. Adds the Server-Timing header, with the phases
+    completed before the response is returned, and records the request in
+    the metrics once the response has been sent.
+
+    Streamed responses are written after the headers, so the time to write
+    them, including building the entries of lazy responses, is only in the
+    metrics, as the render phase.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        timer = RequestTimer(dict(request.GET.lists()))
+        token = REQUEST_TIMER.set(timer)
+
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUEST_TIMER.reset(token)
+
+        return self.finish(request, response, timer)
+
+    async def __acall__(self, request):
+        timer = RequestTimer(dict(request.GET.lists()))
+        token = REQUEST_TIMER.set(timer)
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            REQUEST_TIMER.reset(token)
+
+        return self.finish(request, response, timer)
+
+    @staticmethod
+    def get_endpoint(request):
+        """
+        :return: URL route of the request, used as the endpoint label
+        :rtype: str
+        """
+        match = getattr(request, 'resolver_match', None)
+
+        if match is None:
+            return 'unmatched'
+
+        return match.route
+
+    def finish(self, request, response, timer):
+        """
+        Add the Server-Timing header and record the request, once the
+        content has been sent for streamed responses
+        """
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = timer.server_timing()
+
+        if not settings.METRICS_ENABLED:
+            return response
+
+        endpoint = self.get_endpoint(request)
+
+        if not response.streaming:
+            METRICS.record(timer, endpoint, response.status_code)
+
+        elif response.is_async:
+            response.streaming_content = self.atimed_stream(response.streaming_content, timer, endpoint, response.status_code)
+
+        else:
+            response.streaming_content = self.timed_stream(response.streaming_content, timer, endpoint, response.status_code)
+
+        return response
+
+    @staticmethod
+    def timed_stream(content, timer, endpoint, status):
+        """
+        Pass through the streamed content, timing the phases run while it
+        is generated
+        """
+        iterator = iter(content)
+        start = None
+
+        try:
+            while True:
+                token = REQUEST_TIMER.set(timer)
+
+                try:
+                    if start is None:
+                        start = timer.elapsed()
+
+                    chunk = next(iterator, None)
+                finally:
+                    REQUEST_TIMER.reset(token)
+
+                if chunk is None:
+                    break
+
+                yield chunk
+
+        finally:
+            if start is not None:
+                timer.add('render', timer.elapsed() - start)
+
+            METRICS.record(timer, endpoint, status)
+
+    @staticmethod
+    async def atimed_stream(content, timer, endpoint, status):
+        """
+        Asynchronous version of :meth:`timed_stream`
+        """
+        iterator = aiter(content)
+        start = None
+
+        try:
+            while True:
+                token = REQUEST_TIMER.set(timer)
+
+                try:
+                    if start is None:
+                        start = timer.elapsed()
+
+                    chunk = await anext(iterator, None)
+                finally:
+                    REQUEST_TIMER.reset(token)
+
+                if chunk is None:
+                    break
+
+                yield chunk
+
+        finally:
+            if start is not None:
+                timer.add('render', timer.elapsed() - start)
+
+            METRICS.record(timer, endpoint, status)
@@ -11,6 +11,7 @@ __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 from django_opensearch import settings
 from django_opensearch.constants import DEFAULT
+from django_opensearch.metrics import phase, set_label
 from django_opensearch.opensearch.lookup.cci_lookup import CCILookupHandler
 from pydoc import locate
 
@@ -192,6 +193,7 @@ class FacetSet:
         if self.path:
             handler = self.get_handler()
             lookup_handler = handler.get_lookup_handler()
+            set_label('handler', type(handler).__name__)
 
             self.facets.update(handler.facets)
 
@@ -203,7 +205,8 @@ class FacetSet:
         facet_set_with_vals = []
 
         # Get the aggregated values for each facet
-        self.get_facet_values(search_params)
+        with phase('aggregations'):
+            self.get_facet_values(search_params)
 
         for param in facet_set:
             facet_data = self.facet_values.get(param.name)
@@ -217,7 +220,8 @@ class FacetSet:
 
                     # Check for term lookups
                     if lookup_handler:
-                        value_list = lookup_handler.lookup_values(param.name, value_list)
+                        with phase('lookup'):
+                            value_list = lookup_handler.lookup_values(param.name, value_list)
 
                     param.value_list = value_list
 
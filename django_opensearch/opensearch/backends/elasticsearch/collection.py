@@ -10,8 +10,10 @@ __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 from .facets.base import ElasticsearchFacetSet
 from .facets.elasticsearch_connection import ElasticsearchConnection
-from .facets.base import HandlerFactory
+from .facets.base import HandlerFactory, SearchResults
+from .resolver import COLLECTION_PATHS
 from django_opensearch.constants import DEFAULT
+from django_opensearch.metrics import phase, set_label, timed
 from django.http import Http404
 from django_opensearch.opensearch.utils.aggregation_tools import get_thredds_aggregation, get_aggregation_capabilities
 from django.conf import settings
@@ -31,18 +33,9 @@ def collection_search(search_params):
     if 'parentIdentifier' not in search_params:
         return True
 
-    if 'parentIdentifier' in search_params:
-        query = {
-            "query": {
-                "term": {
-                    "parent_identifier": search_params['parentIdentifier']
-                }
-            }
-        }
+    info = COLLECTION_PATHS.lookup(search_params['parentIdentifier'])
 
-        return bool(settings.ES_CONNECTION.count_collections(query)['count'])
-
-    return False
+    return bool(info and info.has_children)
 
 
 class Collection(ElasticsearchFacetSet):
@@ -51,6 +44,7 @@ class Collection(ElasticsearchFacetSet):
 
     :attr facets:
     :attr base_query:
+    :attr sort: Sort order for the collections
     """
 
     facets = {
@@ -69,6 +63,50 @@ class Collection(ElasticsearchFacetSet):
         }
     }
 
+    # The static collections fallback only applies term clauses in must
+    facet_context = 'must'
+
+    # Collections are searched without a point in time so the static
+    # collections fallback can be used
+    deep_paging = False
+
+    sort = (
+        {
+            "_script": {
+                "type": "number",
+                "order": "asc",
+                "script": {
+                "source": "params._source.versionStatus == 'superseded' ? 1 : 0" # ordering
+                }
+            }
+        },
+        {
+            "numericVersionId.keyword": {
+                "order": "desc"
+            }
+        },
+        {
+            "dataType.keyword": {
+                "order": "asc"
+            }
+        },
+        {
+            "processingLevel.keyword": {
+                "order": "desc"
+            }
+        },
+        {
+            "productString.keyword": {
+                "order": "asc"
+            }
+        },
+        {
+            "title.keyword": {
+                "order": "asc"
+            }
+        },
+    )
+
     @staticmethod
     def get_es_path(facet_path, facet_name):
         """
@@ -137,42 +175,7 @@ class Collection(ElasticsearchFacetSet):
         query = super().build_query(params, **kwargs)
 
         # Add sorting
-        query['sort'] = [
-            {
-                "_script": {
-                    "type": "number",
-                    "order": "asc",
-                    "script": {
-                    "source": "params._source.versionStatus == 'superseded' ? 1 : 0" # ordering
-                    }
-                }
-            },
-            {
-                "numericVersionId.keyword": {
-                    "order": "desc"
-                }
-            },
-            {
-                "dataType.keyword": {
-                    "order": "asc"
-                }
-            },
-            {
-                "processingLevel.keyword": {
-                    "order": "desc"
-                }
-            },
-            {
-                "productString.keyword": {
-                    "order": "asc"
-                }
-            },
-            {
-                "title.keyword": {
-                    "order": "asc"
-                }
-            },
-        ]
+        query['sort'] = list(self.sort)
 
         if version_status:
             query['query']['bool']['must'].append({
@@ -216,24 +219,24 @@ class Collection(ElasticsearchFacetSet):
             self.facets.update(handler.facets)
             kwargs['handler'] = handler
 
-        query = self.build_query(params, **kwargs)
+        set_label('handler', type(kwargs.get('handler', self)).__name__)
+
+        with phase('build_query'):
+            query = self.build_query(params, **kwargs)
+            cache_key, total_hits = self.set_total_hits_tracking(query, params)
 
-        es_search = settings.ES_CONNECTION.search_collections(query)
+        with phase('elasticsearch'):
+            es_search = settings.ES_CONNECTION.search_collections(query)
 
         hits = es_search['hits']['hits']
 
-        results = self.build_representation(hits, params, **kwargs)
+        with phase('entries'):
+            results = self.build_representation(hits, params, **kwargs)
 
-        # Use the response from the query to get the total unless > 10k
-        # In this case will need to query size directly
-        if es_search['hits']['total']['relation'] == 'eq':
-            total_hits = es_search['hits']['total']['value']
-        else:
-            # Size keys are not compatible with the count query
-            query.pop('size')
-            total_hits = settings.ES_CONNECTION.count_collections(query)['count']
+        with phase('elasticsearch'):
+            total_hits, total_relation = self.get_total_hits(es_search, cache_key, total_hits)
 
-        return total_hits, results
+        return SearchResults(total_hits, results, None, None, total_relation)
 
     def build_representation(self, hits, params, **kwargs):
         """
@@ -248,17 +251,31 @@ class Collection(ElasticsearchFacetSet):
         :rtype: list
         """
         base_url = kwargs['uri']
-        handler = kwargs.pop('handler', None)
-        results = []
+        handler = kwargs.pop('handler', None) or self
+
+        return handler.build_collection_entries(hits, params, base_url)
+
+    @staticmethod
+    @timed('collection')
+    def get_collection_info(collection_id):
+        """
+        Return the root filepath for the given collection ID and whether
+        it has child collections
+
+        :param collection_id: Collection ID
+        :type collection_id: str
+
+        :return: collection info
+        :rtype: CollectionInfo
+        :raises Http404: Collection not found
+        """
+
+        info = COLLECTION_PATHS.lookup(collection_id)
 
-        for hit in hits:
-            if handler:
-                entry = handler.build_collection_entry(hit, params, base_url)
-            else:
-                entry = self.build_collection_entry(hit, params, base_url)
-            results.append(entry)
+        if info is None:
+            raise Http404(f'Collection not found with id: {collection_id}')
 
-        return results
+        return info
 
     @staticmethod
     def get_path(collection_id):
@@ -273,18 +290,4 @@ class Collection(ElasticsearchFacetSet):
         :raises Http404: Collection not found
         """
 
-        query = {
-            'query': {
-                'term': {
-                    'collection_id': collection_id
-                }
-            },
-            'size': 1
-        }
-
-        result = settings.ES_CONNECTION.search_collections(query)
-        if result['hits']['hits']:
-            return result['hits']['hits'][0]['_source']['path']
-
-        else:
-            raise Http404(f'Collection not found with id: {collection_id}')
+        return Collection.get_collection_info(collection_id).path
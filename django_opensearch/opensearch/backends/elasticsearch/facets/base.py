@@ -10,14 +10,18 @@ __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 from .collection_map import COLLECTION_MAP
 from pydoc import locate
-import os
+import math
+import threading
 from django_opensearch.constants import DEFAULT
 from django_opensearch.opensearch.backends import NamespaceMap, Param, FacetSet
 from django_opensearch import settings
+from django_opensearch.cache import ResponseCache, SearchResultCache, canonical_params
+from django_opensearch.metrics import phase, set_label
 from .elasticsearch_connection import ElasticsearchConnection
-import copy
+from ..paging import POINT_IN_TIME_PAGER, get_hits
 from dateutil.parser import parse as date_parser
-from django_opensearch.opensearch.utils import NestedDict
+from django_opensearch.opensearch.utils import NestedDict, TTLCache
+from django_opensearch.opensearch.utils.facet_value_store import FACET_VALUE_STORE
 from django_opensearch.opensearch.utils.geo_point import Point, Envelope
 from collections import namedtuple
 from django_opensearch.opensearch.utils.aggregation_tools import get_thredds_aggregation, get_aggregation_capabilities, \
@@ -31,22 +35,45 @@ class PagingError(Exception):
     pass
 
 
-SearchResults = namedtuple('SearchResults', ('total', 'results', 'search_before', 'search_after'))
+# total_relation is 'gte' if the total is a lower bound. has_previous is
+# set if there are hits before the page when paging with a cursor.
+SearchResults = namedtuple(
+    'SearchResults',
+    ('total', 'results', 'search_before', 'search_after', 'total_relation', 'has_previous'),
+    defaults=('eq', False)
+)
+
+TOTAL_HITS_CACHE = ResponseCache('total_hits')
+
+SEARCH_RESULT_CACHE = SearchResultCache('search')
+
+# Methods of calculating the total number of hits
+COUNT_MODES = ('exact', 'bounded', 'cached')
 
 
 class ElasticsearchFacetSet(FacetSet):
     """
     Class to provide opensearch URL template with facets and parameter options
 
-    :attr base_query: Base Elasticsearch Query
+    :attr base_query: Base Elasticsearch Query. The clauses are shared
+        between queries and must not be modified.
     :attr agg_query: Base elasticsearch aggregation query (default: {})
     :attr exclude_list: List of facets to exclude from value aggregation
+    :attr facet_context: bool clause used for the facet terms (default: filter)
+    :attr deep_paging: Whether pages beyond the result window can be retrieved
+    :attr use_facet_value_store: Whether to read facet values from the store
+    :attr source_includes: Fields of the file documents used to build the entries
+    :attr source_excludes: Fields to drop from the included fields
+    :attr script_fields: Values computed in elasticsearch for each hit
+    :attr filter_path: Parts of the search response used to build the results
     """
 
     base_query = {
         'query': {
             'bool': {
-                'must': [
+                'must': [],
+                'should': [],
+                'filter': [
                     {
                         'exists': {
                             'field': f'projects.{settings.APPLICATION_ID}'
@@ -59,9 +86,7 @@ class ElasticsearchFacetSet(FacetSet):
 
                         }
                     }
-                ],
-                'should': [],
-                'filter': []
+                ]
             }
         },
         'sort': [
@@ -83,6 +108,37 @@ class ElasticsearchFacetSet(FacetSet):
     # List of facets to exclude from value aggregation
     exclude_list = ['uuid', 'bbox', 'startDate', 'endDate', 'title', 'parentIdentifier']
 
+    # Facet terms do not need to be scored so are placed in filter context
+    # where elasticsearch can cache them
+    facet_context = 'filter'
+
+    # Pages beyond the result window are retrieved with a point in time
+    deep_paging = True
+
+    # Read the description facet values from the facet value store
+    use_facet_value_store = True
+
+    # Only the fields used by build_entry are returned for each file.
+    # Subclasses which use more of the document extend these.
+    source_includes = (
+        'info.name',
+        'info.directory',
+        'info.size',
+        'info.last_modified',
+        'info.temporal',
+        'info.spatial'
+    )
+    source_excludes = ()
+
+    # Values derived from the file documents which are computed by
+    # elasticsearch and returned in the hit fields
+    script_fields = {}
+
+    filter_path = ('took', 'hits.total', 'hits.hits._id', 'hits.hits._source', 'hits.hits.fields', 'hits.hits.sort')
+
+    # Query keys which do not affect the total number of hits
+    paging_keys = ('sort', 'size', 'from', 'search_after', 'track_total_hits', '_source', 'script_fields')
+
     @staticmethod
     def _extract_bbox(coordinates):
         """
@@ -194,6 +250,109 @@ class ElasticsearchFacetSet(FacetSet):
 
         return date_fields[key]
 
+    @staticmethod
+    def get_count_mode(params):
+        """
+        Get the method used to calculate the total number of hits. Set by
+        the countMode parameter, falling back to settings.TOTAL_HITS_MODE
+
+        :param params: Search parameters
+        :type params: dict
+
+        :return: one of COUNT_MODES
+        :rtype: str
+        """
+        count_mode = params.get('countMode')
+
+        if count_mode in COUNT_MODES:
+            return count_mode
+
+        return settings.TOTAL_HITS_MODE
+
+    def query_signature(self, query):
+        """
+        The parts of the query which determine the result set
+
+        :param query: Elasticsearch query
+        :type query: dict
+
+        :return: query without the paging keys
+        :rtype: dict
+        """
+        return {key: value for key, value in query.items() if key not in self.paging_keys}
+
+    def use_deep_paging(self):
+        """
+        :return: Whether pages beyond the result window can be retrieved
+        :rtype: bool
+        """
+        return self.deep_paging and settings.DEEP_PAGING
+
+    def set_total_hits_tracking(self, query, params):
+        """
+        Configure how elasticsearch should count the hits for this query.
+        In cached mode, hits are only counted if the total for this query
+        has not already been cached.
+
+        :param query: Elasticsearch query
+        :type query: dict
+
+        :param params: Search parameters
+        :type params: dict
+
+        :return: cache key, cached total
+        :rtype: tuple(str, int)
+        """
+        count_mode = self.get_count_mode(params)
+
+        if count_mode == 'bounded':
+            query['track_total_hits'] = settings.TOTAL_HITS_BOUND
+            return None, None
+
+        if count_mode == 'cached':
+            cache_key = TOTAL_HITS_CACHE.make_key(self.__class__.__name__, self.query_signature(query))
+            total_hits = TOTAL_HITS_CACHE.get(cache_key)
+
+            if total_hits is not None:
+                query['track_total_hits'] = False
+                return cache_key, total_hits
+
+            query['track_total_hits'] = True
+            return cache_key, None
+
+        query['track_total_hits'] = True
+        return None, None
+
+    @staticmethod
+    def get_total_hits(es_search, cache_key=None, total_hits=None):
+        """
+        Get the total number of hits from the search response, caching
+        the result if required. In bounded mode the total is a lower bound
+        if there are more hits than settings.TOTAL_HITS_BOUND.
+
+        :param es_search: Elasticsearch response
+        :type es_search: dict
+
+        :param cache_key: key to cache the total under
+        :type cache_key: str
+
+        :param total_hits: total retrieved from the cache
+        :type total_hits: int
+
+        :return: total hits and 'eq' if it is exact or 'gte' if it is a lower bound
+        :rtype: tuple(int, str)
+        """
+        if total_hits is not None:
+            return total_hits, 'eq'
+
+        total = es_search['hits']['total']
+        total_hits, relation = total['value'], total.get('relation', 'eq')
+
+        if cache_key and relation == 'eq':
+            TOTAL_HITS_CACHE.set(cache_key, total_hits, settings.TOTAL_HITS_CACHE_TIMEOUT)
+
+        return total_hits, relation
+
     def get_handler(self):
         """
         Get the handler for the given collection
@@ -203,6 +362,33 @@ class ElasticsearchFacetSet(FacetSet):
         """
         return HandlerFactory().get_handler(self.path)
 
+    def new_query(self):
+        """
+        Start a new query from the base query. Only the containers are
+        copied, the clauses are shared with the base query.
+
+        :return: elasticsearch query
+        :rtype: dict
+        """
+        query = {}
+
+        for key, value in self.base_query.items():
+            if key == 'query' and 'bool' in value:
+                query[key] = {
+                    'bool': {
+                        occur: list(clauses) if isinstance(clauses, (list, tuple)) else clauses
+                        for occur, clauses in value['bool'].items()
+                    }
+                }
+
+            elif isinstance(value, (list, tuple)):
+                query[key] = list(value)
+
+            else:
+                query[key] = value
+
+        return query
+
     def build_query(self, params, **kwargs):
         """
         Helper method to build the elasticsearch query
@@ -215,8 +401,7 @@ class ElasticsearchFacetSet(FacetSet):
         :rtype: dict
         """
 
-        # Deep copy to avoid aliasing
-        query = copy.deepcopy(self.base_query)
+        query = self.new_query()
 
         # Get parameters from kwargs
         search_after = kwargs.get('search_after')
@@ -226,13 +411,14 @@ class ElasticsearchFacetSet(FacetSet):
 
         # If search after key use this
         if search_after:
-            query['search_after'] = search_after.split(',')
+            query['search_after'] = list(search_after)
 
             if reverse:
                 # reverse the ordering of the sort to go back a page
-                for sort_key in query['sort']:
-                    for key in sort_key:
-                        sort_key[key]['order'] = 'desc'
+                query['sort'] = [
+                    {key: {**order, 'order': 'desc'} for key, order in sort_key.items()}
+                    for sort_key in query['sort']
+                ]
 
         # If there is no search after
         elif start_index != 1:
@@ -240,18 +426,23 @@ class ElasticsearchFacetSet(FacetSet):
             # Set start index to 0 if below 0 or -1 for zero indexing
             start_index = start_index if start_index > 0 else 0
 
-            if start_index > 0 and (start_index + page_size) <= 10000:
+            if start_index > 0 and ((start_index + page_size) <= settings.RESULT_WINDOW or self.use_deep_paging()):
                 query['from'] = start_index
 
             # If window is > 10,000 raise error
             else:
                 raise PagingError(f"Result window is too large, from + size must be"
-                                  f" less than or equal to [10000] but was [{start_index + page_size}].")
+                                  f" less than or equal to [{settings.RESULT_WINDOW}] but was [{start_index + page_size}].")
 
         # Set number of results
         if kwargs.get('max_results'):
             query['size'] = kwargs['max_results']
 
+            # One more hit going back a page shows whether there is a page
+            # before it
+            if search_after and reverse:
+                query['size'] += 1
+
         # Loop search parameters
         for param in params:
 
@@ -264,7 +455,7 @@ class ElasticsearchFacetSet(FacetSet):
                 })
 
             elif param == 'uuid':
-                query['query']['bool']['must'].append({
+                query['query']['bool'][self.facet_context].append({
                     'term': {
                         '_id': params[param]
                     }
@@ -303,25 +494,19 @@ class ElasticsearchFacetSet(FacetSet):
 
                         if len(search_terms) == 1:
                             # Equal to AND query
-                            query['query']['bool']['must'].append({
+                            query['query']['bool'][self.facet_context].append({
                                 'term': {
                                     f'{es_path}.keyword': search_terms[0]
                                 }
                             })
 
                         else:
-                            # Equal to AND (a OR b) query where there should be at least one match
-                            andor = {'bool': {'should': [], 'minimum_should_match': 1}}
-
-                            for search_term in search_terms:
-                                andor['bool']['should'].append(
-                                    {
-                                        'term': {
-                                            f'{es_path}.keyword': search_term
-                                        }
-                                    })
-
-                            query['query']['bool']['must'].append(andor)
+                            # Equal to AND (a OR b) query
+                            query['query']['bool'][self.facet_context].append({
+                                'terms': {
+                                    f'{es_path}.keyword': search_terms
+                                }
+                            })
 
         # Add date filter
         date_filter = NestedDict()
@@ -345,6 +530,44 @@ class ElasticsearchFacetSet(FacetSet):
 
         return query
 
+    def filter_source(self, query):
+        """
+        Limit the fields returned for each hit to those used to build the
+        entries, along with any script fields
+
+        :param query: Elasticsearch query
+        :type query: dict
+        """
+        query['_source'] = {'includes': list(self.source_includes)}
+
+        if self.source_excludes:
+            query['_source']['excludes'] = list(self.source_excludes)
+
+        if self.script_fields:
+            query['script_fields'] = self.script_fields
+
+    def search_files(self, query):
+        """
+        Search the files index, returning only the parts of the response
+        given by filter_path
+
+        :param query: Elasticsearch query
+        :type query: dict
+
+        :return: elasticsearch response
+        :rtype: dict
+        """
+        es = settings.ES_CONNECTION.es
+
+        if es is None:
+            raise ValueError('Elasticsearch connection unreachable')
+
+        return es.search(
+            index=settings.ES_CONNECTION.index,
+            body=query,
+            filter_path=list(self.filter_path)
+        )
+
     def query_elasticsearch(self, query):
         """
         Execute the query
@@ -407,11 +630,36 @@ class ElasticsearchFacetSet(FacetSet):
 
     def get_facet_values(self, search_params):
         """
-        Perform aggregations to get the range of possible values
-        for each facet to put in the description document.
+        Get the range of possible values for each facet to put in the
+        description document. Values are read from the facet value store
+        if possible, falling back to aggregating them from the index.
 
         result is set as self.facet_values
         """
+        values = None
+
+        if self.use_facet_value_store:
+            values = FACET_VALUE_STORE.get(
+                FACET_VALUE_STORE.make_key(self.__class__.__name__, search_params)
+            )
+
+        if values is None:
+            values = self.aggregate_facet_values(search_params)
+
+        #TODO: Move self.facet_values to __init__ and return the values dict for setting elsewhere
+        self.facet_values = values
+
+    def aggregate_facet_values(self, search_params):
+        """
+        Perform aggregations to get the range of possible values
+        for each facet
+
+        :param search_params: Search parameters
+        :type search_params: dict
+
+        :return: values for each facet
+        :rtype: dict
+        """
 
         query = self.build_query(search_params)
 
@@ -442,12 +690,8 @@ class ElasticsearchFacetSet(FacetSet):
         }
 
         aggs = self.query_elasticsearch(query)
-        print(query)
 
-        values = self._process_aggregations(aggs)
-
-        #TODO: Move self.facet_values to __init__ and return the values dict for setting elsewhere
-        self.facet_values = values
+        return self._process_aggregations(aggs)
 
     def search(self, params, **kwargs):
         """
@@ -459,38 +703,136 @@ class ElasticsearchFacetSet(FacetSet):
         :return: search results
         :rtype: SearchResults
         """
-        query = self.build_query(params, **kwargs)
+        set_label('handler', type(self).__name__)
+
+        with phase('build_query'):
+            query = self.build_query(params, **kwargs)
+
+        result_key = None
 
-        es_search = settings.ES_CONNECTION.search(query)
+        if settings.SEARCH_RESULT_CACHE_TIMEOUT:
+            with phase('cache'):
+                result_key = self.search_cache_key(query, params, **kwargs)
+                cached = SEARCH_RESULT_CACHE.get(result_key)
 
-        hits = es_search['hits']['hits']
+            if cached is not None:
+                return cached
+
+        with phase('build_query'):
+            cache_key, total_hits = self.set_total_hits_tracking(query, params)
+            self.filter_source(query)
+
+        with phase('elasticsearch'):
+            if query.get('from', 0) + query.get('size', 10) > settings.RESULT_WINDOW:
+                es_search = POINT_IN_TIME_PAGER.search(query, self.query_signature(query), list(self.filter_path))
+            else:
+                es_search = self.search_files(query)
+
+        hits = get_hits(es_search)
 
         reverse = kwargs.get('reverse')
 
+        # Paging forward from a cursor, the cursor hit is before the page
+        has_previous = bool(kwargs.get('search_after'))
+
         if reverse:
+            page_size = kwargs.get('max_results') or len(hits)
+            has_previous = len(hits) > page_size
+            hits = hits[:page_size]
             hits.reverse()
 
-        results = self.build_representation(hits, params, **kwargs)
-
-        # Use the response from the query to get the total unless > 10k
-        # In this case will need to query size directly
-        if es_search['hits']['total']['relation'] == 'eq':
-            total_hits = es_search['hits']['total']['value']
+        # Entries are built while the response is written in lazy mode
+        if kwargs.get('lazy'):
+            results = self.iter_representation(hits, params, **kwargs)
         else:
-            # Some keys are not compatible with the count query
-            for key in ['sort', 'size', 'from', 'search_after']:
-                query.pop(key, None)
+            with phase('entries'):
+                results = self.build_representation(hits, params, **kwargs)
 
-            total_hits = settings.ES_CONNECTION.count(query)['count']
+        with phase('elasticsearch'):
+            total_hits, total_relation = self.get_total_hits(es_search, cache_key, total_hits)
 
-        after_key, before_key, next_search = None, None, None
+        after_key, before_key = None, None
         if len(hits) > 0:
-            after_key = hits[-1]['sort'] if hits else None
-            before_key = hits[0]['sort'] if hits else None
+            after_key = hits[-1]['sort']
+            before_key = hits[0]['sort']
+
+        if result_key and kwargs.get('lazy'):
+            results = self.cache_results(result_key, SearchResults(total_hits, results, before_key, after_key, total_relation, has_previous))
+        elif result_key:
+            SEARCH_RESULT_CACHE.set(result_key, SearchResults(total_hits, results, before_key, after_key, total_relation, has_previous), settings.SEARCH_RESULT_CACHE_TIMEOUT)
+
+        return SearchResults(total_hits, results, before_key, after_key, total_relation, has_previous)
+
+    def search_cache_key(self, query, params, **kwargs):
+        """
+        Cache key for a page of search results. The query includes the
+        position of the page. The response type does not change the entries
+        so is left out.
+
+        :param query: Elasticsearch query
+        :type query: dict
+
+        :param params: Opensearch parameters
+        :type params: django.http.request.QueryDict
+
+        :return: cache key
+        :rtype: str
+        """
+        return SEARCH_RESULT_CACHE.make_key(
+            self.__class__.__name__,
+            query,
+            self.get_count_mode(params),
+            canonical_params(params, ignore=('httpAccept',)),
+            kwargs.get('uri'),
+            bool(kwargs.get('reverse'))
+        )
+
+    @staticmethod
+    def cache_results(cache_key, search_results):
+        """
+        Pass through the lazily built entries and cache the page once they
+        have all been built
+
+        :param cache_key: cache key
+        :type cache_key: str
+
+        :param search_results: search results with an entry generator
+        :type search_results: SearchResults
+
+        :return: Result generator
+        :rtype: generator
+        """
+        entries = []
+
+        for entry in search_results.results:
+            entries.append(entry)
+            yield entry
+
+        SEARCH_RESULT_CACHE.set(cache_key, search_results._replace(results=entries), settings.SEARCH_RESULT_CACHE_TIMEOUT)
 
-            next_search = ','.join(hits[-1]['sort'])
+    def export(self, params, doc_order=False, **kwargs):
+        """
+        Build the entries for every granule matching the search. The hits
+        are retrieved in batches as the entries are read.
+
+        :param params: Opensearch parameters
+        :type params: django.http.request.QueryDict
+
+        :param doc_order: Return the granules in index order, which is
+        cheaper than sorting them
+        :type doc_order: bool
+
+        :return: Entry generator
+        :rtype: generator
+        """
+        query = self.build_query(params)
+        self.filter_source(query)
 
-        return SearchResults(total_hits, results, before_key, after_key), next_search
+        if doc_order:
+            query['sort'] = [{'_shard_doc': 'asc'}]
+
+        for hits in POINT_IN_TIME_PAGER.scan(query, settings.EXPORT_BATCH_SIZE, list(self.filter_path)):
+            yield from self.iter_representation(hits, params, **kwargs)
 
     def build_representation(self, hits, params, **kwargs):
         """
@@ -504,15 +846,42 @@ class ElasticsearchFacetSet(FacetSet):
         :return: Result list
         :rtype: list
         """
-        results = []
+        return list(self.iter_representation(hits, params, **kwargs))
+
+    def iter_representation(self, hits, params, **kwargs):
+        """
+        Build the dict representation of each granule as it is requested.
+        Allows the response to be streamed while the entries are built.
+
+        :param hits: Elasticsearch query hits
+        :param params: url params
+        :param kwargs:
+
+        :return: Result generator
+        :rtype: generator
+        """
         base_url = kwargs['uri']
 
         for hit in hits:
-            entry = self.build_entry(hit, params, base_url)
+            yield self.build_entry(hit, params, base_url)
 
-            results.append(entry)
+    def build_collection_entries(self, hits, params, base_url):
+        """
+        Build the entries for a page of collection level hits
 
-        return results
+        :param hits: Elasticsearch query hits
+        :type hits: list
+
+        :param params: url params
+        :type params: django.http.request.QueryDict
+
+        :param base_url: base_url for service
+        :type base_url: str
+
+        :return: Result list
+        :rtype: list
+        """
+        return [self.build_collection_entry(hit, params, base_url) for hit in hits]
 
     def build_collection_entry(self, hit, params, base_url):
         """
@@ -647,6 +1016,102 @@ class ElasticsearchFacetSet(FacetSet):
         return entry
 
 
+class HandlerRegistry:
+    """
+    Resolves the handler classes in the collection map once and matches paths
+    to them by their longest prefix. Handler instances are shared between
+    requests for the same path.
+
+    :param collection_map: Map from collection root path to handler
+    :type collection_map: dict
+
+    :param maxsize: Maximum number of handler instances to hold
+    :type maxsize: int
+    """
+
+    def __init__(self, collection_map, maxsize):
+        self.collection_map = collection_map
+        self.instances = TTLCache(maxsize=maxsize, ttl=math.inf)
+        self._trie = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def split(path):
+        return [part for part in path.split('/') if part]
+
+    @property
+    def trie(self):
+        """
+        Prefix trie of the path components. Nodes which are the root of a
+        collection hold the root path, collection and handler class under
+        the None key.
+        """
+        if self._trie is None:
+            with self._lock:
+                if self._trie is None:
+                    trie = {}
+
+                    for root_path, collection in self.collection_map.items():
+                        node = trie
+                        for part in self.split(root_path):
+                            node = node.setdefault(part, {})
+
+                        node[None] = (root_path, collection, locate(collection['handler']))
+
+                    self._trie = trie
+
+        return self._trie
+
+    def match(self, path):
+        """
+        Find the collection with the longest root path containing the path
+
+        :param path: filepath
+        :type path: str
+
+        :return: root path, collection and handler class or None
+        :rtype: tuple
+        """
+        node = self.trie
+        match = None
+
+        for part in self.split(path or ''):
+            node = node.get(part)
+            if node is None:
+                break
+
+            match = node.get(None, match)
+
+        return match
+
+    def get_handler(self, path):
+        """
+        :param path: filepath
+        :type path: str
+
+        :return: shared handler instance or None if no handler matches
+        :rtype: ElasticsearchFacetSet
+        """
+        handler = self.instances.get(path)
+
+        if handler is None:
+            match = self.match(path)
+
+            if match is None:
+                return
+
+            handler = match[2](path)
+            self.instances.set(path, handler)
+
+        return handler
+
+    def clear(self):
+        with self._lock:
+            self._trie = None
+
+        self.instances.clear()
+
+
 class HandlerFactory:
     """
     Returns the correct handler for the given path to know how to interpret the
@@ -659,7 +1124,8 @@ class HandlerFactory:
     def get_handler(self, path):
         """
         Takes a system path and returns the file extensions to look for and
-        the correct handler for the collection.
+        the correct handler for the collection. Handlers are shared between
+        requests so any per request state must be kept on a copy.
 
         :param path: filepath
         :type path: str
@@ -667,11 +1133,7 @@ class HandlerFactory:
         :return: handler class
         :rtype: ElasticsearchFacetSet
         """
-
-        collection, root_path = self.get_collection_map(path)
-        if collection is not None:
-            handler = locate(collection['handler'])
-            return handler(path)
+        return HANDLERS.get_handler(path)
 
     def get_collection_map(self, path):
         """
@@ -683,12 +1145,15 @@ class HandlerFactory:
         :return: handler class string, collection root path
         :rtype: tuple(str, str)
         """
-
-        while path not in self.map and path != '/' and path:
-            path = os.path.dirname(path)
+        match = HANDLERS.match(path)
 
         # No match has been found
-        if not path or path == '/':
+        if match is None:
             return None, None
 
-        return self.map[path], path
+        root_path, collection, handler = match
+
+        return collection, root_path
+
+
+HANDLERS = HandlerRegistry(COLLECTION_MAP, settings.HANDLER_CACHE_SIZE)
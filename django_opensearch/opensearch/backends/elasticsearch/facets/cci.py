@@ -6,18 +6,46 @@ __copyright__ = "Copyright 2018 United Kingdom Research and Innovation"
 __license__ = "BSD - see LICENSE file in top-level package directory"
 __contact__ = "richard.d.smith@stfc.ac.uk"
 
+import logging
 import os
 
-import requests
 from django.urls import reverse
 
-from ceda_opensearch.opensearch_settings import EXTERNAL_DATA_SOURCES, PROVIDERS_MAP
+from ceda_opensearch.opensearch_settings import EXTERNAL_DATA_SOURCES
 from django_opensearch import settings
 from django_opensearch.constants import DEFAULT
-from django_opensearch.opensearch.utils import thredds_path
+from django_opensearch.metrics import timed
+from django_opensearch.opensearch.utils import thredds_path, TTLCache
+from django_opensearch.opensearch.utils.data_bridge import DATA_BRIDGE
 
 from .base import ElasticsearchFacetSet
 
+logger = logging.getLogger(__name__)
+
+# Files known not to have a backup record
+BACKUP_MISSES = TTLCache(
+    maxsize=settings.BACKUP_MISS_CACHE_SIZE,
+    ttl=settings.BACKUP_MISS_CACHE_TTL
+)
+
+# Marker for relationships which have not been looked up
+NOT_FETCHED = object()
+
+# Painless loop over the phenomena of NetCDF files. The phenomena are read
+# from the source in elasticsearch so they are not returned with the hits.
+PHENOMENA_SCRIPT = """
+def info = params['_source']['info'];
+if (info == null || info['format'] != 'NetCDF' || !(info['phenomena'] instanceof List)) {{
+    return false;
+}}
+for (def phenom : info['phenomena']) {{
+    if (phenom instanceof Map && ({condition})) {{
+        return true;
+    }}
+}}
+return false;
+"""
+
 def build_backup_query(file_path):
     return {}
 
@@ -28,6 +56,8 @@ class CCIFacets(ElasticsearchFacetSet):
 
     :attr LOOKUP_HANDLER: Handler for vocab lookups
     :attr facets: Facet map from facet term to path in the elasticsearch index
+    :attr source_includes: Fields of the file documents used to build the entries
+    :attr script_fields: OPeNDAP compatibility flags computed from the phenomena
     """
 
     LOOKUP_HANDLER = "django_opensearch.opensearch.lookup.cci_lookup.CCILookupHandler"
@@ -48,6 +78,32 @@ class CCIFacets(ElasticsearchFacetSet):
         "drsId": DEFAULT,
     }
 
+    source_includes = ElasticsearchFacetSet.source_includes + (
+        "info.format",
+        "info.kerchunk_location",
+        "info.zarr_location",
+    )
+
+    script_fields = {
+        # Dap cannot serve int64
+        "opendap_int64": {
+            "script": {
+                "source": PHENOMENA_SCRIPT.format(
+                    condition="phenom['dtype'] == 'int64'"
+                )
+            }
+        },
+        # Dap converts 1-D character arrays into strings
+        "opendap_char_array": {
+            "script": {
+                "source": PHENOMENA_SCRIPT.format(
+                    condition="phenom['dtype'] == 'bytes8' && phenom['dimensions'] instanceof List"
+                              " && phenom['dimensions'].size() == 1"
+                )
+            }
+        },
+    }
+
     def build_query(self, params, **kwargs):
         """
         Filter file results by path
@@ -66,12 +122,43 @@ class CCIFacets(ElasticsearchFacetSet):
         pid = params.get("parentIdentifier")
 
         if pid:
-            query["query"]["bool"]["must"].append(
+            query["query"]["bool"][self.facet_context].append(
                 {"term": {f"projects.{settings.APPLICATION_ID}.datasetId": pid}}
             )
         return query
 
-    def build_collection_entry(self, hit, params, base_url):
+    def build_collection_entries(self, hits, params, base_url):
+        """
+        Build the collection level entries. The related datasets for the
+        whole page are retrieved from the data bridge concurrently.
+
+        :param hits: Elasticsearch query hits
+        :type hits: list
+
+        :param params: url params
+        :type params: <class 'django.http.request.QueryDict'>
+
+        :param base_url: base_url for service
+        :type base_url: str
+
+        :return: Result list
+        :rtype: list
+        """
+        relationships = DATA_BRIDGE.get_relationships_many(
+            [hit["_source"].get("collection_id") for hit in hits]
+        )
+
+        return [
+            self.build_collection_entry(
+                hit,
+                params,
+                base_url,
+                relationships=relationships.get(hit["_source"].get("collection_id")),
+            )
+            for hit in hits
+        ]
+
+    def build_collection_entry(self, hit, params, base_url, relationships=NOT_FETCHED):
         """
         Build individual entries at the collection level
 
@@ -84,6 +171,10 @@ class CCIFacets(ElasticsearchFacetSet):
         :param base_url: base_url for service
         :type base_url: str
 
+        :param relationships: related datasets from the data bridge. Looked
+        up if not supplied.
+        :type relationships: list
+
         :return: entry
         :rtype: dict
         """
@@ -135,13 +226,104 @@ class CCIFacets(ElasticsearchFacetSet):
 
                 entry["properties"]["links"]["via"] = via
 
-        relationships = self.get_relationships(source.get("collection_id"))
+        if relationships is NOT_FETCHED:
+            relationships = self.get_relationships(source.get("collection_id"))
+
         if relationships is not None:
             entry["relationships"] = relationships
 
         return entry
 
-    def build_entry(self, hit, params, base_url):
+    @staticmethod
+    def _file_path(hit):
+        """
+        Full path to the file described by the elasticsearch hit
+
+        :param hit: elasticsearch response hit
+        :type hit: dict
+
+        :return: file path
+        :rtype: str
+        """
+        info = hit["_source"]["info"]
+        return os.path.join(info["directory"], info["name"])
+
+    @staticmethod
+    @timed("backup")
+    def get_backups(file_paths):
+        """
+        Retrieve the backup records for a list of files from the backup
+        check index using a single multi-get. Files without a backup record
+        are cached for a short time to save repeating the lookup.
+
+        :param file_paths: list of file paths
+        :type file_paths: list
+
+        :return: backup documents keyed by file path
+        :rtype: dict
+        """
+        backups = {}
+        missing = []
+
+        for file_path in dict.fromkeys(file_paths):
+            if file_path in BACKUP_MISSES:
+                backups[file_path] = {"found": False}
+            else:
+                missing.append(file_path)
+
+        if not missing:
+            return backups
+
+        es = settings.ES_CONNECTION.es
+        docs = []
+
+        if es is None:
+            logger.warning("No elasticsearch client available, skipping backup lookup")
+
+        else:
+            try:
+                docs = es.mget(index=settings.BACKUP_CHECK_INDEX, ids=missing)["docs"]
+            except Exception as e:
+                logger.warning(f"Backup lookup failed for {len(missing)} files: {e}")
+
+        for doc in docs:
+            if doc.get("found"):
+                backups[doc["_id"]] = doc
+
+            # Only remember genuine misses, not per document errors
+            elif "error" not in doc:
+                BACKUP_MISSES.set(doc["_id"], True)
+
+        for file_path in missing:
+            backups.setdefault(file_path, {"found": False})
+
+        return backups
+
+    def iter_representation(self, hits, params, **kwargs):
+        """
+        Build the dict representation of each granule as it is requested.
+        Backup records for the whole page are retrieved up front and
+        passed to each entry.
+
+        :param hits: Elasticsearch query hits
+        :param params: url params
+        :param kwargs:
+
+        :return: Result generator
+        :rtype: generator
+        """
+        base_url = kwargs["uri"]
+        backups = {}
+
+        if getattr(settings, "USE_BACKUPS", False):
+            backups = self.get_backups([self._file_path(hit) for hit in hits])
+
+        for hit in hits:
+            yield self.build_entry(
+                hit, params, base_url, backup=backups.get(self._file_path(hit))
+            )
+
+    def build_entry(self, hit, params, base_url, backup=None):
         """
         Build individual entries at the granule level
 
@@ -154,12 +336,16 @@ class CCIFacets(ElasticsearchFacetSet):
         :param base_url: url of running opensearch service
         :type param: str
 
+        :param backup: record from the backup check index. Looked up if
+        not supplied and backups are in use.
+        :type backup: dict
+
         :return: entry
         :rtype: dict
         """
 
         source = hit["_source"]
-        file_path = os.path.join(source["info"]["directory"], source["info"]["name"])
+        file_path = self._file_path(hit)
 
         entry = super().build_entry(hit, params, base_url)
 
@@ -171,19 +357,17 @@ class CCIFacets(ElasticsearchFacetSet):
         download_url = None
         opendap_href = None
         if use_download_backup:
-            try:
-                backup_search = settings.ES_CONNECTION.get(index=settings.BACKUP_CHECK_INDEX, id=file_path)
-            except:
-                backup_search = {'found':False}
-                
-            if backup_search.get('found',False):
+            if backup is None:
+                backup = self.get_backups([file_path])[file_path]
+
+            if backup.get('found',False):
                 # Download backup switch
-                if backup_search['_source'].get('use_backup'):
+                if backup['_source'].get('use_backup'):
                     use_download_backup = True
-                    download_url = backup_search['_source'].get('download_url',None)
+                    download_url = backup['_source'].get('download_url',None)
                 # OpenDAP Backup switch
-                if backup_search['_source'].get('use_alt_opendap',None):
-                    opendap_href = backup_search['_source'].get('opendap_backup',None)
+                if backup['_source'].get('use_alt_opendap',None):
+                    opendap_href = backup['_source'].get('opendap_backup',None)
 
         entry['properties']['links']['related'] = [
             {
@@ -195,12 +379,7 @@ class CCIFacets(ElasticsearchFacetSet):
 
         # Add opendap link to netCDF files
         if source["info"].get("format") == "NetCDF":
-            # Check if any of the values are of int64 type. Dap cannot serve int64
-            possibles = []
-            for phenom in source["info"].get("phenomena", []):
-                if isinstance(phenom, dict):
-                    possibles.append(phenom.get("dtype") == "int64")
-            int64 = any(possibles)
+            int64, char_array = self.opendap_flags(hit)
 
             if not int64:
                 entry["properties"]["links"]["related"].append(
@@ -211,18 +390,11 @@ class CCIFacets(ElasticsearchFacetSet):
                     }
                 )
 
-                # Check if character array. Dap converts these into strings
-                for phenom in source["info"].get("phenomena", []):
-                    if isinstance(phenom, dict):
-                        if (
-                            phenom.get("dtype") == "bytes8"
-                            and len(phenom.get("dimensions", [])) == 1
-                        ):
-                            # add a flag for the toolbox
-                            entry["properties"]["links"]["related"][-1][
-                                "opendap_fully_compatible"
-                            ] = False
-                            break
+                if char_array:
+                    # add a flag for the toolbox
+                    entry["properties"]["links"]["related"][-1][
+                        "opendap_fully_compatible"
+                    ] = False
 
         # Multiple kerchunk locations are permissible.
         if source["info"].get("kerchunk_location") is not None:
@@ -254,6 +426,43 @@ class CCIFacets(ElasticsearchFacetSet):
 
         return entry
 
+    @staticmethod
+    def opendap_flags(hit):
+        """
+        Whether the file has any int64 variables, which Dap cannot serve,
+        and whether it has any 1-D character arrays, which Dap converts into
+        strings. Read from the script fields, or from the phenomena if the
+        hit was retrieved with them in the source instead.
+
+        :param hit: elasticsearch response hit
+        :type hit: dict
+
+        :return: int64, char_array
+        :rtype: tuple
+        :raises ValueError: The hit has neither the script fields nor the phenomena
+        """
+        fields = hit.get("fields", {})
+
+        if "opendap_int64" in fields and "opendap_char_array" in fields:
+            return fields["opendap_int64"][0], fields["opendap_char_array"][0]
+
+        info = hit["_source"]["info"]
+
+        if "phenomena" not in info:
+            raise ValueError(f'Hit {hit.get("_id")} was retrieved without the OPeNDAP script fields or the phenomena')
+
+        int64, char_array = False, False
+
+        for phenom in info["phenomena"]:
+            if isinstance(phenom, dict):
+                int64 = int64 or phenom.get("dtype") == "int64"
+                char_array = char_array or (
+                    phenom.get("dtype") == "bytes8"
+                    and len(phenom.get("dimensions", [])) == 1
+                )
+
+        return int64, char_array
+
     def get_relationships(self, uid):
         """
         Call out to the data bridge service to find related datasets.
@@ -263,23 +472,4 @@ class CCIFacets(ElasticsearchFacetSet):
         @return a list of related datasets
 
         """
-        url_string = f"{settings.DATA_BRIDGE_URL}/dataset/https://catalogue.ceda.ac.uk/uuid/{uid}?format=json"
-
-        try:
-            response = requests.get(url_string, verify=False)
-            if response.status_code != 200:
-                return None
-
-            relationships = response.json()[0]["relationships"]
-            for relationship in relationships:
-                relationship["related_dataset_provider"] = PROVIDERS_MAP.get(
-                    relationship["related_dataset_provider"],
-                    relationship["related_dataset_provider"],
-                )
-
-            return relationships
-
-        except Exception as ex:
-            print(f"ERROR {ex}")
-            print(f"ERROR {url_string}")
-            return None
+        return DATA_BRIDGE.get_relationships(uid)
@@ -8,6 +8,8 @@ __copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
 __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
+import copy
+
 from django_opensearch.opensearch.backends.elasticsearch.facets.collection_map import (
     DEFAULT_COLLECTION,
 )
@@ -28,8 +30,8 @@ class Granule:
         :param path: filepath
         :type path: str
         """
-        if path:
-            self.handler = HandlerFactory().get_handler(path)
+        self.handler = HandlerFactory().get_handler(path) if path else None
+
         if self.handler is None:
             self.handler = HandlerFactory().get_handler(DEFAULT_COLLECTION)
 
@@ -41,6 +43,9 @@ class Granule:
         :return list: List of parameter object for each facet
         :rtype: list
         """
+        # The facet values are kept on the handler so use a copy of the
+        # shared instance
+        self.handler = copy.copy(self.handler)
 
         return self.handler.get_facet_set(search_params)
 
@@ -65,4 +70,17 @@ class Granule:
         :return: search results
         :rtype: SearchResults
         """
-        return self.handler.search(params, **kwargs)
\ No newline at end of file
+        return self.handler.search(params, **kwargs)
+
+    def export(self, params, **kwargs):
+        """
+        Build the entries for every granule matching the query parameters
+
+        :param params: URL parameters
+        :type params: <class 'django.http.request.QueryDict'>
+        :param kwargs:
+
+        :return: Entry generator
+        :rtype: generator
+        """
+        return self.handler.export(params, **kwargs)
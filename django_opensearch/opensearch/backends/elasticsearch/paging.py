@@ -0,0 +1,328 @@
+# encoding: utf-8
+"""
+Pages beyond the elasticsearch result window using a point in time (PIT) and
+search_after.
+
+The PIT for a query is shared by all clients paging through it, along with
+the sort values found at the end of each page requested so far. Each
+position is stored under its own cache key so concurrent requests do not
+overwrite each other's. A client stepping through the pages continues from
+the end of the previous page, so a deep page costs the same as the first
+page. Jumping to a page further on walks forward from the nearest known
+position, up to settings.PIT_MAX_SEEK hits. Pages further away are refused
+and clients should follow the next links, which use searchAfter cursors.
+
+Shared PITs are left to expire after settings.PIT_KEEP_ALIVE. Exports scan
+the whole result set with a PIT of their own, which is closed at the end.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from elasticsearch import NotFoundError
+
+from django_opensearch import settings as opensearch_settings
+from django_opensearch.cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+def get_hits(response):
+    """
+    Hits from a search response. Elasticsearch drops empty arrays from
+    responses filtered with filter_path so the hits may be missing.
+
+    :param response: Elasticsearch response
+    :type response: dict
+
+    :return: hits
+    :rtype: list
+    """
+    if 'hits' not in response:
+        return []
+
+    return response['hits'].get('hits', [])
+
+
+class PointInTimePager:
+    """
+    Run searches using a point in time shared between requests for the
+    same query
+
+    :param keep_alive: How long elasticsearch should keep the PIT open
+    between requests (default: settings.PIT_KEEP_ALIVE)
+    :type keep_alive: str
+    """
+
+    # Number of earlier page starts checked for a known position
+    seek_probes = 100
+
+    def __init__(self, keep_alive=None):
+        self.keep_alive = keep_alive or opensearch_settings.PIT_KEEP_ALIVE
+        self.cache = ResponseCache('pit')
+
+    @property
+    def es(self):
+        es = settings.ES_CONNECTION.es
+
+        if es is None:
+            raise ValueError('Elasticsearch connection unreachable')
+
+        return es
+
+    def open(self):
+        """
+        Open a new point in time on the files index
+
+        :return: state with the PIT id and the token its positions are
+        stored under
+        :rtype: dict
+        """
+        response = self.es.open_point_in_time(
+            index=settings.ES_CONNECTION.index,
+            keep_alive=self.keep_alive
+        )
+
+        return {'pit_id': response['id'], 'token': uuid.uuid4().hex}
+
+    def close(self, state):
+        try:
+            self.es.close_point_in_time(id=state['pit_id'])
+        except Exception as ex:
+            logger.warning(f'Failed to close point in time: {ex}')
+
+    def share(self, cache_key, state):
+        """
+        Store the state for other requests for the query. If another request
+        stored one first, that is used and this PIT is closed.
+
+        :return: state to use and whether it is shared
+        :rtype: tuple(dict, bool)
+        """
+        if self.cache.add(cache_key, state, opensearch_settings.PIT_CACHE_TIMEOUT):
+            return state, True
+
+        stored = self.cache.get(cache_key)
+
+        # Caching is disabled
+        if stored is None:
+            return state, False
+
+        self.close(state)
+
+        return stored, True
+
+    def position_key(self, state, offset):
+        return f'opensearch:pit:{state["token"]}:{offset}'
+
+    def set_position(self, state, offset, search_after):
+        self.cache.set(self.position_key(state, offset), search_after, opensearch_settings.PIT_CACHE_TIMEOUT)
+
+    def get_position(self, state, offset, page_size):
+        """
+        Find the nearest known position at or before the offset. Pages are
+        usually requested in order, so the start of the requested page and
+        of the pages before it are checked.
+
+        :param state: PIT state or None if there is no PIT for the query
+        :param offset: index of the first hit to retrieve
+        :type offset: int
+
+        :param page_size: number of hits per page
+        :type page_size: int
+
+        :return: offset and the sort values of the hit before it
+        :rtype: tuple(int, list)
+        """
+        if state is None or not offset:
+            return 0, None
+
+        lowest = max(offset - opensearch_settings.PIT_MAX_SEEK, 0)
+        offsets = range(offset, lowest, -max(page_size, 1))[:self.seek_probes]
+        keys = {self.position_key(state, position): position for position in offsets}
+
+        found = self.cache.get_cache().get_many(list(keys))
+
+        if not found:
+            return 0, None
+
+        key = max(found, key=keys.get)
+
+        return keys[key], found[key]
+
+    @staticmethod
+    def check_seek(start, offset):
+        """
+        :raises BadRequest: The offset is too far from a known position
+        """
+        if offset - start > opensearch_settings.PIT_MAX_SEEK:
+            raise BadRequest(
+                f'Results more than {opensearch_settings.PIT_MAX_SEEK} past the last page retrieved cannot be '
+                'requested by page number. Follow the next links, which use searchAfter, to page through them.'
+            )
+
+    def _search(self, state, query, filter_path=None):
+        """
+        Run a search against the PIT. Elasticsearch may return an updated
+        PIT id which is used for the rest of the request.
+        """
+        query['pit'] = {'id': state['pit_id'], 'keep_alive': self.keep_alive}
+
+        if filter_path:
+            response = self.es.search(body=query, filter_path=['pit_id', *filter_path])
+        else:
+            response = self.es.search(body=query)
+
+        state['pit_id'] = response.get('pit_id', state['pit_id'])
+
+        return response
+
+    def _seek(self, state, query, start, search_after, offset):
+        """
+        Find the sort values of the hit before the offset, walking forward
+        from a known position.
+
+        :return: search_after values or None if the offset is past the end
+        :rtype: list
+        """
+        walk = {
+            'query': query.get('query'),
+            'sort': query.get('sort'),
+            '_source': False,
+            'track_total_hits': False
+        }
+
+        while start < offset:
+            batch = min(offset - start, opensearch_settings.RESULT_WINDOW)
+
+            walk['size'] = batch
+            if search_after is not None:
+                walk['search_after'] = search_after
+
+            hits = get_hits(self._search(state, dict(walk), ['hits.hits.sort']))
+
+            if len(hits) < batch:
+                return None
+
+            start += batch
+            search_after = hits[-1]['sort']
+            self.set_position(state, start, search_after)
+
+        return search_after
+
+    def search(self, query, signature, filter_path=None):
+        """
+        Run the query from the offset given by query['from']
+
+        :param query: Elasticsearch query
+        :type query: dict
+
+        :param signature: parts of the query which identify the result set
+        :type signature: dict
+
+        :param filter_path: parts of the response to return
+        :type filter_path: list
+
+        :return: Elasticsearch response
+        :rtype: dict
+
+        :raises BadRequest: The offset is too far from a known position
+        """
+        query = dict(query)
+        offset = query.pop('from', 0)
+
+        cache_key = self.cache.make_key(settings.ES_CONNECTION.index, signature, query.get('sort'))
+
+        for attempt in range(2):
+            state = self.cache.get(cache_key)
+            start, search_after = self.get_position(state, offset, query.get('size', 10))
+            self.check_seek(start, offset)
+
+            shared = True
+            if state is None:
+                state, shared = self.share(cache_key, self.open())
+
+            # The stored state is not changed by this request
+            state = dict(state)
+
+            try:
+                search_after = self._seek(state, query, start, search_after, offset)
+
+                if search_after is None and offset:
+                    # Offset is past the last result
+                    response = self._search(state, {**query, 'size': 0}, filter_path)
+
+                else:
+                    if search_after is not None:
+                        query['search_after'] = search_after
+
+                    response = self._search(state, query, filter_path)
+
+                    hits = get_hits(response)
+                    if hits:
+                        self.set_position(state, offset + len(hits), hits[-1]['sort'])
+
+                    # Remove the tiebreaker added to the sort values by the
+                    # PIT so the hits match those from a normal search
+                    sort_length = len(query.get('sort', ()))
+                    for hit in hits:
+                        hit['sort'] = hit['sort'][:sort_length]
+
+                return response
+
+            except NotFoundError:
+                # The PIT has expired. Start again with a new one.
+                self.cache.delete(cache_key)
+                query.pop('search_after', None)
+                if attempt:
+                    raise
+
+            finally:
+                if not shared:
+                    self.close(state)
+
+    def scan(self, query, batch_size, filter_path=None):
+        """
+        Iterate over all the hits for the query. Uses a PIT of its own which
+        is closed once the iteration finishes or is abandoned.
+
+        :param query: Elasticsearch query
+        :type query: dict
+
+        :param batch_size: Number of hits to retrieve per request
+        :type batch_size: int
+
+        :param filter_path: parts of the response to return
+        :type filter_path: list
+
+        :return: generator of lists of hits
+        """
+        state = self.open()
+
+        query = dict(query, size=batch_size, track_total_hits=False)
+        query.pop('from', None)
+
+        try:
+            while True:
+                hits = get_hits(self._search(state, dict(query), filter_path))
+
+                if hits:
+                    yield hits
+
+                if len(hits) < batch_size:
+                    break
+
+                query['search_after'] = hits[-1]['sort']
+
+        finally:
+            self.close(state)
+
+
+POINT_IN_TIME_PAGER = PointInTimePager()
@@ -0,0 +1,248 @@
+# encoding: utf-8
+"""
+Resolves collection IDs to their root filepath and whether they have child
+collections. The mapping only changes when collections are published so
+results, including unknown IDs, are cached in-process until the opensearch
+cache is invalidated.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from collections import namedtuple
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from django_opensearch import settings as opensearch_settings
+from django_opensearch.cache import get_generation
+from django_opensearch.opensearch.utils import TTLCache
+from django_opensearch.opensearch.utils.ttl_cache import MISSING
+
+logger = logging.getLogger(__name__)
+
+CollectionInfo = namedtuple('CollectionInfo', ('path', 'has_children'))
+
+
+class CollectionPathResolver:
+    """
+    LRU/TTL cache in front of the collections index. The cache is emptied
+when the generation marker of the opensearch cache changes, so
+invalidation in any process reaches it. The marker is checked at most
+every settings.COLLECTION_PATH_REFRESH_INTERVAL seconds.
+
+    :param maxsize: Maximum number of collection IDs to hold
+    :type maxsize: int
+
+    :param ttl: Time to live for known collections, in seconds
+    :type ttl: float
+
+    :param negative_ttl: Time to live for unknown collections, in seconds
+    :type negative_ttl: float
+    """
+
+    def __init__(self, maxsize, ttl, negative_ttl):
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generation = None
+        self.checked = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Empty the cache if the opensearch cache has been invalidated since it
+        was filled. All collections are then loaded if
+        settings.COLLECTION_PATH_PRELOAD is set, so this happens on the first
+        lookup rather than at startup.
+        """
+        now = time.monotonic()
+
+        if self.checked is not None and now - self.checked < opensearch_settings.COLLECTION_PATH_REFRESH_INTERVAL:
+            return
+
+        generation = get_generation()
+        self.checked = now
+
+        if generation == self.generation:
+            return
+
+        with self._lock:
+            if generation == self.generation:
+                return
+
+            self.cache.clear()
+
+            if opensearch_settings.COLLECTION_PATH_PRELOAD:
+                try:
+                    count = self.preload()
+                    logger.info(f'Preloaded {count} collection paths')
+                except Exception as e:
+                    logger.warning(f'Unable to preload collection paths: {e}')
+
+            self.generation = generation
+
+    def resolve(self, collection_id):
+        """
+        Return the root filepath for the given collection ID
+
+        :param collection_id: Collection ID
+        :type collection_id: str
+
+        :return: filepath or None if the collection does not exist
+        :rtype: str
+        """
+        info = self.lookup(collection_id)
+
+        if info is not None:
+            return info.path
+
+    def lookup(self, collection_id):
+        """
+        Return the path of the given collection and whether any collections
+        have it as their parent
+
+        :param collection_id: Collection ID
+        :type collection_id: str
+
+        :return: collection info or None if the collection does not exist
+        :rtype: CollectionInfo
+        """
+        self.refresh()
+        info = self.cache.get(collection_id, MISSING)
+
+        if info is not MISSING:
+            return info
+
+        info = self._query(collection_id)
+
+        if info is not None:
+            self.cache.set(collection_id, info)
+        else:
+            self.cache.set(collection_id, info, ttl=self.negative_ttl)
+
+        return info
+
+    @staticmethod
+    def _query(collection_id):
+        """
+        Retrieve the collection path and the number of child collections
+        in a single request. Matches either the collection itself or its
+        children, counts the children with an aggregation and uses a post
+        filter so only the collection is returned as a hit.
+
+        :param collection_id: Collection ID
+        :type collection_id: str
+
+        :return: collection info or None if the collection does not exist
+        :rtype: CollectionInfo
+        """
+        collection_term = {'term': {'collection_id': collection_id}}
+        children_term = {'term': {'parent_identifier': collection_id}}
+
+        query = {
+            'query': {
+                'bool': {
+                    'should': [collection_term, children_term],
+                    'minimum_should_match': 1
+                }
+            },
+            'post_filter': collection_term,
+            'aggs': {
+                'children': {
+                    'filter': children_term
+                }
+            },
+            '_source': ['path'],
+            'size': 1
+        }
+
+        result = settings.ES_CONNECTION.search_collections(query)
+
+        # Aggregations are not available from the static collection
+        # fallback so use separate requests
+        if not result.get('aggregations'):
+            result = settings.ES_CONNECTION.search_collections({
+                'query': collection_term,
+                '_source': ['path'],
+                'size': 1
+            })
+            if not result['hits']['hits']:
+                return
+
+            children = settings.ES_CONNECTION.count_collections({'query': children_term})['count']
+
+        else:
+            if not result['hits']['hits']:
+                return
+
+            children = result['aggregations']['children']['doc_count']
+
+        return CollectionInfo(result['hits']['hits'][0]['_source']['path'], bool(children))
+
+    @staticmethod
+    def all_collections():
+        """
+        Retrieve all collections in a single request. The child collections
+        can only be determined if all collections fit in one request.
+
+        :return: collection info keyed by collection ID, or None if the
+        collections do not fit in one request
+        :rtype: dict
+        """
+        query = {
+            'query': {
+                'match_all': {}
+            },
+            '_source': ['collection_id', 'path', 'parent_identifier'],
+            'size': opensearch_settings.COLLECTION_PATH_PRELOAD_SIZE,
+            'track_total_hits': True
+        }
+
+        result = settings.ES_CONNECTION.search_collections(query)
+        hits = result['hits']['hits']
+
+        if len(hits) < result['hits']['total']['value']:
+            return
+
+        parents = {hit['_source'].get('parent_identifier') for hit in hits}
+
+        collections = {}
+        for hit in hits:
+            source = hit['_source']
+            if source.get('collection_id') and source.get('path'):
+                collections[source['collection_id']] = CollectionInfo(
+                    source['path'], source['collection_id'] in parents
+                )
+
+        return collections
+
+    def preload(self):
+        """
+        Load all collections in a single request. Nothing is loaded if the
+        collections do not fit in one request.
+
+        :return: Number of collections loaded
+        :rtype: int
+        """
+        collections = self.all_collections() or {}
+
+        for collection_id, info in collections.items():
+            self.cache.set(collection_id, info)
+
+        return len(collections)
+
+    def clear(self):
+        self.cache.clear()
+        self.generation = None
+        self.checked = None
+
+
+COLLECTION_PATHS = CollectionPathResolver(
+    maxsize=opensearch_settings.COLLECTION_PATH_CACHE_SIZE,
+    ttl=opensearch_settings.COLLECTION_PATH_CACHE_TTL,
+    negative_ttl=opensearch_settings.COLLECTION_PATH_NEGATIVE_CACHE_TTL
+)
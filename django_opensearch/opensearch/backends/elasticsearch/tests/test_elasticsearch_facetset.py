@@ -9,10 +9,12 @@ __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 from unittest import TestCase
-from ..facets.base import ElasticsearchFacetSet
-from ..facets import CMIP5Facets
+import copy
+from ..facets.base import ElasticsearchFacetSet, HandlerRegistry
+from ..facets import CCIFacets, CMIP5Facets
 from ..facets.elasticsearch_connection import ElasticsearchConnection
 from django.http.request import QueryDict
+from django_opensearch import settings
 
 
 class TestElasticsearchFacetSet(TestCase):
@@ -145,3 +147,169 @@ class TestElasticsearchFacetSet(TestCase):
         uuid3 = base_hits[2]['_id']
         self.assertEqual(uuid3, hits[0]['_id'])
 
+    @staticmethod
+    def scored_query(query):
+        """
+        Rewrite the filter clauses of a query in the scored form used before
+        the facet terms were moved to filter context.
+        """
+        query = copy.deepcopy(query)
+        bool_query = query['query']['bool']
+
+        for clause in bool_query.pop('filter'):
+            if 'terms' in clause:
+                field, values = list(clause['terms'].items())[0]
+                clause = {
+                    'bool': {
+                        'should': [{'term': {field: value}} for value in values],
+                        'minimum_should_match': 1
+                    }
+                }
+            bool_query['must'].append(clause)
+
+        bool_query['filter'] = []
+
+        return query
+
+    def test__build_query_filter_context(self):
+
+        params = QueryDict('product=output&product=output2&experiment=historical')
+        query = self.efc.build_query(params, max_results=10)
+
+        bool_query = query['query']['bool']
+
+        self.assertListEqual(bool_query['must'], [])
+        self.assertIn(
+            {'terms': {f'projects.{settings.APPLICATION_ID}.product.keyword': ['output', 'output2']}},
+            bool_query['filter']
+        )
+
+    def test__build_query_shares_base_query(self):
+
+        base_query = copy.deepcopy(self.efc.base_query)
+
+        self.efc.build_query(QueryDict('product=output&startDate=13/05/2015'), max_results=10)
+        self.efc.build_query(QueryDict(''), search_after=['a', 'b'], reverse=True, max_results=10)
+
+        self.assertDictEqual(base_query, self.efc.base_query)
+
+    def test__build_query_filter_context_hits(self):
+
+        for params in ('product=output', 'product=output&product=output2', 'query=water&product=output'):
+            query = self.efc.build_query(QueryDict(params), max_results=100)
+
+            filtered = ElasticsearchConnection().search(query)
+            scored = ElasticsearchConnection().search(self.scored_query(query))
+
+            self.assertListEqual(
+                [hit['_id'] for hit in filtered['hits']['hits']],
+                [hit['_id'] for hit in scored['hits']['hits']]
+            )
+
+    def test_filter_source(self):
+
+        query = self.efc.build_query(QueryDict(''), max_results=10)
+        self.efc.filter_source(query)
+
+        self.assertListEqual(query['_source']['includes'], list(self.efc.source_includes))
+        self.assertNotIn('excludes', query['_source'])
+
+    def test_filter_source_entries(self):
+
+        params = QueryDict('parentIdentifier=cmip5')
+        query = self.efc.build_query(params, max_results=10)
+
+        full = ElasticsearchConnection().search(query)
+
+        self.efc.filter_source(query)
+        filtered = ElasticsearchConnection().search(query)
+
+        for full_hit, filtered_hit in zip(full['hits']['hits'], filtered['hits']['hits']):
+            self.assertDictEqual(
+                self.efc.build_entry(full_hit, params, ''),
+                self.efc.build_entry(filtered_hit, params, '')
+            )
+
+
+class TestOpendapFlags(TestCase):
+
+    @staticmethod
+    def make_hit(phenomena=None, fields=None):
+        hit = {'_id': 'a.nc', '_source': {'info': {'format': 'NetCDF'}}}
+
+        if phenomena is not None:
+            hit['_source']['info']['phenomena'] = phenomena
+
+        if fields is not None:
+            hit['fields'] = fields
+
+        return hit
+
+    def test_script_fields(self):
+        hit = self.make_hit(fields={'opendap_int64': [False], 'opendap_char_array': [True]})
+
+        self.assertEqual(CCIFacets.opendap_flags(hit), (False, True))
+
+    def test_phenomena(self):
+        phenomena = [
+            {'dtype': 'float32', 'dimensions': ['time', 'lat', 'lon']},
+            {'dtype': 'bytes8', 'dimensions': ['string8']},
+        ]
+
+        self.assertEqual(CCIFacets.opendap_flags(self.make_hit(phenomena)), (False, True))
+        self.assertEqual(CCIFacets.opendap_flags(self.make_hit([{'dtype': 'int64', 'dimensions': ['time']}])), (True, False))
+        self.assertEqual(CCIFacets.opendap_flags(self.make_hit([])), (False, False))
+
+    def test_missing(self):
+        with self.assertRaises(ValueError):
+            CCIFacets.opendap_flags(self.make_hit())
+
+    def test_request_body(self):
+        efc = CCIFacets('/neodc/esacci')
+        query = efc.build_query(QueryDict(''), max_results=10)
+        efc.filter_source(query)
+
+        self.assertNotIn('info.phenomena', query['_source']['includes'])
+        self.assertEqual(set(query['script_fields']), {'opendap_int64', 'opendap_char_array'})
+
+        int64 = query['script_fields']['opendap_int64']['script']['source']
+        char_array = query['script_fields']['opendap_char_array']['script']['source']
+
+        self.assertIn("phenom['dtype'] == 'int64'", int64)
+        self.assertIn("phenom['dimensions'].size() == 1", char_array)
+
+        # Format placeholders are replaced and the braces unescaped
+        for source in (int64, char_array):
+            self.assertNotIn('{condition}', source)
+            self.assertEqual(source.count('{'), source.count('}'))
+            self.assertNotIn('{{', source)
+
+
+class TestHandlerRegistry(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.registry = HandlerRegistry({
+            '/badc/cmip5/data': dict(handler='django_opensearch.opensearch.backends.elasticsearch.facets.CMIP5Facets'),
+            '/neodc/esacci': dict(handler='django_opensearch.opensearch.backends.elasticsearch.facets.CCIFacets'),
+            '/neodc/esacci/cmip5': dict(handler='django_opensearch.opensearch.backends.elasticsearch.facets.CMIP5Facets'),
+        }, maxsize=10)
+
+    def test_match(self):
+
+        self.assertEqual(self.registry.match('/neodc/esacci/sst/v1')[0], '/neodc/esacci')
+        self.assertEqual(self.registry.match('/neodc/esacci/cmip5/v1')[0], '/neodc/esacci/cmip5')
+        self.assertEqual(self.registry.match('/neodc/esacci/')[0], '/neodc/esacci')
+
+        for path in ('/neodc/esaccix', '/neodc', '/', '', None):
+            self.assertIsNone(self.registry.match(path))
+
+    def test_get_handler(self):
+
+        handler = self.registry.get_handler('/neodc/esacci/sst')
+
+        self.assertIsInstance(handler, CCIFacets)
+        self.assertEqual(handler.path, '/neodc/esacci/sst')
+        self.assertIs(handler, self.registry.get_handler('/neodc/esacci/sst'))
+        self.assertIsInstance(self.registry.get_handler('/neodc/esacci/cmip5/x'), CMIP5Facets)
+        self.assertIsNone(self.registry.get_handler('/unknown'))
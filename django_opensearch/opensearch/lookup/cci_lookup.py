@@ -9,18 +9,21 @@ __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 from .base import BaseLookupHandler
-from django.core.cache import cache
-from cci_facet_scanner.tagging.facets import Facets
-from django.conf import settings
-import json
+from .vocab import VOCABULARY
 import re
 import logging
+import threading
 
 CAMEL_PATTERN = re.compile(r'(?<!^)(?=[A-Z])')
 LABEL_PATTERN = re.compile(r'(?P<label>.+)\s\((?P<count>\d+)')
 
 logger = logging.getLogger(__name__)
 
+# Words which are left in lower case in the display labels
+TITLE_EXCEPTIONS = frozenset([
+    "and", "or", "for", "the", "a", "an", "but", "nor", "at", "by", "from", "to", "in", "on", "with"
+])
+
 
 def camel_to_snake(value):
     """
@@ -32,6 +35,98 @@ def camel_to_snake(value):
     return CAMEL_PATTERN.sub('_', value).lower()
 
 
+def title_exceptions(pref_label):
+    """
+    Title case the label, leaving the exceptions in lower case
+
+    :param pref_label: Label to convert
+    :return: converted label
+    """
+    return ' '.join(word if word in TITLE_EXCEPTIONS else word.title() for word in pref_label.split(' '))
+
+
+class LabelIndex:
+    """
+    Display labels for the values of the mappable facets, keyed by the lower
+    case value. The index is built once for each vocabulary and values which
+    are not alt labels are added as they are seen.
+
+    :param facet_names: Facets to index
+    :type facet_names: list
+    """
+
+    def __init__(self, facet_names):
+        self.facet_names = facet_names
+        self._vocab = None
+        self._index = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def display_label(vocab, facet, value):
+        """
+        :param vocab: vocabulary
+        :type vocab: Facets
+
+        :param facet: facet name in snake case
+        :type facet: str
+
+        :param value: facet value
+        :type value: str
+
+        :return: display label or None if the value has no preferred label
+        :rtype: str
+        """
+        pref_label = vocab.get_pref_label_from_alt_label(facet, value)
+
+        if pref_label:
+            return title_exceptions(pref_label)
+
+    def build(self, vocab):
+        """
+        Map the alt labels of each facet to their display label
+
+        :param vocab: vocabulary
+        :type vocab: Facets
+
+        :return: {facet: {alt_label: display_label}}
+        :rtype: dict
+        """
+        index = {}
+
+        for facet in self.facet_names:
+            vocab_facet = camel_to_snake(facet)
+
+            try:
+                alt_labels = vocab.get_alt_labels(vocab_facet)
+            except KeyError:
+                alt_labels = {}
+
+            index[facet] = {
+                alt_label: self.display_label(vocab, vocab_facet, alt_label)
+                for alt_label in alt_labels
+            }
+
+        return index
+
+    def get(self, vocab):
+        """
+        Index for the vocabulary, rebuilt if the vocabulary has changed
+
+        :param vocab: vocabulary
+        :type vocab: Facets
+
+        :return: {facet: {value: display_label}}
+        :rtype: dict
+        """
+        if vocab is not self._vocab:
+            with self._lock:
+                if vocab is not self._vocab:
+                    self._index = self.build(vocab)
+                    self._vocab = vocab
+
+        return self._index
+
+
 class CCILookupHandler(BaseLookupHandler):
     """
     Class to handle lookups from the extracted terms to the preferred lables
@@ -47,50 +142,16 @@ class CCILookupHandler(BaseLookupHandler):
         'dataType',
     ]
 
-    def __init__(self):
+    LABEL_INDEX = LabelIndex(MAPPABLE_FACETS)
 
-        # Retrieve cached values, cache lasts for 24 hours as vocab server doesn't change much
-        self.facets = settings.FACETS
-        #self.facets = Facets.from_json(cache.get_or_set('cci_vocabs', self._load_facets, timeout=86400))
-        # Emergency fix for this specific version.
-        #import requests
-        #self.facets = Facets.from_json(requests.get('https://raw.githubusercontent.com/cedadev/archive-opensearch/refs/heads/project_facet/ceda_opensearch/facets_json.json').json())
-
-    @staticmethod
-    def _load_facets():
+    @property
+    def facets(self):
         """
-        Load the facets from the server
+        Vocabularies, loaded on first use
 
-        :return: vocab mapping
-        :rtype: dict
+        :rtype: Facets
         """
-
-        data = {}
-        if settings.READ_FROM_VOCAB:
-            try:
-                data = Facets().to_json()
-            except Exception as e:
-                logger.error(f'Failed to get vocabs from vocab server: {e}')
-
-        # If vocabs successfully retrieved, save to disk
-        if data:
-            try:
-                with open(settings.VOCAB_CACHE_FILE, 'w') as writer:
-                    json.dump(data, writer)
-            except Exception as e:
-                logger.warning(f'Failed to save vocab mapping: {e}')
-
-        # If vocabs not successfully retrieved from live server. Try
-        # to retrieve the disk cache from the last successful attempt
-        if not data:
-            try:
-                with open(settings.VOCAB_CACHE_FILE) as reader:
-                    data = json.load(reader)
-
-            except Exception as e:
-                logger.critical('Unable to retrieve vocab cache from live server or disk: {e}')
-
-        return data
+        return VOCABULARY.get()
 
     def lookup_values(self, facet, value_list):
         """
@@ -104,24 +165,23 @@ class CCILookupHandler(BaseLookupHandler):
         :return: Modified value list
         """
 
-        def title_exceptions(pref_label):
-            new_label = []
-            exceptions = ["and", "or", "for", "the", "a", "an", "but", "nor", "at", "by", "from", "to", "in", "on", "with"]
-            for word in pref_label.split(' '):
-                if word in exceptions:
-                    new_label.append(word)
-                else:
-                    new_label.append(word.title())
-            return ' '.join(new_label)
-
         # Reduce calls to lookup
         if facet in self.MAPPABLE_FACETS:
+            vocab = self.facets
+            labels = self.LABEL_INDEX.get(vocab)[facet]
 
             for value in value_list:
-                pref_label = self.facets.get_pref_label_from_alt_label(camel_to_snake(facet), value['value'])
-                if pref_label:
+                term = value['value'].lower()
+
+                try:
+                    display_label = labels[term]
+                except KeyError:
+                    display_label = LabelIndex.display_label(vocab, camel_to_snake(facet), term)
+                    labels[term] = display_label
+
+                if display_label:
                     count = value['label'].split()[-1]
 
-                    value['label'] = f'{title_exceptions(pref_label)} {count}'
+                    value['label'] = f'{display_label} {count}'
 
         return value_list
@@ -0,0 +1,162 @@
+# encoding: utf-8
+"""
+Lazily loaded CCI vocabularies. The vocabularies are read from the local
+JSON file the first time they are needed so starting a worker does not
+depend on the vocab server. They can optionally be refreshed from the vocab
+server in the background.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from cci_facet_scanner.tagging.facets import Facets
+
+from django_opensearch import settings
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+logger = logging.getLogger(__name__)
+
+
+class Vocabulary:
+    """
+    Holds the vocabularies, loading them on first use from
+    settings.VOCAB_CACHE_FILE if it exists, otherwise settings.VOCAB_FILE.
+    Falls back to the vocab server if neither file can be read.
+    """
+
+    def __init__(self):
+        self._facets = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    @staticmethod
+    def paths():
+        """
+        :return: vocabulary files in order of preference
+        :rtype: list
+        """
+        return [path for path in (settings.VOCAB_CACHE_FILE, settings.VOCAB_FILE) if path]
+
+    def load(self):
+        """
+        Read the vocabularies from the first available file
+
+        :return: vocabularies
+        :rtype: Facets
+        """
+        for path in self.paths():
+            try:
+                with open(path, 'rb') as reader:
+                    return Facets(data=loads(reader.read()))
+
+            except FileNotFoundError:
+                continue
+
+            except Exception as e:
+                logger.warning(f'Unable to read vocabularies from {path}: {e}')
+
+        logger.warning('No vocabulary file available, retrieving from the vocab server')
+
+        return self.fetch()
+
+    @staticmethod
+    def fetch():
+        """
+        Retrieve the vocabularies from the vocab server
+
+        :return: vocabularies
+        :rtype: Facets
+        """
+        return Facets(endpoint=settings.VOCAB_ENDPOINT)
+
+    def get(self):
+        """
+        :return: vocabularies, loaded if this is the first use
+        :rtype: Facets
+        """
+        if self._facets is None:
+            with self._lock:
+                if self._facets is None:
+                    self._facets = self.load()
+                    self.start_refresh()
+
+        return self._facets
+
+    def refresh(self):
+        """
+        Replace the vocabularies with those from the vocab server and save
+        them to settings.VOCAB_CACHE_FILE if set
+
+        :return: vocabularies
+        :rtype: Facets
+        """
+        facets = self.fetch()
+
+        if settings.VOCAB_CACHE_FILE:
+            self.save(facets, settings.VOCAB_CACHE_FILE)
+
+        self._facets = facets
+
+        return facets
+
+    @staticmethod
+    def save(facets, path):
+        """
+        Write the vocabularies to a file, replacing it atomically
+
+        :param facets: vocabularies
+        :type facets: Facets
+
+        :param path: destination
+        :type path: str
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as writer:
+            json.dump(facets.to_json(), writer)
+
+        os.chmod(writer.name, 0o644)
+        os.replace(writer.name, path)
+
+    def start_refresh(self):
+        """
+        Start refreshing the vocabularies in the background every
+        settings.VOCAB_REFRESH_INTERVAL seconds, if set
+        """
+        interval = settings.VOCAB_REFRESH_INTERVAL
+
+        if not interval or self._refresher is not None:
+            return
+
+        self._refresher = threading.Thread(
+            target=self._refresh_loop,
+            args=(interval,),
+            name='vocab-refresh',
+            daemon=True
+        )
+        self._refresher.start()
+
+    def _refresh_loop(self, interval):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f'Failed to refresh vocabularies: {e}')
+
+            time.sleep(interval)
+
+
+VOCABULARY = Vocabulary()
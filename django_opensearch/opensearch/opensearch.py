@@ -1,6 +1,7 @@
 from django_opensearch import settings
 import math
 from django_opensearch.opensearch.backends import NamespaceMap
+from django_opensearch.opensearch.utils.cursor import decode_cursor, encode_cursor
 from importlib import import_module
 from django_opensearch.opensearch.backends.elasticsearch.facets.collection_map import COLLECTION_MAP
 
@@ -18,6 +19,9 @@ class OpensearchDescription:
     OS_PREFIX = settings.OS_PREFIX
     OS_ROOT_TAG = settings.OS_ROOT_TAG
 
+    # Path used for the top level collection description
+    DEFAULT_PATH = '/neodc/esacci'
+
     def __init__(self, request):
         self.short_name = settings.SHORT_NAME
         self.long_name = settings.LONG_NAME
@@ -38,9 +42,8 @@ class OpensearchDescription:
         response_types = settings.RESPONSE_TYPES
 
         if not search_params.get('parentIdentifier'):
-            default_path = '/neodc/esacci'
             # Get top level collection description
-            params = Collection(path=default_path).get_facet_set(search_params)
+            params = Collection(path=self.DEFAULT_PATH).get_facet_set(search_params)
 
             for response in response_types:
                 self.generate_url_section(response, params)
@@ -48,9 +51,10 @@ class OpensearchDescription:
         else:
 
             parentID = search_params.get('parentIdentifier')
-            collection_path = Collection.get_path(parentID)
+            collection = Collection.get_collection_info(parentID)
+            collection_path = collection.path
 
-            if backend.collection.collection_search(search_params):
+            if collection.has_children:
                 params = Collection(path=collection_path).get_facet_set(search_params)
 
             else:
@@ -100,11 +104,17 @@ class OpensearchResponse:
     type = "FeatureCollection"
     title = "Opensearch Response"
 
-    def __init__(self, request):
+    def __init__(self, request, lazy=False):
+        """
+        :param request: Django request
+        :param lazy: Build the features as they are read, rather than up front
+        :type lazy: bool
+        """
         search_params = request.GET
         full_uri = request.build_absolute_uri('/opensearch')
 
         self.totalResults = 0
+        self.totalResultsRelation = 'eq'
         self.itemsPerPage = int(search_params.get('maximumRecords', settings.MAX_RESULTS_PER_PAGE))
         self.startRecord = int(search_params.get('startRecord', settings.DEFAULT_START_RECORD))
         self.startPage = int(search_params.get('startPage', settings.DEFAULT_START_PAGE))
@@ -120,34 +130,63 @@ class OpensearchResponse:
 
         search_index = search_index if search_index > 1 else 1
 
-        search_after, reverse = self.check_scrolling()
-
-        search_after = search_after or search_params.get('searchAfter',None)
-
-        search_next = self._generate_responses(search_params, start_index=search_index, max_results=self.itemsPerPage, uri=full_uri, search_after=search_after, reverse=reverse)
+        cursor = None
+        if search_params.get('searchAfter'):
+            cursor = decode_cursor(search_params['searchAfter'], search_params)
+
+        search_before, search_next, has_previous = self._generate_responses(
+            search_params,
+            start_index=search_index,
+            max_results=self.itemsPerPage,
+            uri=full_uri,
+            search_after=cursor.search_after if cursor else None,
+            reverse=cursor.reverse if cursor else False,
+            lazy=lazy
+        )
+        self.page_bounds = (search_before, search_next)
 
         if search_index + self.itemsPerPage -1 > self.totalResults:
             end_of_page = self.totalResults
         else:
             end_of_page = search_index + self.itemsPerPage -1
 
+        # In bounded count mode the total may only be a lower bound
+        exact_total = self.totalResultsRelation == 'eq'
+        total = self.totalResults if exact_total else f'at least {self.totalResults}'
+
         self.subtitle = f'Showing {search_index} - {end_of_page}' \
-                        f' of {self.totalResults}'
+                        f' of {total}'
         
         if self.startPage == settings.DEFAULT_START_PAGE:
-            if search_after is not None:
-                search_after = f'after {search_after} '
+            if cursor is not None:
+                position = 'before' if cursor.reverse else 'after'
+                search_after = f'{position} {", ".join(str(value) for value in cursor.search_after)} '
             else:
                 search_after = ''
             self.subtitle = f'Showing {end_of_page} results {search_after}' \
-                                f'({self.totalResults} total)'
+                                f'({total} total)'
             if search_next is not None:
                 self.links['next'] = [
                     {
-                        'href': f'{full_uri}/request?{self._stitch_query_params(search_params)}&searchAfter={search_next}',
+                        'href': f'{full_uri}/request?{self._stitch_query_params(search_params)}&searchAfter={encode_cursor(search_next, search_params)}',
                         'title':'next'
                     }
                 ]
+            elif cursor is not None and cursor.reverse:
+                # Nothing before the cursor, so the results continue from the start
+                self.links['next'] = [
+                    {
+                        'href': f'{full_uri}/request?{self._stitch_query_params(search_params)}',
+                        'title': 'next'
+                    }
+                ]
+            if has_previous and search_before is not None:
+                self.links['previous'] = [
+                    {
+                        'href': f'{full_uri}/request?{self._stitch_query_params(search_params)}&searchAfter={encode_cursor(search_before, search_params, reverse=True)}',
+                        'title': 'prev'
+                    }
+                ]
             return
 
         if self.totalResults > self.itemsPerPage:
@@ -167,7 +206,7 @@ class OpensearchResponse:
                         }
                     ]
 
-            if self.startPage < self.totalResults / self.itemsPerPage:
+            if self.startPage < self.totalResults / self.itemsPerPage or not exact_total:
                 self.links['next'] = [
                         {
                             'href': self._generate_navigation_url(full_uri, search_params, 'next'),
@@ -175,6 +214,8 @@ class OpensearchResponse:
                         }
                     ]
 
+            # The last page is not known if the total is a lower bound
+            if self.startPage < self.totalResults / self.itemsPerPage and exact_total:
                 self.links['last'] = [
                             {
                                 'href': self._generate_navigation_url(full_uri, search_params, 'last'),
@@ -185,6 +226,10 @@ class OpensearchResponse:
     def __getstate__(self):
         state = self.__dict__.copy()
         del state['request']
+
+        # Only used for the response validators
+        del state['page_bounds']
+        del state['collection_search']
         return state
 
     def __setstate__(self, state):
@@ -225,23 +270,26 @@ class OpensearchResponse:
         self._generate_request_query(search_params)
 
         collection_path = None
-        next_search = None
-
+        collection_search = True
         if search_params.get('parentIdentifier'):
             parentID = search_params.get('parentIdentifier')
-            collection_path = Collection.get_path(parentID)
+            collection = Collection.get_collection_info(parentID)
+            collection_path = collection.path
+            collection_search = collection.has_children
 
-        if backend.collection.collection_search(search_params):
+        if collection_search:
             # Search for collections
-            self.totalResults, self.features = Collection(path=collection_path).search(search_params, **kwargs)
+            results = Collection(path=collection_path).search(search_params, **kwargs)
 
         else:
-            results, next_search = Granule(collection_path).search(search_params, **kwargs)
-            self.totalResults = results.total
-            self.features = results.results
-            #self.set_search_after(results)
+            results = Granule(collection_path).search(search_params, **kwargs)
+
+        self.collection_search = collection_search
+        self.totalResults = results.total
+        self.totalResultsRelation = results.total_relation
+        self.features = results.results
 
-        return next_search
+        return results.search_before, results.search_after, results.has_previous
 
     def _generate_request_query(self, search_params):
 
@@ -252,92 +300,3 @@ class OpensearchResponse:
             request[value] = search_params[param]
 
         self.queries['request'] = [request]
-
-    def check_scrolling(self):
-        """
-        Retrieve the search_after key if the request is the same with a page within 1 of the previous search
-        :param request:
-        :return:
-        """
-
-        session = self.request.session
-
-        search_params = self.request.GET
-        start_page = int(search_params.get('startPage',1))
-        last_query = session.get('last_query')
-
-        # Only need to check if we are looking at a page higher than the first page
-        if start_page > 1:
-
-            # Check if we have a last_query in the session
-            if last_query:
-
-                last_query_page = int(last_query.get('startPage', 1))
-
-                # If the page is not within 1 we can't use search after
-                if not abs(start_page - last_query_page) <= 1:
-                    return None, None
-
-                # Check that the search parameters are the same
-                ignored_params = ('startPage', 'httpAccept')
-                current_search = {key for key in search_params if key not in ignored_params}
-                last_search = {key for key in last_query if key not in ignored_params}
-
-                # If searches are not the same, cannot use last query
-                if not current_search == last_search:
-                    return None, None
-
-                # Check if values for search facets are the same
-                for key in current_search:
-                    if not search_params[key] == last_query[key]:
-                        return None, None
-
-                # Page is  +/-1, search params are the same and values for them
-                # are the same. Retrieve the search_after key
-                diff = start_page - last_query_page
-
-                if diff == -1:
-                    search_after = session.get('before_key')
-                elif diff == 0:
-                    search_after = session.get('current_key')
-                else:
-                    search_after = session.get('after_key')
-
-                reverse = any((diff < 0, session.get('downpage')))
-
-                return search_after, reverse
-
-        return None, None
-
-    def set_search_after(self, results):
-
-        before_key = results.search_before
-        after_key = results.search_after
-
-        session = self.request.session
-        search_params = self.request.GET
-
-        last_query = session.get('last_query')
-        start_page = int(search_params.get('startPage', 1))
-
-        # Set the last query
-        session['last_query'] = search_params
-
-        if start_page > 1:
-            if last_query:
-                last_query_page = int(last_query.get('startPage', 1))
-
-                diff = start_page - last_query_page
-
-                if diff == -1:
-                    session['current_key'] = session['before_key']
-                    session['downpage'] = True
-
-                elif diff == 1:
-                    session['current_key'] = session['after_key']
-                    session['downpage'] = False
-
-        session['before_key'] = before_key
-        session['after_key'] = after_key
-
-
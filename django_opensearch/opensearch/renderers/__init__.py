@@ -0,0 +1,13 @@
+# encoding: utf-8
+"""
+Writers which stream the opensearch response in the supported formats
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from .atom import AtomWriter
+from .export import CSVWriter, NDJSONWriter
+from .geojson import GeoJSONWriter
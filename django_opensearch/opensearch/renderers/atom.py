@@ -0,0 +1,162 @@
+# encoding: utf-8
+"""
+Streaming Atom writer for the opensearch response. Produces the same document
+as the response.xml template in a single pass over the features, escaping
+values in the same way as the django template engine.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from html import escape as _escape
+
+from django_opensearch.opensearch.backends.base import NamespaceMap
+from django_opensearch.templatetags.coordinate_tags import expand_coordinates
+from .base import StreamingWriter
+
+FEED_OPEN = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<feed xmlns="http://www.w3.org/2005/Atom"'
+    ' xmlns:dc="http://purl.org/dc/elements/1.1/"'
+    ' xmlns:os="http://a9.com/-/spec/opensearch/1.1/"'
+    ' xmlns:geo="http://a9.com/-/opensearch/extensions/geo/1.0/"'
+    ' xmlns:eo="http://a9.com/-/opensearch/extensions/eo/1.0/"'
+    ' xmlns:time="http://a9.com/-/opensearch/extensions/time/1.0/"'
+    ' xmlns:georss="http://www.georss.org/georss">'
+    '<title>Opensearch response</title>'
+)
+
+# Entry properties which are written as their own elements
+SKIP_PROPERTIES = ('links', 'aggregations', 'variables')
+
+
+def escape(value):
+    """
+    Escape a value for XML. Matches django.utils.html.escape without
+    wrapping the result in a SafeString.
+    """
+    return _escape(str(value))
+
+
+class AtomWriter(StreamingWriter):
+    """
+    Write the opensearch response as an Atom feed. The feed header is written
+    first and then each entry as it is built.
+
+    :param osr: Opensearch response
+    :type osr: OpensearchResponse
+
+    :param request: Django request, used for the feed id
+    """
+
+    # Element names for the mapped properties. Anything else is
+    # written using the property name.
+    tags = {key: NamespaceMap.get_namespace(key)[1] for key in NamespaceMap.map}
+
+    def __init__(self, osr, request):
+        self.osr = osr
+        self.request = request
+
+    @staticmethod
+    def links(links, parts):
+        """
+        Write the links, keyed by relationship
+
+        :param links: {rel: [link, ...]}
+        :type links: dict
+
+        :param parts: output list
+        :type parts: list
+        """
+        for rel, rel_links in links.items():
+            rel = escape(rel)
+            for link in rel_links:
+                parts.append(f'<link href="{escape(link.get("href"))}" rel="{rel}"')
+                if link.get('title'):
+                    parts.append(f' title="{escape(link["title"])}"')
+                if link.get('type'):
+                    parts.append(f' type="{escape(link["type"])}"')
+                parts.append('/>')
+
+    def header(self):
+        """
+        :return: Feed header up to the first entry
+        :rtype: str
+        """
+        osr = self.osr
+        parts = [
+            FEED_OPEN,
+            f'<id>{escape(self.request.build_absolute_uri())}</id>',
+            f'<subtitle type="html">{escape(osr.subtitle)}</subtitle>',
+            f'<os:totalResults>{escape(osr.totalResults)}</os:totalResults>',
+            f'<os:startIndex>{escape(osr.startPage)}</os:startIndex>',
+            f'<os:itemsPerPage>{escape(osr.itemsPerPage)}</os:itemsPerPage>',
+        ]
+
+        self.links(getattr(osr, 'links', {}), parts)
+
+        for role, queries in osr.queries.items():
+            role = escape(role)
+            for query in queries:
+                parts.append(f'<os:Query role="{role}"')
+                for key, value in query.items():
+                    parts.append(f' {escape(key)}="{escape(value)}"')
+                parts.append('/>')
+
+        return ''.join(parts)
+
+    def entry(self, entry):
+        """
+        :param entry: A single feature
+        :type entry: dict
+
+        :return: The entry element
+        :rtype: str
+        """
+        tags = self.tags
+        properties = entry.get('properties', {})
+
+        parts = ['<entry><id>', escape(entry.get('id')), '</id>']
+
+        if entry.get('bbox'):
+            parts.append(f'<georss:box>{escape(expand_coordinates(entry["bbox"]))}</georss:box>')
+
+        for key, value in properties.items():
+            if key == 'variables':
+                for variable in value:
+                    parts.append('<variable')
+                    for k, v in variable.items():
+                        parts.append(f' {escape(k)}="{escape(v)}"')
+                    parts.append('></variable>')
+
+            elif key not in SKIP_PROPERTIES:
+                tag = tags.get(key)
+                if tag is None:
+                    tag = escape(key)
+                parts.append(f'<{tag}>{escape(value)}</{tag}>')
+
+        for aggregation in properties.get('aggregations') or ():
+            parts.append(f'<aggregation><id>{escape(aggregation.get("id"))}</id>')
+            self.links(aggregation.get('properties', {}).get('links', {}), parts)
+            parts.append('</aggregation>')
+
+        self.links(properties.get('links', {}), parts)
+
+        parts.append('</entry>')
+
+        return ''.join(parts)
+
+    def iter_parts(self):
+        """
+        Generate the encoded parts of the document
+
+        :return: generator of bytes
+        """
+        yield self.header().encode('utf-8')
+
+        for entry in self.osr.features:
+            yield self.entry(entry).encode('utf-8')
+
+        yield b'</feed>'
@@ -0,0 +1,80 @@
+# encoding: utf-8
+"""
+Base class for the streaming response writers
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from asgiref.sync import sync_to_async
+
+
+class StreamingWriter:
+    """
+    Writers generate the document as a sequence of encoded parts, the first
+    of which is the header. Subclasses implement :meth:`iter_parts`.
+    """
+
+    # Size of the chunks passed to the server, in bytes
+    chunk_size = 65536
+
+    def iter_parts(self):
+        """
+        Generate the encoded parts of the document
+
+        :return: generator of bytes
+        """
+        raise NotImplementedError
+
+    def stream(self):
+        """
+        Generate the document in chunks of roughly chunk_size bytes. The
+        header is sent on its own as soon as it is available.
+
+        :return: generator of bytes
+        """
+        parts = self.iter_parts()
+        yield next(parts)
+
+        buffer = []
+        size = 0
+
+        for part in parts:
+            buffer.append(part)
+            size += len(part)
+
+            if size >= self.chunk_size:
+                yield b''.join(buffer)
+                buffer = []
+                size = 0
+
+        if buffer:
+            yield b''.join(buffer)
+
+    def render(self):
+        """
+        :return: The complete document
+        :rtype: bytes
+        """
+        return b''.join(self.iter_parts())
+
+    async def astream(self):
+        """
+        Asynchronous version of :meth:`stream` for ASGI servers. Each chunk
+        is generated in a worker thread so the event loop is not blocked
+        while the entries are built.
+
+        :return: async generator of bytes
+        """
+        chunks = self.stream()
+        next_chunk = sync_to_async(next, thread_sensitive=False)
+
+        while True:
+            chunk = await next_chunk(chunks, None)
+
+            if chunk is None:
+                break
+
+            yield chunk
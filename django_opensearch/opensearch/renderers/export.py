@@ -0,0 +1,105 @@
+# encoding: utf-8
+"""
+Writers for the bulk export of granule entries. One line is written per
+entry so the memory used does not depend on the number of entries.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import csv
+import io
+
+from django_opensearch.templatetags.coordinate_tags import expand_coordinates
+from .base import StreamingWriter
+from .geojson import dumps
+
+
+class NDJSONWriter(StreamingWriter):
+    """
+    Write each entry as a GeoJSON feature on its own line
+
+    :param entries: Entries to write
+    :type entries: iterable
+    """
+
+    content_type = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def iter_parts(self):
+        """
+        Generate the encoded parts of the document
+
+        :return: generator of bytes
+        """
+        # The header is empty so the response starts immediately
+        yield b''
+
+        for entry in self.entries:
+            yield dumps(entry) + b'\n'
+
+
+class CSVWriter(StreamingWriter):
+    """
+    Write each entry as a row of comma separated values. Related links are
+    written space separated in a single column.
+
+    :param entries: Entries to write
+    :type entries: iterable
+    """
+
+    content_type = 'text/csv'
+    extension = 'csv'
+
+    columns = ('id', 'identifier', 'title', 'updated', 'filesize', 'date', 'bbox', 'related')
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def row(self, entry):
+        """
+        :param entry: A single feature
+        :type entry: dict
+
+        :return: values for each column
+        :rtype: list
+        """
+        properties = entry.get('properties', {})
+        related = properties.get('links', {}).get('related', [])
+
+        return [
+            entry.get('id'),
+            properties.get('identifier'),
+            properties.get('title'),
+            properties.get('updated'),
+            properties.get('filesize'),
+            properties.get('date'),
+            expand_coordinates(entry['bbox']) if entry.get('bbox') else '',
+            ' '.join(link['href'] for link in related if link.get('href')),
+        ]
+
+    def iter_parts(self):
+        """
+        Generate the encoded parts of the document
+
+        :return: generator of bytes
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        writer.writerow(self.columns)
+
+        for entry in self.entries:
+            yield buffer.getvalue().encode('utf-8')
+
+            buffer.seek(0)
+            buffer.truncate()
+
+            writer.writerow(self.row(entry))
+
+        yield buffer.getvalue().encode('utf-8')
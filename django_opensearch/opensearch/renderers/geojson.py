@@ -0,0 +1,70 @@
+# encoding: utf-8
+"""
+Streaming GeoJSON writer for the opensearch response. Uses orjson when it is
+installed and falls back to the standard library json module.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from django_opensearch import settings
+from .base import StreamingWriter
+
+try:
+    import orjson
+
+    def dumps(obj, pretty=False):
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(obj, default=str, option=option)
+
+except ImportError:
+    import json
+
+    def dumps(obj, pretty=False):
+        if pretty:
+            return json.dumps(obj, default=str, indent=2).encode('utf-8')
+        return json.dumps(obj, default=str, separators=(',', ':')).encode('utf-8')
+
+
+class GeoJSONWriter(StreamingWriter):
+    """
+    Write the opensearch response as a GeoJSON FeatureCollection. The header
+    is written first and then each feature as it is built, so the time to
+    the first byte does not depend on the page size.
+
+    :param osr: Opensearch response
+    :type osr: OpensearchResponse
+
+    :param pretty: Indent the output (default: settings.GEOJSON_PRETTY)
+    :type pretty: bool
+    """
+
+    def __init__(self, osr, pretty=None):
+        self.osr = osr
+        self.pretty = settings.GEOJSON_PRETTY if pretty is None else pretty
+
+    def iter_parts(self):
+        """
+        Generate the encoded parts of the document
+
+        :return: generator of bytes
+        """
+        state = self.osr.__getstate__()
+        features = state.pop('features', [])
+
+        header = dumps(state, pretty=self.pretty)
+
+        # Open the features list in place of the closing brace
+        if state:
+            yield header[:-1].rstrip() + b',"features":['
+        else:
+            yield b'{"features":['
+
+        for i, feature in enumerate(features):
+            if i:
+                yield b','
+            yield dumps(feature, pretty=self.pretty)
+
+        yield b']}'
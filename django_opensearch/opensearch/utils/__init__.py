@@ -9,4 +9,5 @@ __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 from .nested_dict import NestedDict
-from .thredds_path_generator import thredds_path
\ No newline at end of file
+from .thredds_path_generator import thredds_path
+from .ttl_cache import TTLCache
@@ -0,0 +1,93 @@
+# encoding: utf-8
+"""
+Signed cursor tokens for search_after paging. A token holds the sort values
+to continue from, the direction and a hash of the query it was issued for,
+so paging does not need any state on the server.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from collections import namedtuple
+
+from django.core import signing
+from django.core.exceptions import BadRequest
+
+from django_opensearch.cache import canonical_params, fingerprint
+
+SALT = 'django_opensearch.cursor'
+
+# Parameters which change the page but not the result set
+PAGING_PARAMS = ('startPage', 'startRecord', 'maximumRecords', 'searchAfter', 'httpAccept', 'countMode')
+
+Cursor = namedtuple('Cursor', ('search_after', 'reverse'))
+
+
+class InvalidCursor(BadRequest):
+    """
+    Raised when a cursor has been modified or was issued for another query
+    """
+    pass
+
+
+def query_hash(params):
+    """
+    Short hash of the search parameters, ignoring those used for paging
+
+    :param params: URL params
+    :type params: <class 'django.http.request.QueryDict'>
+
+    :return: hex digest
+    :rtype: str
+    """
+    return fingerprint(canonical_params(params, ignore=PAGING_PARAMS))[:16]
+
+
+def encode_cursor(search_after, params, reverse=False):
+    """
+    Create a cursor token
+
+    :param search_after: sort values of the hit to continue from
+    :type search_after: list
+
+    :param params: URL params of the current search
+    :type params: <class 'django.http.request.QueryDict'>
+
+    :param reverse: Whether the cursor pages backwards
+    :type reverse: bool
+
+    :return: URL safe token
+    :rtype: str
+    """
+    return signing.dumps(
+        {'s': list(search_after), 'r': int(bool(reverse)), 'q': query_hash(params)},
+        salt=SALT,
+        compress=True
+    )
+
+
+def decode_cursor(token, params):
+    """
+    Read a cursor token
+
+    :param token: token from the searchAfter parameter
+    :type token: str
+
+    :param params: URL params of the current search
+    :type params: <class 'django.http.request.QueryDict'>
+
+    :return: sort values and direction
+    :rtype: Cursor
+    :raises InvalidCursor: the token is invalid or does not match the query
+    """
+    try:
+        data = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        raise InvalidCursor('Invalid searchAfter cursor')
+
+    if data.get('q') != query_hash(params):
+        raise InvalidCursor('searchAfter cursor does not match the search parameters')
+
+    return Cursor(data['s'], bool(data['r']))
@@ -0,0 +1,191 @@
+# encoding: utf-8
+"""
+Client for the EO data bridge service which provides the relationships
+between datasets. Lookups for a page of collections are made concurrently
+over a pooled session and cached in-process. The page waits at most
+settings.DATA_BRIDGE_DEADLINE seconds for them, so a slow data bridge does
+not hold up the response.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django_opensearch import settings
+from django_opensearch.metrics import timed
+from .ttl_cache import TTLCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+
+class DataBridgeClient:
+    """
+    Retrieve related datasets from the data bridge
+
+    :param base_url: Data bridge host (default: settings.DATA_BRIDGE_URL)
+    :type base_url: str
+
+    :param timeout: Timeout, in seconds, for each call
+    :type timeout: float
+
+    :param max_workers: Number of concurrent requests to the data bridge
+    :type max_workers: int
+
+    :param deadline: Time, in seconds, to wait for the lookups for a page
+    :type deadline: float
+    """
+
+    def __init__(self, base_url=None, timeout=None, max_workers=None, deadline=None):
+        self.base_url = base_url or settings.DATA_BRIDGE_URL
+        self.timeout = timeout or settings.DATA_BRIDGE_TIMEOUT
+        self.max_workers = max_workers or settings.DATA_BRIDGE_MAX_WORKERS
+        self.deadline = deadline or settings.DATA_BRIDGE_DEADLINE
+
+        self.cache = TTLCache(
+            maxsize=settings.DATA_BRIDGE_CACHE_SIZE,
+            ttl=settings.DATA_BRIDGE_CACHE_TTL
+        )
+
+        self._session = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """
+        Shared HTTP session so that connections to the data bridge are reused
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.verify = False
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+
+        return self._session
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='data-bridge'
+                    )
+
+        return self._executor
+
+    def get_url(self, uid):
+        return f'{self.base_url}/dataset/https://catalogue.ceda.ac.uk/uuid/{uid}?format=json'
+
+    def _fetch(self, uid):
+        """
+        Call out to the data bridge for a single dataset and cache the
+        result. Failures, including timeouts, are cached for a shorter time.
+
+        :param uid: the uid of dataset
+        :type uid: str
+
+        :return: list of related datasets or None
+        """
+        url_string = self.get_url(uid)
+        relationships = None
+
+        try:
+            response = self.session.get(url_string, timeout=self.timeout)
+
+            if response.status_code == 200:
+                relationships = response.json()[0]['relationships']
+                for relationship in relationships:
+                    relationship['related_dataset_provider'] = settings.PROVIDERS_MAP.get(
+                        relationship['related_dataset_provider'],
+                        relationship['related_dataset_provider'],
+                    )
+
+        except requests.Timeout as ex:
+            logger.warning(f'Data bridge lookup timed out for {url_string}: {ex}')
+
+        except Exception as ex:
+            logger.warning(f'Data bridge lookup failed for {url_string}: {ex}')
+
+        self._store(uid, relationships)
+
+        return relationships
+
+    def _store(self, uid, relationships):
+        """
+        Cache the result. Failed lookups are held for a shorter time.
+        """
+        if relationships is None:
+            self.cache.set(uid, None, ttl=settings.DATA_BRIDGE_NEGATIVE_CACHE_TTL)
+        else:
+            self.cache.set(uid, relationships)
+
+    def get_relationships(self, uid):
+        """
+        Get the related datasets for a single dataset
+
+        :param uid: the uid of dataset
+        :type uid: str
+
+        :return: list of related datasets or None
+        """
+        return self.get_relationships_many([uid]).get(uid)
+
+    @timed('data_bridge')
+    def get_relationships_many(self, uids):
+        """
+        Get the related datasets for a list of datasets. Uncached datasets
+        are requested concurrently. Datasets still waiting for a response at
+        the deadline have no relationships for this page. Lookups which are
+        already running are cached when they finish, those yet to start are
+        cancelled.
+
+        :param uids: list of dataset uids
+        :type uids: list
+
+        :return: related datasets keyed by uid
+        :rtype: dict
+        """
+        results = {}
+        futures = {}
+
+        for uid in dict.fromkeys(uids):
+            if not uid:
+                continue
+
+            cached = self.cache.get(uid, MISSING)
+            if cached is not MISSING:
+                results[uid] = cached
+            else:
+                futures[self.executor.submit(self._fetch, uid)] = uid
+
+        if futures:
+            done, pending = wait(futures, timeout=self.deadline)
+
+            for future in done:
+                results[futures[future]] = future.result()
+
+            if pending:
+                logger.warning(f'Data bridge lookups for {len(pending)} datasets did not finish within {self.deadline}s')
+
+                for future in pending:
+                    future.cancel()
+                    results[futures[future]] = None
+
+        return results
+
+
+DATA_BRIDGE = DataBridgeClient()
@@ -0,0 +1,132 @@
+# encoding: utf-8
+"""
+Local store of precomputed facet values for the description documents. The
+store is written by the build_facet_value_store management command and
+reloaded whenever the file changes.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from django_opensearch import settings
+
+logger = logging.getLogger(__name__)
+
+# Parameters which do not change the facet values
+IGNORED_PARAMS = ('httpAccept',)
+
+
+class FacetValueStore:
+    """
+    Facet values keyed by facet set and collection
+
+    :param path: Location of the store (default: settings.FACET_VALUE_STORE_FILE)
+    :type path: str
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._data = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path or settings.FACET_VALUE_STORE_FILE
+
+    @staticmethod
+    def make_key(name, search_params):
+        """
+        Key for the facet values. Only searches without any filters other
+        than the collection are stored.
+
+        :param name: Name of the facet set
+        :type name: str
+
+        :param search_params: Search parameters
+        :type search_params: dict
+
+        :return: key or None if the values should not be stored
+        :rtype: str
+        """
+        params = [param for param in search_params if param not in IGNORED_PARAMS]
+
+        if set(params) - {'parentIdentifier'}:
+            return
+
+        return f'{name}:{search_params.get("parentIdentifier", "")}'
+
+    def load(self):
+        """
+        Read the store if it has changed on disk
+
+        :return: stored facet values
+        :rtype: dict
+        """
+        path = self.path
+
+        if not path:
+            return {}
+
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return {}
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        with open(path) as reader:
+                            self._data = json.load(reader)
+                    except (OSError, ValueError) as e:
+                        logger.warning(f'Unable to read facet value store {path}: {e}')
+                        self._data = {}
+
+                    self._mtime = mtime
+
+        return self._data
+
+    def get(self, key):
+        """
+        :param key: Key from :meth:`make_key`
+        :type key: str
+
+        :return: copy of the facet values or None if they are not stored
+        :rtype: dict
+        """
+        if key is None:
+            return
+
+        values = self.load().get(key)
+
+        if values is not None:
+            # Labels are modified when the description is built
+            return copy.deepcopy(values)
+
+    def write(self, data):
+        """
+        Replace the store
+
+        :param data: Facet values keyed by :meth:`make_key`
+        :type data: dict
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as writer:
+            json.dump(data, writer, separators=(',', ':'))
+
+        os.chmod(writer.name, 0o644)
+        os.replace(writer.name, self.path)
+
+
+FACET_VALUE_STORE = FacetValueStore()
@@ -0,0 +1,102 @@
+# encoding: utf-8
+"""
+Small thread-safe, in-process cache with per-entry expiry and LRU eviction.
+Used to hold short lived lookup results which would otherwise be fetched
+from external services on every request.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from collections import OrderedDict
+import threading
+import time
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Least recently used cache where each entry expires after a time to live
+
+    :param maxsize: Maximum number of entries to hold
+    :type maxsize: int
+
+    :param ttl: Default time to live, in seconds
+    :type ttl: float
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Retrieve a value from the cache
+
+        :param key: cache key
+        :param default: returned if the key is missing or expired
+
+        :return: cached value or default
+        """
+        with self._lock:
+            item = self._data.get(key, MISSING)
+
+            if item is MISSING:
+                return default
+
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Add a value to the cache, evicting the least recently used
+        entry if the cache is full.
+
+        :param key: cache key
+        :param value: value to store
+        :param ttl: time to live for this entry (default: self.ttl)
+        :type ttl: float
+        """
+        ttl = self.ttl if ttl is None else ttl
+
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Remove a key from the cache if present
+
+        :param key: cache key
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Empty the cache
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __len__(self):
+        return len(self._data)
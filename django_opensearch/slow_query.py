@@ -0,0 +1,226 @@
+# encoding: utf-8
+"""
+Slow query log for the elasticsearch requests.
+
+:class:`SlowQueryConnection` wraps the elasticsearch connection and times
+each search and count. Requests slower than settings.SLOW_QUERY_THRESHOLD,
+or which took elasticsearch longer than settings.SLOW_QUERY_TOOK_THRESHOLD,
+are logged as JSON to the ``django_opensearch.slow_query`` logger with the
+query, index, timings, hit count and the opensearch parameters of the
+request which made them.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import functools
+import json
+import logging
+import random
+import time
+
+from django_opensearch import settings
+from django_opensearch.metrics import REQUEST_TIMER
+
+logger = logging.getLogger('django_opensearch.slow_query')
+
+
+class SlowQueryLog:
+    """
+    Decides which queries are slow and logs them. A fraction of the slow
+    queries, settings.SLOW_QUERY_SAMPLE_RATE, is logged and the query and
+    parameters are cut to settings.SLOW_QUERY_MAX_SIZE characters.
+    """
+
+    @staticmethod
+    def enabled():
+        return settings.SLOW_QUERY_THRESHOLD is not None or settings.SLOW_QUERY_TOOK_THRESHOLD is not None
+
+    @staticmethod
+    def is_slow(wall_time, took):
+        """
+        :param wall_time: seconds waiting for the response
+        :type wall_time: float
+
+        :param took: seconds elasticsearch took to run the query, if known
+        :type took: float
+
+        :rtype: bool
+        """
+        threshold = settings.SLOW_QUERY_THRESHOLD
+        took_threshold = settings.SLOW_QUERY_TOOK_THRESHOLD
+
+        if threshold is not None and wall_time >= threshold:
+            return True
+
+        return took_threshold is not None and took is not None and took >= took_threshold
+
+    @staticmethod
+    def truncate(value):
+        """
+        Serialise the value, cut to settings.SLOW_QUERY_MAX_SIZE characters
+
+        :return: JSON string and whether it was cut
+        :rtype: tuple(str, bool)
+        """
+        text = json.dumps(value, default=str, separators=(',', ':'))
+        max_size = settings.SLOW_QUERY_MAX_SIZE
+
+        if max_size and len(text) > max_size:
+            return text[:max_size], True
+
+        return text, False
+
+    @staticmethod
+    def get_hits(response):
+        """
+        :return: total hits for a search or the count, if in the response
+        :rtype: int
+        """
+        if 'count' in response:
+            return response['count']
+
+        total = response.get('hits', {}).get('total')
+
+        if isinstance(total, dict):
+            return total.get('value')
+
+        return total
+
+    def record(self, operation, index, query, response, wall_time):
+        """
+        Log the request if it was slow
+
+        :param operation: elasticsearch API called
+        :type operation: str
+
+        :param index: index searched
+        :type index: str
+
+        :param query: query body
+        :type query: dict
+
+        :param response: elasticsearch response
+        :param wall_time: seconds waiting for the response
+        :type wall_time: float
+        """
+        body = getattr(response, 'body', response)
+        if not isinstance(body, dict):
+            body = {}
+
+        took = body.get('took')
+        took = took / 1000 if took is not None else None
+
+        if not self.is_slow(wall_time, took):
+            return
+
+        if random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+            return
+
+        timer = REQUEST_TIMER.get()
+        params = {}
+        handler = None
+
+        if timer is not None:
+            params = timer.params
+            handler = timer.labels.get('handler') or None
+
+        query_text, query_truncated = self.truncate(query)
+        params_text, params_truncated = self.truncate(params)
+
+        entry = {
+            'operation': operation,
+            'index': index,
+            'wall_time_ms': round(wall_time * 1000, 1),
+            'took_ms': body.get('took'),
+            'hits': self.get_hits(body),
+            'handler': handler,
+            'params': params if not params_truncated else params_text,
+            'query': query if not query_truncated else query_text,
+            'truncated': query_truncated or params_truncated,
+        }
+
+        logger.warning(json.dumps(entry, default=str), extra={'slow_query': entry})
+
+    def call(self, operation, index, query, request):
+        """
+        Make the request and log it if it was slow
+
+        :param operation: elasticsearch API called
+        :param index: index searched
+        :param query: query body
+        :param request: function which makes the request
+
+        :return: elasticsearch response
+        """
+        if not self.enabled():
+            return request()
+
+        start = time.perf_counter()
+        response = request()
+        self.record(operation, index, query, response, time.perf_counter() - start)
+
+        return response
+
+
+SLOW_QUERY_LOG = SlowQueryLog()
+
+
+class SlowQueryClient:
+    """
+    Wraps the elasticsearch client to log slow searches and counts. Other
+    calls are passed through.
+
+    :param client: elasticsearch client
+    :type client: elasticsearch.Elasticsearch
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def search(self, index=None, body=None, **kwargs):
+        return SLOW_QUERY_LOG.call('search', index, body, functools.partial(self.client.search, index=index, body=body, **kwargs))
+
+    def count(self, index=None, body=None, **kwargs):
+        return SLOW_QUERY_LOG.call('count', index, body, functools.partial(self.client.count, index=index, body=body, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class SlowQueryConnection:
+    """
+    Wraps the elasticsearch connection to log slow searches and counts.
+    Other calls are passed through.
+
+    :param connection: elasticsearch connection
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @property
+    def es(self):
+        client = self.connection.es
+
+        if client is None:
+            return None
+
+        return SlowQueryClient(client)
+
+    def search(self, query):
+        return SLOW_QUERY_LOG.call('search', self.connection.index, query, functools.partial(self.connection.search, query))
+
+    def search_collections(self, query):
+        return SLOW_QUERY_LOG.call('search', self.connection.collection_index, query, functools.partial(self.connection.search_collections, query))
+
+    def count(self, query):
+        return SLOW_QUERY_LOG.call('count', self.connection.index, query, functools.partial(self.connection.count, query))
+
+    def count_collections(self, query):
+        return SLOW_QUERY_LOG.call('count', self.connection.collection_index, query, functools.partial(self.connection.count_collections, query))
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
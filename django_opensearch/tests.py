@@ -1,8 +1,65 @@
 from django.test import TestCase
 from django.test import Client
 from django.test import override_settings
+from django.http import QueryDict
+from django.test import RequestFactory
+from django.http import HttpResponse
 from django.conf import settings
+from django.core.management import call_command
+from django.core.exceptions import BadRequest
 import xmltodict
+import json
+from io import StringIO
+from urllib.parse import urlencode
+from types import SimpleNamespace
+import time
+from datetime import date
+import os
+import tempfile
+
+import requests
+
+from events.models import Event
+from django_opensearch.cache import (DESCRIPTION_CACHE, SizeLimitedLocMemCache, description_cache_key,
+                                     description_cache_timeout, get_generation, invalidate)
+from django_opensearch.conditional import add_validators, content_etag, get_event_marker, not_modified, weak_etag
+from django_opensearch.metrics import MetricsRegistry, REQUEST_TIMER, RequestTimer, phase
+from django_opensearch.slow_query import SLOW_QUERY_LOG, SlowQueryConnection
+from django_opensearch.benchmarks import request_factory
+from django_opensearch.benchmarks.load import Result, parse_line, percentile, summarise
+from django_opensearch.benchmarks.replay import ReplayConnection, connection, load_fixtures
+from django_opensearch.opensearch.backends.elasticsearch.facets.base import ElasticsearchFacetSet
+from django_opensearch.opensearch.backends.elasticsearch.facets.cci import BACKUP_MISSES, CCIFacets
+from django_opensearch.opensearch.backends.elasticsearch.paging import PointInTimePager
+from django_opensearch.opensearch.renderers.export import CSVWriter, NDJSONWriter
+from django_opensearch.opensearch.opensearch import Collection, OpensearchDescription
+from django_opensearch.opensearch.utils.facet_value_store import FacetValueStore
+from django_opensearch.opensearch.utils.cursor import InvalidCursor, decode_cursor, encode_cursor
+from django_opensearch.opensearch.backends.elasticsearch.resolver import CollectionInfo, CollectionPathResolver
+from django_opensearch.opensearch.utils.data_bridge import DataBridgeClient
+from django_opensearch.opensearch.utils.ttl_cache import MISSING
+
+
+class StubElasticsearch:
+    """
+    Elasticsearch client which returns canned responses, or the result of
+    calling them with the request arguments, and records the calls
+    """
+
+    def __init__(self, **responses):
+        self.responses = responses
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name not in self.responses:
+            raise AttributeError(name)
+
+        def call(**kwargs):
+            self.calls.append((name, kwargs))
+            response = self.responses[name]
+            return response(**kwargs) if callable(response) else response
+
+        return call
 
 
 # Create your tests here.
@@ -22,6 +79,13 @@ class OpensearchTestCase(TestCase):
 
         super().setUpClass()
 
+    @staticmethod
+    def get_json(response):
+        """
+        Read the body of a streamed JSON response
+        """
+        return json.loads(b''.join(response.streaming_content))
+
     @classmethod
     def get_url(cls, base, **kwargs):
         qs = ''
@@ -47,7 +111,7 @@ class PageSizeTest(OpensearchTestCase):
             )
         )
 
-        response_json = response.json()
+        response_json = self.get_json(response)
         self.assertEqual(len(response_json['features']), 40)
 
 
@@ -92,7 +156,7 @@ class PaginationTestCase(OpensearchTestCase):
             )
         )
 
-        results = response.json()
+        results = cls.get_json(response)
 
         cls.pages = {}
 
@@ -109,7 +173,7 @@ class PaginationTestCase(OpensearchTestCase):
             )
         )
 
-        features = results.json()['features']
+        features = self.get_json(results)['features']
         self.assertEqual(len(features), 10)
 
         return self.get_page_ids(features)
@@ -234,7 +298,7 @@ class DateRangeTestCase(OpensearchTestCase):
 
         self.assertEqual(results.status_code, 200)
 
-        results = results.json()
+        results = self.get_json(results)
 
         self.assertGreater(results['totalResults'], 10)
 
@@ -249,7 +313,7 @@ class DateRangeTestCase(OpensearchTestCase):
 
         self.assertEqual(results.status_code, 200)
 
-        results = results.json()
+        results = self.get_json(results)
 
         self.assertGreater(results['totalResults'], 10)
 
@@ -290,7 +354,7 @@ class JSONResponseTestCase(OpensearchTestCase):
         )
 
         self.assertEqual(results.status_code, 200)
-        results = results.json()
+        results = self.get_json(results)
 
         feature_id = results['features'][0]['properties']['identifier']
 
@@ -302,7 +366,932 @@ class JSONResponseTestCase(OpensearchTestCase):
             )
         )
         self.assertEqual(results.status_code, 200)
-        results = results.json()
+        results = self.get_json(results)
         self.assertEqual(results['subtitle'], 'Showing 1 - 1 of 1')
 
 
+
+
+class CursorTestCase(OpensearchTestCase):
+
+    def get_features(self, **kwargs):
+        results = self.client.get(
+            self.get_url(
+                self.REQUEST_BASE,
+                parentIdentifier='aa09603e91b44f3cb1573c9dd415e8a8',
+                **kwargs
+            )
+        )
+        self.assertEqual(results.status_code, 200)
+
+        return self.get_json(results)
+
+    def follow(self, link):
+        results = self.client.get(link['href'])
+        self.assertEqual(results.status_code, 200)
+
+        return self.get_json(results)
+
+    def test_next_and_previous(self):
+        expected = self.get_features(maximumRecords=20)['features']
+
+        page_1 = self.get_features(maximumRecords=10)
+        page_2 = self.follow(page_1['links']['next'][0])
+
+        self.assertListEqual(page_2['features'], expected[10:])
+
+        previous = self.follow(page_2['links']['previous'][0])
+
+        self.assertListEqual(previous['features'], expected[:10])
+
+    def test_cursor_for_other_search(self):
+        page_1 = self.get_features()
+        next_link = page_1['links']['next'][0]['href']
+
+        results = self.client.get(f'{next_link}&query=water')
+
+        self.assertEqual(results.status_code, 400)
+
+    def test_modified_cursor(self):
+        results = self.client.get(
+            self.get_url(
+                self.REQUEST_BASE,
+                parentIdentifier='aa09603e91b44f3cb1573c9dd415e8a8',
+                searchAfter='a,b'
+            )
+        )
+
+        self.assertEqual(results.status_code, 400)
+
+
+class CursorTokenTestCase(TestCase):
+    PARAMS = QueryDict('parentIdentifier=cci&query=sst&maximumRecords=10')
+
+    def test_round_trip(self):
+        token = encode_cursor([1234, 'file.nc'], self.PARAMS)
+
+        self.assertEqual(decode_cursor(token, self.PARAMS), ([1234, 'file.nc'], False))
+
+        # Paging parameters do not change the result set
+        params = QueryDict('query=sst&parentIdentifier=cci&maximumRecords=50&countMode=bounded')
+        self.assertEqual(decode_cursor(token, params).search_after, [1234, 'file.nc'])
+
+    def test_reverse(self):
+        token = encode_cursor([1234, 'file.nc'], self.PARAMS, reverse=True)
+
+        self.assertTrue(decode_cursor(token, self.PARAMS).reverse)
+
+    def test_other_search(self):
+        token = encode_cursor([1234], self.PARAMS)
+
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(token, QueryDict('parentIdentifier=cci&query=ice'))
+
+    def test_tampered(self):
+        token = encode_cursor([1234], self.PARAMS)
+        value, signature = token.rsplit(':', 1)
+
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(f'{value}:{signature[::-1]}', self.PARAMS)
+
+        with connection(ReplayConnection(load_fixtures(), files='cci')):
+            response = Client().get('/opensearch/request', {
+                'parentIdentifier': 'esacci-sst-l4-v2.1',
+                'httpAccept': 'application/geo+json',
+                'searchAfter': f'{value}:{signature[::-1]}'
+            })
+
+        self.assertEqual(response.status_code, 400)
+
+
+class CursorLinkTestCase(TestCase):
+    PARAMS = {'parentIdentifier': 'esacci-sst-l4-v2.1', 'httpAccept': 'application/geo+json', 'maximumRecords': 10}
+
+    def setUp(self):
+        invalidate()
+
+    def get(self, params):
+        with connection(ReplayConnection(load_fixtures(), files='cci')):
+            response = Client().get('/opensearch/request', params)
+
+        self.assertEqual(response.status_code, 200)
+
+        return OpensearchTestCase.get_json(response)
+
+    def follow(self, results, link):
+        with connection(ReplayConnection(load_fixtures(), files='cci')):
+            response = Client().get(results['links'][link][0]['href'])
+
+        self.assertEqual(response.status_code, 200)
+
+        return OpensearchTestCase.get_json(response)
+
+    @staticmethod
+    def ids(results):
+        return [feature['id'] for feature in results['features']]
+
+    def test_back_to_first_page(self):
+        page_1 = self.get(self.PARAMS)
+        page_2 = self.follow(page_1, 'next')
+
+        self.assertIn('previous', page_2['links'])
+
+        previous = self.follow(page_2, 'previous')
+
+        self.assertEqual(self.ids(previous), self.ids(page_1))
+        self.assertNotIn('previous', previous['links'])
+        self.assertEqual(self.ids(self.follow(previous, 'next')), self.ids(page_2))
+
+    def test_empty_reverse_page(self):
+        first = self.get(self.PARAMS)['features'][0]['id']
+        hit = load_fixtures()['files']['cci']['hits'][0]['_source']['info']
+        cursor = encode_cursor([hit['directory'], f'{hit["name"]}-0'], QueryDict(urlencode(self.PARAMS)), reverse=True)
+
+        results = self.get({**self.PARAMS, 'searchAfter': cursor})
+
+        self.assertEqual(results['features'], [])
+        self.assertNotIn('previous', results['links'])
+        self.assertEqual(self.follow(results, 'next')['features'][0]['id'], first)
+
+
+class MetricsTestCase(TestCase):
+
+    def test_phase(self):
+        timer = RequestTimer()
+        token = REQUEST_TIMER.set(timer)
+
+        try:
+            with phase('elasticsearch'):
+                pass
+
+            with phase('elasticsearch'):
+                pass
+        finally:
+            REQUEST_TIMER.reset(token)
+
+        self.assertEqual(timer.phases['elasticsearch'][1], 2)
+        self.assertTrue(timer.server_timing().startswith('elasticsearch;dur='))
+
+    @override_settings(METRICS_ENABLED=True, METRICS_ALLOWED_IPS=('127.0.0.1', '10.0.0.0/8'))
+    def test_endpoint_access(self):
+        client = Client(raise_request_exception=False)
+
+        self.assertEqual(client.get('/opensearch/metrics', REMOTE_ADDR='127.0.0.1').status_code, 200)
+        self.assertEqual(client.get('/opensearch/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(client.get('/opensearch/metrics', REMOTE_ADDR='192.0.2.1').status_code, 403)
+
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(client.get('/opensearch/metrics', REMOTE_ADDR='127.0.0.1').status_code, 404)
+
+    def test_render(self):
+        registry = MetricsRegistry((0.1, 1))
+        registry.observe('opensearch_request_duration_seconds', 0.5, endpoint='request', handler='CCIFacets')
+        registry.increment('opensearch_requests_total', endpoint='request', handler='CCIFacets', status='200')
+
+        output = registry.render().splitlines()
+
+        self.assertIn('opensearch_request_duration_seconds_bucket{endpoint="request",handler="CCIFacets",le="0.1"} 0', output)
+        self.assertIn('opensearch_request_duration_seconds_bucket{endpoint="request",handler="CCIFacets",le="1"} 1', output)
+        self.assertIn('opensearch_request_duration_seconds_count{endpoint="request",handler="CCIFacets"} 1', output)
+        self.assertIn('opensearch_requests_total{endpoint="request",handler="CCIFacets",status="200"} 1', output)
+
+
+class SlowQueryTestCase(TestCase):
+
+    def test_connection_wrapped(self):
+        self.assertIsInstance(settings.ES_CONNECTION, SlowQueryConnection)
+        self.assertNotIsInstance(settings.ES_CONNECTION.connection, SlowQueryConnection)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=1, SLOW_QUERY_TOOK_THRESHOLD=None, SLOW_QUERY_MAX_SIZE=20)
+    def test_record(self):
+        query = {'query': {'term': {'projects.opensearch.datasetId': 'esacci-sst-l4-v2.1'}}}
+        response = {'took': 1500, 'hits': {'total': {'value': 12, 'relation': 'eq'}}}
+
+        with self.assertNoLogs('django_opensearch.slow_query'):
+            SLOW_QUERY_LOG.record('search', 'files', query, response, 0.5)
+
+        with self.assertLogs('django_opensearch.slow_query') as logs:
+            SLOW_QUERY_LOG.record('search', 'files', query, response, 2)
+
+        entry = json.loads(logs.records[0].getMessage())
+
+        self.assertEqual(entry['took_ms'], 1500)
+        self.assertEqual(entry['hits'], 12)
+        self.assertTrue(entry['truncated'])
+        self.assertEqual(len(entry['query']), 20)
+
+
+class SizeLimitedLocMemCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = SizeLimitedLocMemCache('test-size-limited', {'OPTIONS': {'MAX_SIZE': 1000}})
+        self.cache.clear()
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 'a' * 400)
+        self.cache.set('b', 'b' * 400)
+        self.cache.get('a')
+        self.cache.set('c', 'c' * 400)
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertLessEqual(self.cache.size, 1000)
+
+    def test_too_large(self):
+        self.cache.set('a', 'a' * 2000)
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.size, 0)
+
+
+class ConditionalTestCase(TestCase):
+
+    def setUp(self):
+        # Drop event dates cached by other tests
+        invalidate()
+
+    @override_settings(CACHE_CONTROL={'search': {'public': True, 'max_age': 60}})
+    def test_not_modified(self):
+        etag = content_etag(b'<feed/>')
+        last_modified = 1578009600
+
+        request = RequestFactory().get('/opensearch/request')
+        response = add_validators(not_modified(request, etag, last_modified) or HttpResponse(b'<feed/>'), 'search', etag, last_modified)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['Last-Modified'], 'Fri, 03 Jan 2020 00:00:00 GMT')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+        request = RequestFactory().get('/opensearch/request', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified(request, etag, last_modified).status_code, 304)
+
+        request = RequestFactory().get('/opensearch/request', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified(request, etag, last_modified).status_code, 304)
+
+        request = RequestFactory().get('/opensearch/request', HTTP_IF_NONE_MATCH=content_etag(b'<rss/>'))
+        self.assertIsNone(not_modified(request, etag, last_modified))
+
+
+    def search(self, parent_identifier='esacci-sst-l4-v2.1', **headers):
+        with connection(ReplayConnection(load_fixtures(), files='cci')):
+            return Client().get('/opensearch/request', {
+                'parentIdentifier': parent_identifier,
+                'httpAccept': 'application/geo+json',
+            }, **headers)
+
+    def test_search(self):
+        response = self.search()
+        results = OpensearchTestCase.get_json(response)
+
+        # Files are not covered by the events
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertNotIn('page_bounds', results)
+        self.assertNotIn('collection_search', results)
+
+        self.assertEqual(self.search(HTTP_IF_NONE_MATCH=weak_etag('page')).status_code, 200)
+
+    def test_event_marker(self):
+        response = self.search('cci')
+        etag = response['ETag']
+
+        self.assertEqual(self.search('cci', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Event.objects.create(collection_id='esacci-sst-l4-v2.1', collection_title='SST', action='updated', datetime=date.today())
+
+        self.assertEqual(get_event_marker(), Event.objects.latest('id').id)
+        self.assertNotEqual(self.search('cci')['ETag'], etag)
+
+    def test_collection_search(self):
+        Event.objects.create(collection_id='esacci-sst-l4-v2.1', collection_title='SST', action='added', datetime=date(2020, 1, 2))
+
+        response = self.search('cci')
+
+        self.assertEqual(response['Last-Modified'], 'Fri, 03 Jan 2020 00:00:00 GMT')
+        self.assertEqual(self.search('cci', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+
+@override_settings(BACKUP_CHECK_INDEX='opensearch-file-backup')
+class BackupLookupTestCase(TestCase):
+
+    def setUp(self):
+        BACKUP_MISSES.clear()
+
+    def test_batched_lookup(self):
+        client = StubElasticsearch(mget={'docs': [
+            {'_id': '/a.nc', 'found': True, '_source': {'use_backup': True}},
+            {'_id': '/b.nc', 'found': False},
+            {'_id': '/c.nc', 'error': {'type': 'timeout'}},
+        ]})
+
+        with override_settings(ES_CONNECTION=SimpleNamespace(es=client)):
+            backups = CCIFacets.get_backups(['/a.nc', '/b.nc', '/c.nc', '/a.nc'])
+
+            self.assertEqual(client.calls, [('mget', {'index': 'opensearch-file-backup', 'ids': ['/a.nc', '/b.nc', '/c.nc']})])
+            self.assertTrue(backups['/a.nc']['found'])
+            self.assertFalse(backups['/b.nc']['found'])
+            self.assertFalse(backups['/c.nc']['found'])
+
+            # Only the genuine miss is remembered
+            CCIFacets.get_backups(['/b.nc', '/c.nc'])
+            self.assertEqual(client.calls[-1][1]['ids'], ['/c.nc'])
+
+            CCIFacets.get_backups(['/b.nc'])
+            self.assertEqual(len(client.calls), 2)
+
+    def test_no_client(self):
+        with override_settings(ES_CONNECTION=SimpleNamespace(es=None)):
+            with self.assertLogs('django_opensearch.opensearch.backends.elasticsearch.facets.cci'):
+                backups = CCIFacets.get_backups(['/a.nc'])
+
+        self.assertEqual(backups, {'/a.nc': {'found': False}})
+        self.assertNotIn('/a.nc', BACKUP_MISSES)
+
+
+class StubSession:
+    """
+    HTTP session answering data bridge requests by dataset uid
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        uid = url.split('/uuid/')[1].split('?')[0]
+        self.requests.append(uid)
+        time.sleep(self.delay)
+
+        if uid == 'slow':
+            raise requests.Timeout('read timed out')
+
+        if uid == 'missing':
+            return SimpleNamespace(status_code=404)
+
+        return SimpleNamespace(status_code=200, json=lambda: [{'relationships': [
+            {'related_dataset_provider': 'ceda', 'uid': uid}
+        ]}])
+
+
+@override_settings(PROVIDERS_MAP={'ceda': 'CEDA'})
+class DataBridgeTestCase(TestCase):
+
+    def get_client(self, session, **kwargs):
+        client = DataBridgeClient(base_url='http://bridge', **kwargs)
+        client._session = session
+        return client
+
+    def test_batch_larger_than_pool(self):
+        # Takes longer than the timeout overall, but not per request
+        uids = [f'uid-{i}' for i in range(6)]
+        client = self.get_client(StubSession(delay=0.06), timeout=0.1, max_workers=2)
+
+        results = client.get_relationships_many(uids)
+
+        self.assertEqual(set(results), set(uids))
+        self.assertEqual(results['uid-0'], [{'related_dataset_provider': 'CEDA', 'uid': 'uid-0'}])
+
+    def test_negative_cache(self):
+        session = StubSession()
+        client = self.get_client(session, timeout=1, max_workers=2)
+
+        results = client.get_relationships_many(['missing', 'slow', 'found', None])
+
+        self.assertEqual(results, {'missing': None, 'slow': None, 'found': results['found']})
+
+        # Failures, including timeouts, are not retried straight away
+        client.get_relationships_many(['missing', 'slow', 'found'])
+        self.assertEqual(sorted(session.requests), ['found', 'missing', 'slow'])
+
+    def test_deadline(self):
+        session = StubSession(delay=0.3)
+        client = self.get_client(session, timeout=1, max_workers=1, deadline=0.1)
+
+        start = time.perf_counter()
+        with self.assertLogs('django_opensearch.opensearch.utils.data_bridge'):
+            results = client.get_relationships_many(['first', 'second'])
+
+        self.assertLess(time.perf_counter() - start, 0.25)
+        self.assertEqual(results, {'first': None, 'second': None})
+
+        # The queued lookup is cancelled and neither is cached as a failure
+        self.assertEqual(session.requests, ['first'])
+        self.assertIs(client.cache.get('second', MISSING), MISSING)
+        self.assertIs(client.cache.get('first', MISSING), MISSING)
+
+        # The running lookup is cached when it finishes
+        time.sleep(0.3)
+        self.assertEqual(client.cache.get('first'), [{'related_dataset_provider': 'CEDA', 'uid': 'first'}])
+
+
+@override_settings(DESCRIPTION_CACHE_TIMEOUT=600, DESCRIPTION_CACHE_TOP_LEVEL_TIMEOUT=3600)
+class DescriptionCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'example.com'])
+    def test_cache_key(self):
+        key = description_cache_key(self.factory.get('/opensearch/description.xml', {'parentIdentifier': 'a', 'drsId': 'b'}))
+
+        # Parameter order does not matter, the host does
+        self.assertEqual(key, description_cache_key(self.factory.get('/opensearch/description.xml?drsId=b&parentIdentifier=a')))
+        self.assertNotEqual(key, description_cache_key(self.factory.get('/opensearch/description.xml', {'parentIdentifier': 'a'})))
+        self.assertNotEqual(key, description_cache_key(self.factory.get('/opensearch/description.xml', {'parentIdentifier': 'a', 'drsId': 'b'}, HTTP_HOST='example.com')))
+
+    def test_timeout(self):
+        self.assertEqual(description_cache_timeout(self.factory.get('/opensearch/description.xml', {'parentIdentifier': 'a'})), 600)
+        self.assertEqual(description_cache_timeout(self.factory.get('/opensearch/description.xml')), 3600)
+
+    def test_invalidate(self):
+        request = self.factory.get('/opensearch/description.xml')
+        key = description_cache_key(request)
+        DESCRIPTION_CACHE.set(key, '<OpenSearchDescription/>', 60)
+        generation = get_generation()
+
+        self.assertEqual(DESCRIPTION_CACHE.get(key), '<OpenSearchDescription/>')
+
+        invalidate()
+
+        self.assertNotEqual(get_generation(), generation)
+        self.assertIsNone(DESCRIPTION_CACHE.get(description_cache_key(request)))
+
+    def test_generation_not_culled(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        caches = {
+            'responses': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(directory.name, 'responses'),
+                'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 1},
+            },
+            'generation': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(directory.name, 'generation'),
+            },
+        }
+
+        with override_settings(CACHES=caches, OPENSEARCH_CACHE='responses', OPENSEARCH_GENERATION_CACHE='generation'):
+            generation = get_generation()
+
+            for i in range(10):
+                DESCRIPTION_CACHE.set(DESCRIPTION_CACHE.make_key(i), '<OpenSearchDescription/>', 60)
+
+            self.assertEqual(get_generation(), generation)
+
+    @override_settings(OPENSEARCH_GENERATION_CACHE='default')
+    def test_command_warns_for_process_local_cache(self):
+        generation = get_generation()
+        stderr = StringIO()
+
+        call_command('invalidate_opensearch_cache', stdout=StringIO(), stderr=stderr)
+
+        self.assertIn('local to each process', stderr.getvalue())
+        self.assertEqual(get_generation(), generation)
+
+
+@override_settings(COLLECTION_PATH_PRELOAD=True, COLLECTION_PATH_REFRESH_INTERVAL=0)
+class CollectionPathResolverTestCase(TestCase):
+
+    def setUp(self):
+        self.collections = [{'_source': {'collection_id': 'a', 'path': '/neodc/a'}}]
+        self.queries = []
+        self.resolver = CollectionPathResolver(maxsize=100, ttl=3600, negative_ttl=60)
+
+    def search_collections(self, query):
+        self.queries.append(query)
+
+        return {'hits': {'hits': self.collections, 'total': {'value': len(self.collections)}}}
+
+    def test_preload_on_first_lookup(self):
+        with override_settings(ES_CONNECTION=SimpleNamespace(search_collections=self.search_collections)):
+            self.assertEqual(self.queries, [])
+            self.assertEqual(self.resolver.lookup('a'), CollectionInfo('/neodc/a', False))
+            self.assertEqual(self.resolver.resolve('a'), '/neodc/a')
+
+        self.assertEqual(len(self.queries), 1)
+        self.assertIn('match_all', self.queries[0]['query'])
+
+    def test_invalidate(self):
+        with override_settings(ES_CONNECTION=SimpleNamespace(search_collections=self.search_collections)):
+            self.resolver.lookup('a')
+            self.collections = [{'_source': {'collection_id': 'b', 'path': '/neodc/b'}}]
+
+            self.assertEqual(self.resolver.resolve('a'), '/neodc/a')
+
+            invalidate()
+
+            self.assertEqual(self.resolver.resolve('b'), '/neodc/b')
+            self.assertEqual(len(self.queries), 2)
+
+    @override_settings(COLLECTION_PATH_REFRESH_INTERVAL=60)
+    def test_refresh_interval(self):
+        with override_settings(ES_CONNECTION=SimpleNamespace(search_collections=self.search_collections)):
+            self.resolver.lookup('a')
+            generation = self.resolver.generation
+
+            invalidate()
+
+            # The generation is not checked again until the interval has passed
+            self.assertEqual(self.resolver.resolve('a'), '/neodc/a')
+            self.assertEqual(self.resolver.generation, generation)
+            self.assertEqual(len(self.queries), 1)
+
+            self.resolver.checked -= 60
+            self.resolver.lookup('a')
+
+            self.assertNotEqual(self.resolver.generation, generation)
+            self.assertEqual(len(self.queries), 2)
+
+    @override_settings(COLLECTION_PATH_PRELOAD=False)
+    def test_new_children_after_invalidate(self):
+        def search_collections(query):
+            self.queries.append(query)
+            children = [hit for hit in self.collections if hit['_source'].get('parent_identifier') == 'a']
+
+            return {
+                'hits': {'hits': self.collections[:1]},
+                'aggregations': {'children': {'doc_count': len(children)}}
+            }
+
+        with override_settings(ES_CONNECTION=SimpleNamespace(search_collections=search_collections)):
+            self.assertFalse(self.resolver.lookup('a').has_children)
+
+            self.collections.append({'_source': {'collection_id': 'b', 'parent_identifier': 'a', 'path': '/neodc/a/b'}})
+            self.assertFalse(self.resolver.lookup('a').has_children)
+
+            invalidate()
+
+            self.assertTrue(self.resolver.lookup('a').has_children)
+            self.assertEqual(len(self.queries), 2)
+
+
+@override_settings(TOTAL_HITS_MODE='exact', TOTAL_HITS_BOUND=100, TOTAL_HITS_CACHE_TIMEOUT=60, SEARCH_RESULT_CACHE_TIMEOUT=0)
+class CountModeTestCase(TestCase):
+
+    def setUp(self):
+        self.facet_set = ElasticsearchFacetSet()
+        invalidate()
+
+    def get_query(self, count_mode):
+        query = {'query': {'bool': {'filter': [{'term': {'info.format': 'NetCDF'}}]}}, 'size': 10}
+        return query, self.facet_set.set_total_hits_tracking(query, {'countMode': count_mode})
+
+    def test_exact(self):
+        query, (cache_key, total_hits) = self.get_query('exact')
+
+        self.assertIs(query['track_total_hits'], True)
+        self.assertEqual(self.facet_set.get_total_hits({'hits': {'total': {'value': 12784, 'relation': 'eq'}}}, cache_key, total_hits), (12784, 'eq'))
+
+    def test_bounded(self):
+        query, (cache_key, total_hits) = self.get_query('bounded')
+
+        self.assertEqual(query['track_total_hits'], 100)
+        self.assertEqual(self.facet_set.get_total_hits({'hits': {'total': {'value': 100, 'relation': 'gte'}}}, cache_key, total_hits), (100, 'gte'))
+
+    def test_cached(self):
+        query, (cache_key, total_hits) = self.get_query('cached')
+
+        self.assertIs(query['track_total_hits'], True)
+        self.facet_set.get_total_hits({'hits': {'total': {'value': 12784, 'relation': 'eq'}}}, cache_key, total_hits)
+
+        # The total is not counted again
+        query, (cache_key, total_hits) = self.get_query('cached')
+
+        self.assertIs(query['track_total_hits'], False)
+        self.assertEqual(self.facet_set.get_total_hits({'hits': {}}, cache_key, total_hits), (12784, 'eq'))
+
+    def test_lower_bound_response(self):
+        with connection(ReplayConnection(load_fixtures(), files='cci')):
+            response = Client().get('/opensearch/request', {
+                'parentIdentifier': 'esacci-sst-l4-v2.1',
+                'httpAccept': 'application/geo+json',
+                'countMode': 'bounded',
+                'maximumRecords': 10,
+                'startPage': 2
+            })
+            results = OpensearchTestCase.get_json(response)
+
+        self.assertEqual(results['totalResults'], 100)
+        self.assertEqual(results['totalResultsRelation'], 'gte')
+        self.assertIn('of at least 100', results['subtitle'])
+        self.assertIn('next', results['links'])
+        self.assertNotIn('last', results['links'])
+
+
+class StreamErrorTestCase(TestCase):
+
+    def setUp(self):
+        # Drop search results cached by other tests
+        invalidate()
+
+    def test_entry_error(self):
+        # Hits without the file information cannot be built into entries
+        fixtures = load_fixtures()
+        for hit in fixtures['files']['cci']['hits']:
+            hit['_source'].pop('info', None)
+
+        with connection(ReplayConnection(fixtures, files='cci')):
+            response = Client(raise_request_exception=False).get('/opensearch/request', {
+                'parentIdentifier': 'esacci-sst-l4-v2.1',
+                'httpAccept': 'application/geo+json',
+            })
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(response.streaming)
+
+
+class StubPointInTime(StubElasticsearch):
+    """
+    Elasticsearch client serving a sorted result set through points in time
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.opened = 0
+        super().__init__(
+            open_point_in_time=self.open,
+            close_point_in_time={'succeeded': True},
+            search=self.get_page
+        )
+
+    def open(self, index, keep_alive):
+        self.opened += 1
+        return {'id': f'pit-{self.opened}'}
+
+    def get_page(self, body, filter_path=None):
+        start = body['search_after'][0] + 1 if 'search_after' in body else 0
+        end = min(start + body.get('size', 10), self.total)
+
+        # The PIT adds a tiebreaker to the sort values
+        return {'pit_id': body['pit']['id'], 'hits': {'hits': [
+            {'_id': str(i), 'sort': [i, i]} for i in range(start, end)
+        ]}}
+
+    def searches(self):
+        return [kwargs['body'] for name, kwargs in self.calls if name == 'search']
+
+    def closed(self):
+        return [kwargs['id'] for name, kwargs in self.calls if name == 'close_point_in_time']
+
+
+@override_settings(OPENSEARCH_CACHE='default', RESULT_WINDOW=100, PIT_MAX_SEEK=1000)
+class PointInTimePagerTestCase(TestCase):
+    QUERY = {'query': {'match_all': {}}, 'sort': [{'id': 'asc'}], 'size': 10}
+
+    def setUp(self):
+        self.client = StubPointInTime(total=5000)
+        self.pager = PointInTimePager()
+        self.pager.cache.get_cache().clear()
+
+    def search(self, offset):
+        with override_settings(ES_CONNECTION=SimpleNamespace(es=self.client, index='files')):
+            return self.pager.search(dict(self.QUERY, **{'from': offset}), {'q': 'test'})
+
+    def ids(self, response):
+        return [int(hit['_id']) for hit in response['hits']['hits']]
+
+    def test_seek(self):
+        response = self.search(250)
+
+        self.assertEqual(self.ids(response), list(range(250, 260)))
+        self.assertEqual(response['hits']['hits'][0]['sort'], [250])
+
+        # Walked forward in batches of the result window
+        self.assertEqual([body['size'] for body in self.client.searches()], [100, 100, 50, 10])
+
+    def test_sequential_pages(self):
+        self.search(250)
+        calls = len(self.client.searches())
+
+        # The next page continues from the end of the previous one
+        self.assertEqual(self.ids(self.search(260)), list(range(260, 270)))
+        self.assertEqual(len(self.client.searches()), calls + 1)
+        self.assertEqual(self.client.searches()[-1]['search_after'], [259, 259])
+        self.assertEqual(self.client.opened, 1)
+
+    def test_seek_limit(self):
+        with self.assertRaises(BadRequest):
+            self.search(1500)
+
+        # Refused before a PIT is opened
+        self.assertEqual(self.client.calls, [])
+
+        # Reachable by seeking from a known position
+        self.search(900)
+        self.assertEqual(self.ids(self.search(1500)), list(range(1500, 1510)))
+
+    def test_past_end(self):
+        self.client.total = 150
+
+        response = self.search(200)
+
+        self.assertEqual(self.ids(response), [])
+        self.assertEqual(self.client.searches()[-1]['size'], 0)
+
+    def test_shared_pit(self):
+        # Two requests open a PIT for the same query at once
+        with override_settings(ES_CONNECTION=SimpleNamespace(es=self.client, index='files')):
+            cache_key = self.pager.cache.make_key('files', {'q': 'test'}, self.QUERY['sort'])
+            first, shared = PointInTimePager().share(cache_key, self.pager.open())
+            second, shared = self.pager.share(cache_key, self.pager.open())
+
+        # The PIT stored second is closed and the first used
+        self.assertTrue(shared)
+        self.assertEqual(second, first)
+        self.assertEqual(self.client.closed(), ['pit-2'])
+
+        self.search(250)
+
+        self.assertEqual(self.client.opened, 2)
+        self.assertTrue(all(body['pit']['id'] == 'pit-1' for body in self.client.searches()))
+
+    @override_settings(PIT_CACHE_TIMEOUT=0)
+    def test_unshared_pit_closed(self):
+        self.search(250)
+
+        self.assertEqual(self.client.closed(), ['pit-1'])
+
+    def test_scan(self):
+        self.client.total = 250
+
+        with override_settings(ES_CONNECTION=SimpleNamespace(es=self.client, index='files')):
+            batches = list(self.pager.scan(self.QUERY, batch_size=100))
+
+        self.assertEqual([len(batch) for batch in batches], [100, 100, 50])
+        self.assertEqual(self.client.closed(), ['pit-1'])
+
+    def test_abandoned_scan(self):
+        with override_settings(ES_CONNECTION=SimpleNamespace(es=self.client, index='files')):
+            scan = self.pager.scan(self.QUERY, batch_size=100)
+            next(scan)
+            scan.close()
+
+        self.assertEqual(self.client.closed(), ['pit-1'])
+
+
+class ExportWriterTestCase(TestCase):
+    ENTRIES = [
+        {
+            'id': 'http://localhost/a.nc',
+            'bbox': [-180, -90, 180, 90],
+            'properties': {
+                'identifier': 'a',
+                'title': 'a.nc',
+                'filesize': 100,
+                'links': {'related': [{'href': 'http://localhost/a.nc'}, {'href': 'http://localhost/a.nc.html'}]}
+            }
+        },
+        {'id': 'http://localhost/b.nc', 'properties': {'identifier': 'b', 'title': 'b, c.nc'}},
+    ]
+
+    def test_ndjson(self):
+        parts = list(NDJSONWriter(iter(self.ENTRIES)).stream())
+
+        # The header is sent on its own
+        self.assertEqual(parts[0], b'')
+
+        lines = b''.join(parts).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], ['http://localhost/a.nc', 'http://localhost/b.nc'])
+
+    def test_csv(self):
+        parts = list(CSVWriter(iter(self.ENTRIES)).stream())
+
+        self.assertEqual(parts[0], b'id,identifier,title,updated,filesize,date,bbox,related\r\n')
+
+        rows = b''.join(parts).decode('utf-8').splitlines()
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(rows[1].startswith('http://localhost/a.nc,a,a.nc,,100,,'))
+        self.assertTrue(rows[1].endswith('http://localhost/a.nc http://localhost/a.nc.html'))
+        self.assertEqual(rows[2], 'http://localhost/b.nc,b,"b, c.nc",,,,,')
+
+    def test_empty(self):
+        self.assertEqual(b''.join(NDJSONWriter(iter([])).stream()), b'')
+        self.assertEqual(b''.join(CSVWriter(iter([])).stream()).count(b'\n'), 1)
+
+
+class FacetValueStoreTestCase(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.path = os.path.join(directory.name, 'facet_values.json')
+        self.store = FacetValueStore(self.path)
+
+    def test_make_key(self):
+        self.assertEqual(self.store.make_key('Collection', {}), 'Collection:')
+        self.assertEqual(self.store.make_key('CCIFacets', {'parentIdentifier': 'cci', 'httpAccept': 'application/geo+json'}), 'CCIFacets:cci')
+
+        # Filtered searches are not stored
+        self.assertIsNone(self.store.make_key('CCIFacets', {'parentIdentifier': 'cci', 'query': 'sst'}))
+
+    def test_lookup(self):
+        self.assertIsNone(self.store.get('Collection:'))
+
+        self.store.write({'Collection:': {'ecv': {'values': [{'label': 'SST', 'value': 'SST'}]}}})
+        values = self.store.get('Collection:')
+        values['ecv']['values'][0]['label'] = 'SST (10)'
+
+        # Callers get their own copy
+        self.assertEqual(self.store.get('Collection:')['ecv']['values'][0]['label'], 'SST')
+
+        # Reloaded when the file changes
+        self.store.write({})
+        os.utime(self.path, (0, 0))
+        self.assertIsNone(self.store.get('Collection:'))
+
+    def test_unreadable(self):
+        with open(self.path, 'w') as writer:
+            writer.write('{')
+
+        with self.assertLogs('django_opensearch.opensearch.utils.facet_value_store'):
+            self.assertIsNone(self.store.get('Collection:'))
+
+    def test_build(self):
+        with connection(ReplayConnection(load_fixtures(), files='cmip5')):
+            call_command('build_facet_value_store', output=self.path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertIn('CMIP5Facets:cmip5-output1', self.store.load())
+        self.assertIn('ecv', self.store.get('Collection:'))
+
+        # Descriptions are served from the store
+        self.store.write({'Collection:': {'ecv': {'values': []}}})
+        os.utime(self.path, (0, 0))
+
+        with override_settings(FACET_VALUE_STORE_FILE=self.path):
+            facet_set = Collection(path=OpensearchDescription.DEFAULT_PATH)
+            facet_set.get_facet_values(QueryDict())
+
+        self.assertEqual(facet_set.facet_values, {'ecv': {'values': []}})
+
+
+class LoadReplayTestCase(TestCase):
+
+    def test_parse_line(self):
+        line = '10.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET /opensearch/request?parentIdentifier=cci&startPage=2 HTTP/1.1" 200 512 "-" "curl/8.0"'
+
+        self.assertEqual(parse_line(line), '/opensearch/request?parentIdentifier=cci&startPage=2')
+        self.assertIsNone(parse_line(line.replace('"GET', '"POST')))
+        self.assertEqual(parse_line('https://example.com/opensearch/description.xml\n'), '/opensearch/description.xml')
+        self.assertEqual(parse_line('/opensearch/files?parentIdentifier=cci'), '/opensearch/files?parentIdentifier=cci')
+        self.assertIsNone(parse_line('# comment'))
+        self.assertIsNone(parse_line('opensearch/request'))
+        self.assertIsNone(parse_line(''))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile([5], 95), 5)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summarise(self):
+        results = [
+            Result('request', 'cci', 200, 0.010),
+            Result('request', 'cci', 404, 0.020),
+            Result('request', 'cmip5', 500, 0.030),
+            Result('description', '', None, 0.040),
+        ]
+
+        rows = summarise(results, elapsed=2)
+
+        self.assertEqual([(row['group'], row['name']) for row in rows], [
+            ('all', ''),
+            ('endpoint', 'request'),
+            ('endpoint', 'description'),
+            ('parentIdentifier', 'cci'),
+            ('parentIdentifier', '-'),
+            ('parentIdentifier', 'cmip5'),
+        ])
+
+        overall = rows[0]
+        self.assertEqual(overall['requests'], 4)
+        self.assertEqual(overall['throughput'], 2)
+        self.assertEqual(overall['errors'], 0.5)
+        self.assertEqual(overall['client_errors'], 0.25)
+        self.assertAlmostEqual(overall['p50'], 20)
+        self.assertAlmostEqual(overall['p99'], 40)
+
+    @override_settings(OPENSEARCH_CACHE='default', SEARCH_RESULT_CACHE=None)
+    def test_in_process_caches(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        log = os.path.join(directory.name, 'access.log')
+        with open(log, 'w') as writer:
+            writer.write('/opensearch/description.xml\n/opensearch/request?parentIdentifier=esacci-sst-l4-v2.1&httpAccept=application/geo%2Bjson\n')
+
+        stdout = StringIO()
+        call_command('opensearch_replay', log, in_process=True, concurrency=1, stdout=stdout)
+
+        self.assertIn('all requests=2 throughput', stdout.getvalue())
+        self.assertIn('errors=0.0%', stdout.getvalue())
+
+        # Nothing built from the fixtures is left in the shared cache
+        description = request_factory().get('/opensearch/description.xml')
+        self.assertIsNone(DESCRIPTION_CACHE.get(description_cache_key(description)))
@@ -22,4 +22,6 @@ urlpatterns = [
     path('description.xml', views.Description.as_view()),
     path('request', views.Response.as_view()),
     path('files', views.Response.as_view()),
+    path('export', views.Export.as_view()),
+    path('metrics', views.Metrics.as_view()),
 ]
@@ -1,16 +1,51 @@
-from django.shortcuts import render
+import ipaddress
+import itertools
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
 from django.views import View
 from django.views.generic import TemplateView
-from django.views.generic.base import ContextMixin
-from django.http import HttpResponse
-from .opensearch.opensearch import OpensearchDescription, OpensearchResponse
-import jsonpickle
-
-jsonpickle.set_encoder_options('json', indent=4)
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from .opensearch.opensearch import OpensearchDescription, OpensearchResponse, Collection, Granule
+from .opensearch.renderers import AtomWriter, CSVWriter, GeoJSONWriter, NDJSONWriter
+from .cache import DESCRIPTION_CACHE, canonical_params, description_cache_key, description_cache_timeout
+from .conditional import add_validators, content_etag, get_event_marker, get_last_modified, not_modified, weak_etag
+from .metrics import METRICS, phase
 from django.conf import settings
 from django_opensearch import settings as opensearch_settings
 
 
+# The search, description and export views are asynchronous so that under
+# ASGI a request does not hold a worker while it waits on elasticsearch, and
+# the response is streamed through an async iterator. Under WSGI django runs
+# each request in its own event loop, which costs well under a millisecond
+# per thread switch, so the blocking work is grouped into as few calls as
+# possible. Blocking calls run in worker threads, except those using the
+# ORM, which stay on the thread django manages the connections for.
+
+
+def build_first_entry(entries):
+    """
+    Build the first entry before the response is started, so that an error
+    building the entries gives a server error rather than a truncated
+    document. An error in a later entry aborts the response part way
+    through.
+
+    :param entries: entries, built as they are read
+    :type entries: iterable
+
+    :return: entries
+    :rtype: iterator
+    """
+    entries = iter(entries)
+
+    for first in entries:
+        return itertools.chain((first,), entries)
+
+    return iter(())
+
+
 # Create your views here.
 
 class Index(View):
@@ -22,17 +57,169 @@ class Description(TemplateView):
     template_name = 'description.xml'
     content_type = 'application/xml'
 
+    async def get(self, request, *args, **kwargs):
+        content = await sync_to_async(self.get_content, thread_sensitive=False)(request, *args, **kwargs)
+
+        # The facet values come from the files, which are not covered by the
+        # events, so there is no Last-Modified date
+        etag = content_etag(content)
+        response = not_modified(request, etag) or HttpResponse(content, content_type=self.content_type)
+
+        return add_validators(response, 'description', etag)
+
+    def get_content(self, request, *args, **kwargs):
+        """
+        The description document from the cache, or rendered if it is not
+        cached
+
+        :return: description document
+        :rtype: bytes
+        :raises Http404: Collection not found
+        """
+        parent_identifier = request.GET.get('parentIdentifier')
+
+        if parent_identifier:
+            Collection.get_collection_info(parent_identifier)
+
+        content = self.get_cached(request)
+
+        if content is None:
+            content = self.render_description(request, *args, **kwargs).content
+
+        return content
+
+    @staticmethod
+    def get_cached(request):
+        """
+        :return: The cached description document or None
+        :rtype: bytes
+        """
+        with phase('cache'):
+            return DESCRIPTION_CACHE.get(description_cache_key(request))
+
+    def render_description(self, request, *args, **kwargs):
+        """
+        Render the description document and add it to the cache
+
+        :return: rendered response
+        """
+        response = super().get(request, *args, **kwargs)
+
+        with phase('render'):
+            response.render()
+
+        DESCRIPTION_CACHE.set(description_cache_key(request), response.content, description_cache_timeout(request))
+
+        return response
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        context["osd"] = OpensearchDescription(self.request)
+        with phase('description'):
+            context["osd"] = OpensearchDescription(self.request)
 
         return context
 
 
-class Response(ContextMixin, View):
-    def get(self, request):
-        context = self.get_context_data()
+class Response(View):
+    async def get(self, request):
+        response_type = self.get_response_type()
+
+        # Pick the writer
+        if response_type in opensearch_settings.RESPONSE_TYPES:
+
+            if response_type == 'application/atom+xml':
+                osr = await self.get_response(request)
+                return await self.conditional_stream(request, osr, response_type, AtomWriter(osr, request), 'application/xml')
+
+            if response_type == 'application/geo+json':
+                osr = await self.get_response(request)
+                return await self.conditional_stream(request, osr, response_type, GeoJSONWriter(osr), 'application/geo+json')
+
+        # Response type not found
+        return HttpResponse(f'Accept parameter: {response_type} cannot be provided by this service. Possible response types: {opensearch_settings.RESPONSE_TYPES}',status=406)
+
+    @staticmethod
+    async def get_response(request):
+        """
+        Run the search in a worker thread
+
+        :return: Opensearch response with lazily built features
+        :rtype: OpensearchResponse
+        """
+        return await sync_to_async(OpensearchResponse, thread_sensitive=False)(request, lazy=True)
+
+    @classmethod
+    async def conditional_stream(cls, request, osr, response_type, writer, content_type):
+        """
+        Stream the document unless the client already has this page. Only
+        collection searches have validators, as changes to the files are not
+        recorded as events and the entries also depend on the backup index.
+
+        :return: streaming or not modified response
+        """
+        if not osr.collection_search:
+            osr.features = await sync_to_async(build_first_entry, thread_sensitive=False)(osr.features)
+            return add_validators(cls.stream(request, writer, content_type), 'search')
+
+        # The events are read through the ORM
+        etag, last_modified = await sync_to_async(cls.get_validators, thread_sensitive=True)(request, osr, response_type)
+
+        response = not_modified(request, etag, last_modified)
+
+        if response is None:
+            osr.features = await sync_to_async(build_first_entry, thread_sensitive=False)(osr.features)
+            response = cls.stream(request, writer, content_type)
+
+        return add_validators(response, 'search', etag, last_modified)
+
+    @staticmethod
+    def get_validators(request, osr, response_type):
+        """
+        Validators for a collection search. The ETag is built from the
+        request, the total and the sort keys at either end of the page, so
+        the entries do not need to be built. The latest event is included as
+        it changes when collections are updated. The events of all
+        collections are used for the last modified date as those for child
+        collections are not recorded against the parent.
+
+        :return: ETag, last modified timestamp
+        :rtype: tuple(str, int)
+        """
+        etag = weak_etag(
+            get_event_marker(),
+            response_type,
+            request._current_scheme_host,
+            canonical_params(request.GET),
+            osr.totalResults,
+            osr.page_bounds
+        )
+
+        return etag, get_last_modified()
+
+    @staticmethod
+    def stream(request, writer, content_type):
+        """
+        Stream the document. ASGI servers need an asynchronous iterator to
+        stream the response rather than reading it all first.
+
+        :return: streaming response
+        :rtype: StreamingHttpResponse
+        """
+        if isinstance(request, ASGIRequest):
+            return StreamingHttpResponse(writer.astream(), content_type=content_type)
+
+        return StreamingHttpResponse(writer.stream(), content_type=content_type)
+
+    def get_response_type(self):
+        """
+        Get the requested response type from the httpAccept parameter or
+        the Accept header
+
+        :return: response type
+        :rtype: str
+        """
+        request = self.request
 
         # Get accept params
         accept_param = request.GET.get('httpAccept')
@@ -43,36 +230,97 @@ class Response(ContextMixin, View):
             accept_header = None
 
         if accept_param:
-            response_type = accept_param
+            return accept_param
 
-        else:
-            if not accept_header:
-                accept_header = opensearch_settings.DEFAULT_RESPONSE_TYPE
+        if not accept_header:
+            accept_header = opensearch_settings.DEFAULT_RESPONSE_TYPE
 
-            response_type = accept_header
+        return accept_header
 
-        # Pick the template
-        if response_type in opensearch_settings.RESPONSE_TYPES:
 
-            if response_type == 'application/atom+xml':
-                return render(request, 'response.xml', context, content_type='application/xml')
+class Export(View):
+    """
+    Stream every granule in a collection which matches the search, as
+    NDJSON or CSV. The order parameter can be set to doc to return the
+    granules in index order, which is cheaper than sorting them.
+    """
 
-            if response_type == 'application/geo+json':
-                return HttpResponse(jsonpickle.encode(context['osr'], unpicklable=False), content_type='application/geo+json')
+    writers = {
+        'ndjson': NDJSONWriter,
+        'csv': CSVWriter,
+    }
 
-        # Response type not found
-        return HttpResponse(f'Accept parameter: {response_type} cannot be provided by this service. Possible response types: {opensearch_settings.RESPONSE_TYPES}',status=406)
+    async def get(self, request):
+        writer_class = self.writers.get(request.GET.get('format', 'ndjson'))
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["osr"] = OpensearchResponse(self.request)
-        context["root_url"] = self.gen_item_root()
+        if writer_class is None:
+            raise BadRequest(f'format must be one of: {", ".join(self.writers)}')
 
-        return context
+        entries = await sync_to_async(self.get_entries, thread_sensitive=False)(request)
+
+        response = Response.stream(request, writer_class(entries), writer_class.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{request.GET["parentIdentifier"]}.{writer_class.extension}"'
+
+        return response
+
+    @staticmethod
+    def get_entries(request):
+        """
+        :return: Entry generator for the granules in the collection
+        :rtype: generator
+        :raises BadRequest: No collection of granules given
+        :raises Http404: Collection not found
+        """
+        search_params = request.GET
+        parent_identifier = search_params.get('parentIdentifier')
+
+        if not parent_identifier:
+            raise BadRequest('parentIdentifier is required')
 
-    def gen_item_root(self):
+        collection = Collection.get_collection_info(parent_identifier)
 
-        return self.request.build_absolute_uri().split('?')[0]
+        if collection.has_children:
+            raise BadRequest('Export is only available for collections of files')
 
+        return build_first_entry(Granule(collection.path).export(
+            search_params,
+            doc_order=search_params.get('order') == 'doc',
+            uri=request.build_absolute_uri('/opensearch')
+        ))
 
 
+class Metrics(View):
+    """
+    Request latency histograms and counters for this process in the
+    Prometheus text format. Only served to settings.METRICS_ALLOWED_IPS.
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def get(self, request):
+        if not opensearch_settings.METRICS_ENABLED:
+            raise Http404('Metrics are not enabled')
+
+        if not self.is_allowed(request.META.get('REMOTE_ADDR')):
+            raise PermissionDenied('Metrics are not available from this address')
+
+        return HttpResponse(METRICS.render(), content_type=self.content_type)
+
+    @staticmethod
+    def is_allowed(address):
+        """
+        :param address: client IP address
+        :type address: str
+
+        :return: Whether the address is in settings.METRICS_ALLOWED_IPS
+        :rtype: bool
+        """
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+
+        return any(
+            address in ipaddress.ip_network(network, strict=False)
+            for network in opensearch_settings.METRICS_ALLOWED_IPS
+        )
@@ -3,6 +3,7 @@ from django.http import JsonResponse, Http404
 from elasticsearch import Elasticsearch
 from django.conf import settings
 from elasticsearch.exceptions import NotFoundError
+from django_opensearch.conditional import add_validators, content_etag, get_last_modified, not_modified
 import json
 
 
@@ -12,10 +13,14 @@ def get_manifest(request, uuid):
 
     try:
         response = es.get(index=settings.ELASTICSEARCH_COLLECTION_INDEX, id=uuid, _source_includes=['manifest'])
-        response = json.loads(response['_source']['manifest'])
-        return JsonResponse(response)
+        response = JsonResponse(json.loads(response['_source']['manifest']))
 
     except (NotFoundError, KeyError):
         raise Http404(f'Manifest not found for collection {uuid}')
 
+    etag = content_etag(response.content)
+    last_modified = get_last_modified(uuid)
+
+    return add_validators(not_modified(request, etag, last_modified) or response, 'manifest', etag, last_modified)
+
 